@@ -0,0 +1,83 @@
+"""
+Сравнение движков очистки clean_parsed_items: построчного (python) и колоночного (pandas).
+
+На каждом размере оба движка очищают одни и те же синтетические товары
+(fixtures.make_raw_items, 10% повторов), результаты сверяются по отпечатку
+всех полей. Если результаты расходятся, скрипт завершается с кодом 1.
+
+    python benchmarks/bench_cleaning.py
+    python benchmarks/bench_cleaning.py --items 100000 1000000
+"""
+import argparse
+import contextlib
+import gc
+import hashlib
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from fixtures import make_raw_items
+from cleaner import CLEANING_ENGINES, clean_parsed_items, get_cleaning_stages
+
+
+def digest(items):
+    """Отпечаток результата: порядок товаров, ключей и значения с типами"""
+    result = hashlib.md5()
+    for item in items:
+        result.update(repr([(key, type(value).__name__, value) for key, value in item.items()]).encode())
+    return result.hexdigest()
+
+
+def bench(engine, raw_items):
+    gc.collect()
+    report = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(report):
+        items = clean_parsed_items(raw_items, engine)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(items), digest(items), report.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--engines', nargs='+', default=list(CLEANING_ENGINES), choices=CLEANING_ENGINES)
+    args = parser.parse_args()
+
+    # Импорт pandas (доли секунды) не входит в замер
+    for engine in args.engines:
+        get_cleaning_stages(engine)
+
+    mismatches = 0
+    for count in args.items:
+        raw_items = make_raw_items(count)
+        print(f"\nТоваров: {count}")
+        print("=" * 70)
+
+        results = {}
+        for engine in args.engines:
+            elapsed, cleaned, fingerprint, report = bench(engine, raw_items)
+            results[engine] = (elapsed, fingerprint, report)
+            print(f"   {engine:8s}: {elapsed:7.2f} сек, {count / elapsed:9.0f} товаров/сек, на выходе {cleaned}")
+
+        fingerprints = {fingerprint for _, fingerprint, _ in results.values()}
+        reports = {report for _, _, report in results.values()}
+        if len(fingerprints) > 1 or len(reports) > 1:
+            mismatches += 1
+            print("   ❌ Результаты или отчеты движков различаются")
+        elif len(results) > 1:
+            baseline = results[args.engines[0]][0]
+            for engine in args.engines[1:]:
+                print(f"   ✓ Результаты совпадают, {engine} быстрее {args.engines[0]} в {baseline / results[engine][0]:.2f}x")
+
+        del raw_items, results
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Сравнение скорости загрузки страниц поиска: HTTP backend против Selenium.
+
+    python benchmarks/bench_fetch_backends.py --pages 10 --pool-size 3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from fixtures import start_fixture_server, fixture_search_url
+from scraper import scrape_ebay, ITEMS_PER_PAGE
+
+
+def run_backend(backend, search_url, pages, pool_size):
+    start = time.perf_counter()
+    html_pages = scrape_ebay(
+        search_query="laptop",
+        max_items=pages * ITEMS_PER_PAGE,
+        save_html=False,
+        pool_size=pool_size,
+        min_interval=0,
+        backend=backend,
+        search_url=search_url,
+    )
+    elapsed = time.perf_counter() - start
+    return len(html_pages), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--pool-size', type=int, default=3)
+    parser.add_argument('--skip-selenium', action='store_true')
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server()
+    search_url = fixture_search_url(base_url)
+
+    backends = ['http'] if args.skip_selenium else ['http', 'selenium']
+    results = {}
+    try:
+        for backend in backends:
+            try:
+                results[backend] = run_backend(backend, search_url, args.pages, args.pool_size)
+            except Exception as e:
+                print(f"⚠️  {backend}: не удалось запустить ({e})")
+    finally:
+        server.shutdown()
+
+    print(f"\n{'='*70}")
+    print(f"{'backend':12s} {'страниц':>8s} {'сек':>10s} {'стр/сек':>10s}")
+    for backend, (pages, elapsed) in results.items():
+        print(f"{backend:12s} {pages:8d} {elapsed:10.2f} {pages / elapsed:10.2f}")
+    print(f"{'='*70}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Время разбора airflow_dag.py и импорта пакета src - то, что платят планировщик
+при каждом перечитывании DAG и каждая задача при старте.
+
+Каждый замер - в новом процессе: сначала импортируется airflow (в планировщике
+он уже загружен), затем исполняется файл DAG, как это делает DagBag. Скрипт
+завершается с кодом 1, если медиана превышает --budget-ms или разбор DAG
+загрузил тяжелые библиотеки (selenium, bs4, pandas, ...).
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --python /opt/airflow/venv/bin/python --budget-ms 100
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DAGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dags'))
+HEAVY_MODULES = ('selenium', 'webdriver_manager', 'bs4', 'lxml', 'pandas', 'numpy', 'pyarrow')
+
+# Выполняется в отдельном процессе, печатает JSON с результатом
+DAG_PARSE_SNIPPET = """
+import importlib.util, json, sys, time
+import airflow
+from airflow import DAG
+from airflow.decorators import task_group
+from airflow.operators.python import PythonOperator
+sys.path.append({src!r})
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('airflow_dag', {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+PACKAGE_IMPORT_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {dags!r})
+start = time.perf_counter()
+import src
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def run_snippet(python, snippet):
+    completed = subprocess.run(
+        [python, '-W', 'ignore', '-c', snippet], capture_output=True, text=True, cwd=DAGS_DIR
+    )
+    if completed.returncode != 0:
+        print(completed.stderr.strip()[-2000:])
+        raise RuntimeError(f"процесс завершился с кодом {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(name, python, snippet, repeat):
+    runs = [run_snippet(python, snippet) for _ in range(repeat)]
+    times = sorted(run['seconds'] * 1000 for run in runs)
+    heavy = sorted({module for run in runs for module in run['heavy']})
+    median = statistics.median(times)
+    print(f"{name:20s} {median:12.1f} {times[0]:10.1f} {times[-1]:10.1f}   {', '.join(heavy) or '-'}")
+    return median, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--python', default=sys.executable, help='интерпретатор с установленным Airflow')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=200.0, help='допустимая медиана разбора DAG')
+    args = parser.parse_args()
+
+    dag_snippet = DAG_PARSE_SNIPPET.format(
+        src=os.path.join(DAGS_DIR, 'src'), path=os.path.join(DAGS_DIR, 'airflow_dag.py'), heavy=HEAVY_MODULES
+    )
+    package_snippet = PACKAGE_IMPORT_SNIPPET.format(dags=DAGS_DIR, heavy=HEAVY_MODULES)
+
+    print(f"{'='*70}")
+    print(f"{'что':20s} {'медиана, мс':>12s} {'мин, мс':>10s} {'макс, мс':>10s}   тяжелые модули")
+    try:
+        dag_median, dag_heavy = measure('разбор DAG', args.python, dag_snippet, args.repeat)
+        measure('import src', args.python, package_snippet, args.repeat)
+    except RuntimeError as e:
+        print(f"❌ Замер не удался: {e}")
+        sys.exit(1)
+    print(f"{'='*70}")
+
+    failed = False
+    if dag_median > args.budget_ms:
+        print(f"❌ Разбор DAG {dag_median:.1f} мс превышает бюджет {args.budget_ms:.0f} мс")
+        failed = True
+    if dag_heavy:
+        print(f"❌ Разбор DAG загружает тяжелые модули: {', '.join(dag_heavy)}")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"✓ Разбор DAG укладывается в бюджет {args.budget_ms:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Сравнение промежуточного хранения страниц между scraping и cleaning:
+один JSON-список (старый raw_items.json) против JSON Lines со сжатием.
+
+Каждый формат запускается в отдельном процессе, чтобы пиковый RSS не смешивался.
+
+    python benchmarks/bench_intermediate_storage.py --pages 50
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+FORMATS = ['json', 'jsonl', 'jsonl.gz', 'jsonl.zst']
+
+
+def run_format(fmt, pages, workdir):
+    from fixtures import make_search_page
+    from storage import RecordWriter, iter_html_pages
+
+    path = os.path.join(workdir, f'raw.{fmt}')
+    start = time.perf_counter()
+
+    if fmt == 'json':
+        html_pages = [make_search_page(page_num) for page_num in range(1, pages + 1)]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(html_pages, f)
+        del html_pages
+        with open(path, 'r', encoding='utf-8') as f:
+            total_chars = sum(len(html) for html in json.load(f))
+    else:
+        with RecordWriter(path) as writer:
+            for page_num in range(1, pages + 1):
+                writer.write({'page': page_num, 'html': make_search_page(page_num)})
+        total_chars = sum(len(html) for html in iter_html_pages(path))
+
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'format': fmt,
+        'disk_bytes': os.path.getsize(path),
+        'peak_rss_mb': peak_kb / 1024,
+        'seconds': elapsed,
+        'html_chars': total_chars,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--format', choices=FORMATS, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.format:
+        print(json.dumps(run_format(args.format, args.pages, args.workdir)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for fmt in FORMATS:
+            proc = subprocess.run(
+                [sys.executable, __file__, '--pages', str(args.pages), '--format', fmt, '--workdir', workdir],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"⚠️  {fmt}: пропущен ({proc.stderr.strip().splitlines()[-1]})")
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"\n{'='*70}")
+    print(f"Страниц: {args.pages}")
+    print(f"{'формат':12s} {'диск, КБ':>12s} {'пик RSS, МБ':>14s} {'сек':>8s}")
+    for r in results:
+        print(f"{r['format']:12s} {r['disk_bytes'] / 1024:12.0f} {r['peak_rss_mb']:14.1f} {r['seconds']:8.2f}")
+    print(f"{'='*70}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Ключ products до и после перехода на item_id: размер индексов и скорость поиска.
+
+До: id AUTOINCREMENT + UNIQUE индекс по item_url, поиск товара по тексту ссылки.
+После: item_id INTEGER PRIMARY KEY (rowid), поиск по номеру объявления.
+База старой схемы заполняется N товарами и мигрируется через loader.create_database.
+
+    python benchmarks/bench_item_id_key.py --items 200000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from fixtures import make_clean_items, create_legacy_database
+from loader import create_database
+
+
+def fill_legacy(db_name, items):
+    create_legacy_database(db_name)
+    conn = sqlite3.connect(db_name)
+    # Ссылки в старых базах хранились с параметрами поиска
+    conn.executemany('''
+        INSERT INTO products (title, price, currency, condition, item_url, scraped_at, search_query)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (item['title'], item['price'], item['currency'], item['condition'],
+         f"{item['item_url']}?_skw=laptop", item['scraped_at'], 'laptop')
+        for item in items
+    ])
+    conn.commit()
+    conn.close()
+
+
+def products_sizes(db_name):
+    """Размер products и каждого ее индекса (dbstat) в байтах; price_snapshots не считается"""
+    conn = sqlite3.connect(db_name)
+    conn.execute('VACUUM')
+    sizes = dict(conn.execute('''
+        SELECT d.name, SUM(d.pgsize) FROM dbstat d
+        JOIN sqlite_master m ON m.name = d.name
+        WHERE m.tbl_name = 'products'
+        GROUP BY d.name
+    '''))
+    conn.close()
+    return sizes
+
+
+def time_lookups(db_name, sql, keys):
+    conn = sqlite3.connect(db_name)
+    start = time.perf_counter()
+    found = 0
+    for key in keys:
+        if conn.execute(sql, (key,)).fetchone():
+            found += 1
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return found, elapsed
+
+
+def report(label, db_name, lookup_sql, keys):
+    sizes = products_sizes(db_name)
+    found, elapsed = time_lookups(db_name, lookup_sql, keys)
+    total = sum(sizes.values())
+    print(f"\n{label}")
+    for name, size in sorted(sizes.items(), key=lambda entry: -entry[1]):
+        print(f"   {name:32s} {size / 1024 / 1024:8.2f} МБ")
+    print(f"   {'итого products + индексы':32s} {total / 1024 / 1024:8.2f} МБ")
+    print(f"   поиск: {found}/{len(keys)} найдено, {elapsed / len(keys) * 1e6:.1f} мкс на запрос")
+    return total, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    items = make_clean_items(args.items)
+    rng = random.Random(1)
+    sample = [items[rng.randrange(len(items))] for _ in range(args.lookups)]
+
+    print(f"Товаров: {args.items}, запросов: {args.lookups}")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory() as workdir:
+        db_name = os.path.join(workdir, 'products.db')
+        fill_legacy(db_name, items)
+        before_size, before_time = report(
+            "До: UNIQUE(item_url)", db_name,
+            'SELECT id FROM products WHERE item_url = ?',
+            [f"{item['item_url']}?_skw=laptop" for item in sample]
+        )
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_database(db_name)
+        print(f"\nМиграция: {time.perf_counter() - start:.2f} сек")
+
+        after_size, after_time = report(
+            "После: item_id INTEGER PRIMARY KEY", db_name,
+            'SELECT item_id FROM products WHERE item_id = ?',
+            [item['item_id'] for item in sample]
+        )
+
+    print("=" * 70)
+    print(f"Размер products + индексы: {after_size / before_size:.2f}x, время поиска: {before_time / after_time:.2f}x быстрее")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Загрузка синтетических товаров в SQLite: построчный SELECT + INSERT/UPDATE
+(как было раньше) против пакетного UPSERT в loader.save_to_database.
+
+Оба варианта пишут в одну и ту же схему (create_database): products, снимки
+цен price_snapshots и полнотекстовый индекс products_fts. Товары, как после
+cleaner, уже несут item_id и content_hash. Каждый вариант загружает N товаров
+в пустую базу, затем повторно те же товары (все строки становятся обновлениями).
+
+    python benchmarks/bench_loader.py --items 100000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from cleaner import get_item_fingerprint
+from fixtures import make_clean_items
+from loader import (
+    SEARCH_INDEX_DELETE_SQL, SEARCH_INDEX_INSERT_SQL, SNAPSHOT_SQL,
+    apply_pragmas, create_database, save_to_database, _item_row, _snapshot_row,
+)
+
+
+def legacy_save_to_database(items_data, search_query, db_name):
+    """
+    Прежняя реализация в текущей схеме: SELECT и отдельный UPDATE/INSERT на каждую
+    строку, снимок цены и обновление products_fts - тоже построчно.
+    """
+    conn = sqlite3.connect(db_name)
+    apply_pragmas(conn)
+    cursor = conn.cursor()
+    inserted = updated = 0
+    for item in items_data:
+        row = _item_row(item, search_query)
+        title, specs, item_id = row[0], row[12], row[13]
+        cursor.execute('SELECT title, specifications FROM products WHERE item_id = ?', (item_id,))
+        old_text = cursor.fetchone()
+        if old_text:
+            cursor.execute('''
+                UPDATE products SET title = ?, price = ?, currency = ?, condition = ?, seller_name = ?,
+                    location = ?, shipping_price = ?, rating = ?, reviews_count = ?, item_url = ?,
+                    scraped_at = ?, search_query = ?, specifications = ?, content_hash = ?
+                WHERE item_id = ?
+            ''', row[:13] + (row[14], item_id))
+            if old_text != (title, specs):
+                cursor.execute(SEARCH_INDEX_DELETE_SQL, (item_id,) + old_text)
+                cursor.execute(SEARCH_INDEX_INSERT_SQL, (item_id, title, specs))
+            updated += 1
+        else:
+            cursor.execute('''
+                INSERT INTO products (title, price, currency, condition, seller_name, location,
+                    shipping_price, rating, reviews_count, item_url, scraped_at, search_query, specifications,
+                    item_id, content_hash, cluster_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', row)
+            cursor.execute(SEARCH_INDEX_INSERT_SQL, (item_id, title, specs))
+            inserted += 1
+        cursor.execute(SNAPSHOT_SQL, _snapshot_row(row))
+    conn.commit()
+    conn.close()
+    return inserted + updated
+
+
+def run(name, save, items, workdir):
+    db_name = os.path.join(workdir, f'{name}.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_database(db_name)
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            saved = save(items, 'laptop', db_name)
+        timings.append((saved, time.perf_counter() - start))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    items = make_clean_items(args.items)
+    # content_hash считает cleaner, loader получает его готовым
+    for item in items:
+        item['content_hash'] = get_item_fingerprint(item)
+    variants = {
+        'legacy': legacy_save_to_database,
+        'bulk': lambda data, query, db: save_to_database(data, query, db, batch_size=args.batch_size),
+    }
+
+    print(f"Товаров: {args.items}, batch_size: {args.batch_size}")
+    print(f"{'='*70}")
+    print(f"{'вариант':10s} {'проход':>8s} {'строк':>10s} {'сек':>8s} {'строк/сек':>12s}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, save in variants.items():
+            for idx, (saved, elapsed) in enumerate(run(name, save, items, workdir)):
+                label = 'insert' if idx == 0 else 'update'
+                print(f"{name:10s} {label:>8s} {saved:10d} {elapsed:8.2f} {saved / elapsed:12.0f}")
+    print(f"{'='*70}")
+
+
+if __name__ == '__main__':
+    main()
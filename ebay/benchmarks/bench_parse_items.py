@@ -0,0 +1,92 @@
+"""
+Сравнение движков parse_items (bs4 и lxml): сверка результатов и карточек в секунду.
+
+По умолчанию используются синтетические страницы; сохраненные страницы
+(scrape_ebay(save_html=True) пишет ebay_<query>_page<N>_<ts>.html) можно
+передать через --pages-dir. Если результаты движков расходятся, скрипт
+завершается с кодом 1.
+
+    python benchmarks/bench_parse_items.py --pages 20
+    python benchmarks/bench_parse_items.py --pages-dir ./saved_pages
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from fixtures import make_search_page
+from cleaner import PARSER_ENGINES
+
+
+def comparable(items):
+    # scraped_at - время парсинга, оно у движков законно различается
+    return [{k: v for k, v in item.items() if k != 'scraped_at'} for item in items]
+
+
+def load_pages(args):
+    if args.pages_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.pages_dir, '*.html'))):
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append((os.path.basename(path), f.read()))
+        return pages
+    return [(f'synthetic_{n}', make_search_page(n)) for n in range(1, args.pages + 1)]
+
+
+def check_golden(pages):
+    mismatches = 0
+    for name, html in pages:
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = comparable(PARSER_ENGINES['bs4'](html))
+            actual = comparable(PARSER_ENGINES['lxml'](html))
+        if expected != actual:
+            mismatches += 1
+            print(f"❌ {name}: bs4 {len(expected)} товаров, lxml {len(actual)} товаров - результаты различаются")
+    return mismatches
+
+
+def bench(engine, pages, repeat):
+    parse = PARSER_ENGINES[engine]
+    cards = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            for _, html in pages:
+                cards += len(parse(html))
+    return cards, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--pages-dir')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        print("Нет страниц для проверки")
+        sys.exit(1)
+
+    mismatches = check_golden(pages)
+    print(f"Сверка движков: {len(pages) - mismatches}/{len(pages)} страниц совпадают")
+
+    print(f"\n{'='*70}")
+    print(f"{'движок':10s} {'карточек':>10s} {'сек':>8s} {'карточек/сек':>14s}")
+    for engine in PARSER_ENGINES:
+        cards, elapsed = bench(engine, pages, args.repeat)
+        print(f"{engine:10s} {cards:10d} {elapsed:8.2f} {cards / elapsed:14.0f}")
+    print(f"{'='*70}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
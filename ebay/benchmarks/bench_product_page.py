@@ -0,0 +1,97 @@
+"""
+Задержка parse_product_page на одну страницу товара: движки bs4 и lxml.
+
+По умолчанию используются синтетические страницы объявлений
+(fixtures.make_product_page, ~400 КБ, десятки JSON-скриптов); сохраненные
+страницы можно передать через --pages-dir. Перед замером результаты движков
+сверяются; если они расходятся, скрипт завершается с кодом 1.
+
+    python benchmarks/bench_product_page.py --pages 50
+    python benchmarks/bench_product_page.py --pages-dir ./saved_items
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from fixtures import make_product_page, BASE_ITEM_ID
+from cleaner import PRODUCT_PAGE_ENGINES
+
+
+def load_pages(args):
+    if args.pages_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.pages_dir, '*.html'))):
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append((os.path.basename(path), f.read()))
+        return pages
+    return [(f'synthetic_{n}', make_product_page(BASE_ITEM_ID + n)) for n in range(args.pages)]
+
+
+def check_golden(pages):
+    mismatches = 0
+    for name, html in pages:
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = PRODUCT_PAGE_ENGINES['bs4'](html)
+            actual = PRODUCT_PAGE_ENGINES['lxml'](html)
+        if expected != actual:
+            mismatches += 1
+            print(f"❌ {name}: результаты движков различаются")
+    return mismatches
+
+
+def bench(engine, pages, repeat):
+    parse = PRODUCT_PAGE_ENGINES[engine]
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            for _, html in pages:
+                start = time.perf_counter()
+                parse(html)
+                latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def percentile(latencies, share):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--pages-dir')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        print("Нет страниц для проверки")
+        sys.exit(1)
+
+    mismatches = check_golden(pages)
+    size = sum(len(html) for _, html in pages) / len(pages)
+    print(f"Сверка движков: {len(pages) - mismatches}/{len(pages)} страниц совпадают, "
+          f"средний размер {size / 1024:.0f} КБ")
+
+    print(f"\n{'='*70}")
+    print(f"{'движок':10s} {'среднее, мс':>12s} {'p50, мс':>10s} {'p95, мс':>10s} {'макс, мс':>10s} {'страниц/сек':>12s}")
+    for engine in PRODUCT_PAGE_ENGINES:
+        latencies = bench(engine, pages, args.repeat)
+        mean = statistics.fmean(latencies)
+        print(f"{engine:10s} {mean * 1000:12.2f} {percentile(latencies, 0.5) * 1000:10.2f} "
+              f"{percentile(latencies, 0.95) * 1000:10.2f} {latencies[-1] * 1000:10.2f} {1 / mean:12.1f}")
+    print(f"{'='*70}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
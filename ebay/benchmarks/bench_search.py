@@ -0,0 +1,111 @@
+"""
+Поиск товаров по словам: FTS5 (ProductStore.search) против LIKE '%...%' по title и specifications.
+
+База заполняется синтетическими товарами (fixtures.make_clean_items, у 30% есть
+характеристики) через save_items - индекс products_fts обновляется пачками вместе
+с записью. LIKE проверяет каждое слово в title или specifications и читает все совпадения
+(ранжировать без индекса нечем); FTS5 отдает --limit лучших по bm25.
+
+    python benchmarks/bench_search.py --rows 100000
+    python benchmarks/bench_search.py --rows 1000000 --db /tmp/search_1m.db
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from fixtures import make_clean_items, BASE_ITEM_ID
+from loader import ProductStore
+
+# (строка поиска, фильтры ProductStore.search)
+QUERIES = [
+    ("i7 16GB ThinkPad", {}),
+    ("i7 16GB ThinkPad", {'max_price': 500, 'condition': 'Used'}),
+    ("MacBook M1", {}),
+    ("RTX 3050", {}),
+    ("Ryzen 512GB SSD", {'min_price': 1000}),
+    ("Windows 11 Pro", {}),
+    ("zorblax", {}),
+]
+FILL_CHUNK = 100000
+
+
+def fill_database(store, rows):
+    start = time.perf_counter()
+    for offset in range(0, rows, FILL_CHUNK):
+        items = make_clean_items(min(FILL_CHUNK, rows - offset), seed=offset,
+                                 first_id=BASE_ITEM_ID + offset, specs_share=0.3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.save_items(items, 'laptop', batch_size=10000)
+    return time.perf_counter() - start
+
+
+def like_search(store, text, min_price=None, max_price=None, condition=None):
+    query = 'SELECT item_id, title, price FROM products WHERE 1'
+    params = []
+    for word in text.split():
+        query += ' AND (title LIKE ? OR specifications LIKE ?)'
+        params += [f'%{word}%', f'%{word}%']
+    if min_price is not None:
+        query += ' AND price >= ?'
+        params.append(min_price)
+    if max_price is not None:
+        query += ' AND price <= ?'
+        params.append(max_price)
+    if condition:
+        query += ' AND condition = ?'
+        params.append(condition)
+    return store.conn.execute(query, params).fetchall()
+
+
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--db', help='путь к базе; если в ней уже есть --rows товаров, она не заполняется заново')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_name = args.db or os.path.join(workdir, 'search.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            store = ProductStore(db_name)
+        with store:
+            existing = store.count()
+            if existing < args.rows:
+                seconds = fill_database(store, args.rows)
+                print(f"✓ База заполнена: {args.rows} товаров за {seconds:.1f} сек "
+                      f"({args.rows / seconds:.0f} товаров/сек с индексом FTS5)")
+            print(f"Товаров в базе: {store.count()}, размер файла {os.path.getsize(db_name) / 2**20:.0f} МБ")
+
+            print(f"\n{'='*104}")
+            print(f"{'запрос':48s} {'LIKE, шт':>9s} {'FTS, шт':>8s} {'LIKE, мс':>10s} {'FTS, мс':>9s} {'ускорение':>10s}")
+            for text, filters in QUERIES:
+                like_seconds, like_rows = timed(lambda: like_search(store, text, **filters), args.repeat)
+                fts_seconds, fts_rows = timed(lambda: store.search(text, limit=args.limit, **filters), args.repeat)
+                matches = len(store.search(text, limit=-1, **filters))
+                label = text + (' ' + ','.join(f'{k}={v}' for k, v in filters.items()) if filters else '')
+                print(f"{label:48s} {len(like_rows):9d} {matches:8d} {like_seconds * 1000:10.1f} "
+                      f"{fts_seconds * 1000:9.1f} {like_seconds / fts_seconds:9.1f}x")
+            print(f"{'='*104}")
+            print("LIKE ищет подстроку (i7 находит и 'i7-1165G7'), FTS5 - целые слова, поэтому число совпадений может различаться")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Офлайн-набор бенчмарков конвейера на синтетических данных (без обращений к eBay).
+
+На каждом размере N (число товаров) замеряются:
+    parse_items         - parse_items по страницам выдачи (60 карточек на странице)
+    parse_html_pages    - parse_html_pages: чтение страниц из чекпоинта, парсинг и очистка
+    parse_product_page  - parse_product_page по страницам товаров (не больше --product-pages)
+    clean_item_data     - clean_item_data по сырым товарам (10% повторов)
+    remove_duplicates   - remove_duplicates по очищенным товарам
+    save_to_database    - save_to_database в пустую базу (insert) и повторно (update)
+
+Страницы генерируются заранее (fixtures.make_search_page, make_product_page) и в
+замер не входят. Результаты пишутся в JSON (--output) вместе с описанием машины
+и коммита; --compare печатает ускорение относительно сохраненного прогона.
+
+    python benchmarks/bench_suite.py --sizes 1000 10000
+    python benchmarks/bench_suite.py --output results.json --compare results_main.json
+
+Полный прогон до 1 млн товаров занимает десятки минут и несколько ГБ памяти.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from fixtures import (
+    make_search_page, make_product_page, make_raw_items, make_clean_items, BASE_ITEM_ID,
+)
+from cleaner import (
+    parse_items, parse_html_pages, parse_product_page, clean_item_data, remove_duplicates,
+    is_valid_item, choose_cleaning_engine, DEFAULT_PARSER_ENGINE, DEFAULT_CLEANING_ENGINE, PANDAS_MIN_ITEMS,
+)
+from loader import create_database, save_to_database
+from storage import PageCheckpoint, iter_html_pages
+
+BENCHMARKS = (
+    'parse_items', 'parse_html_pages', 'parse_product_page',
+    'clean_item_data', 'remove_duplicates', 'save_to_database',
+)
+CARDS_PER_PAGE = 60
+
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def result(benchmark, size, items, seconds, **extra):
+    return dict({
+        'benchmark': benchmark,
+        'size': size,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'items_per_second': round(items / seconds, 1) if seconds else None,
+    }, **extra)
+
+
+def write_search_pages(size, directory):
+    """Страницы выдачи на size карточек - в чекпоинт, как их сохраняет скрапинг"""
+    checkpoint = PageCheckpoint(directory)
+    for page_num in range(1, math.ceil(size / CARDS_PER_PAGE) + 1):
+        cards = min(CARDS_PER_PAGE, size - (page_num - 1) * CARDS_PER_PAGE)
+        html = make_search_page(page_num, cards, first_id=BASE_ITEM_ID + (page_num - 1) * CARDS_PER_PAGE)
+        checkpoint.save_page(page_num, {'page': page_num, 'html': html})
+    checkpoint.finish()
+    return checkpoint
+
+
+def bench_parse_items(size, context):
+    elapsed = 0.0
+    pages = cards = 0
+    with quiet():
+        for html in iter_html_pages(context['checkpoint']):
+            start = time.perf_counter()
+            cards += len(parse_items(html))
+            elapsed += time.perf_counter() - start
+            pages += 1
+    return [result('parse_items', size, cards, elapsed, pages=pages, engine=DEFAULT_PARSER_ENGINE)]
+
+
+def bench_parse_html_pages(size, context):
+    start = time.perf_counter()
+    with quiet():
+        items = parse_html_pages(iter_html_pages(context['checkpoint']))
+    elapsed = time.perf_counter() - start
+    return [result('parse_html_pages', size, len(items), elapsed,
+                   parser=DEFAULT_PARSER_ENGINE, cleaning=choose_cleaning_engine(size))]
+
+
+def bench_parse_product_page(size, context):
+    # Страница товара ~400 КБ: на больших N берется выборка, время - на страницу
+    pages = min(size, context['args'].product_pages)
+    elapsed = 0.0
+    fields = 0
+    with quiet():
+        for n in range(pages):
+            html = make_product_page(BASE_ITEM_ID + n)
+            start = time.perf_counter()
+            fields += len(parse_product_page(html))
+            elapsed += time.perf_counter() - start
+    return [result('parse_product_page', size, pages, elapsed, sampled=pages < size,
+                   ms_per_page=round(elapsed / pages * 1000, 3), fields=fields)]
+
+
+def bench_cleaning(size, context):
+    raw_items = [item for item in make_raw_items(size) if is_valid_item(item)]
+    gc.collect()
+    start = time.perf_counter()
+    cleaned = [clean_item_data(item) for item in raw_items]
+    clean_elapsed = time.perf_counter() - start
+    del raw_items
+
+    start = time.perf_counter()
+    with quiet():
+        unique = remove_duplicates(cleaned)
+    dedup_elapsed = time.perf_counter() - start
+    return [
+        result('clean_item_data', size, len(cleaned), clean_elapsed),
+        result('remove_duplicates', size, len(cleaned), dedup_elapsed, unique=len(unique)),
+    ]
+
+
+def bench_save_to_database(size, context):
+    items = make_clean_items(size)
+    db_name = os.path.join(context['workdir'], f'bench_{size}.db')
+    with quiet():
+        create_database(db_name)
+    results = []
+    for run in ('insert', 'update'):
+        gc.collect()
+        start = time.perf_counter()
+        with quiet():
+            saved = save_to_database(items, 'laptop', db_name)
+        results.append(result('save_to_database', size, saved, time.perf_counter() - start, run=run))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(entry):
+    return entry['benchmark'], entry['size'], entry.get('run')
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {result_key(entry): entry for entry in json.load(f)['results']}
+
+    print(f"\nСравнение с {baseline_path}:")
+    for entry in results:
+        previous = baseline.get(result_key(entry))
+        if previous is None or not previous['seconds'] or not entry['seconds']:
+            continue
+        ratio = previous['seconds'] / entry['seconds']
+        mark = '✓' if ratio >= 1 else '⚠️'
+        name = entry['benchmark'] + (f" ({entry['run']})" if entry.get('run') else '')
+        print(f"   {mark} {name:30s} {entry['size']:>9d}: {previous['seconds']:9.3f} -> {entry['seconds']:9.3f} сек "
+              f"({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=BENCHMARKS)
+    parser.add_argument('--product-pages', type=int, default=500,
+                        help='максимум страниц товаров на размер (~10 мс на страницу)')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='файл результатов прошлого прогона')
+    args = parser.parse_args()
+
+    steps = {
+        'parse_items': bench_parse_items,
+        'parse_html_pages': bench_parse_html_pages,
+        'parse_product_page': bench_parse_product_page,
+        'clean_item_data': bench_cleaning,
+        'save_to_database': bench_save_to_database,
+    }
+    selected = [name for name in steps if name in args.benchmarks or
+                (name == 'clean_item_data' and 'remove_duplicates' in args.benchmarks)]
+    needs_pages = {'parse_items', 'parse_html_pages'} & set(selected)
+
+    results = []
+    print(f"{'бенчмарк':30s} {'N':>9s} {'элементов':>10s} {'сек':>9s} {'в секунду':>11s}")
+    print("=" * 74)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            context = {'args': args, 'workdir': workdir}
+            if needs_pages:
+                with quiet():
+                    context['checkpoint'] = write_search_pages(size, os.path.join(workdir, 'pages'))
+
+            for name in selected:
+                for entry in steps[name](size, context):
+                    if entry['benchmark'] not in args.benchmarks:
+                        continue
+                    results.append(entry)
+                    label = entry['benchmark'] + (f" ({entry['run']})" if entry.get('run') else '')
+                    print(f"{label:30s} {size:9d} {entry['items']:10d} {entry['seconds']:9.3f} "
+                          f"{entry['items_per_second'] or 0:11.0f}")
+                gc.collect()
+        print("-" * 74)
+
+    report = {
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parser_engine': DEFAULT_PARSER_ENGINE,
+        'cleaning_engine': f"{DEFAULT_CLEANING_ENGINE}, pandas от {PANDAS_MIN_ITEMS} товаров",
+        'sizes': args.sizes,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✓ Результаты сохранены в {args.output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""
+Синтетические страницы eBay и локальный HTTP-сервер для бенчмарков и тестов.
+
+Запуск сервера вручную:
+    python benchmarks/fixtures.py --port 8765
+"""
+import argparse
+import json
+import random
+import sqlite3
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+BRANDS = ["Lenovo ThinkPad", "Dell Latitude", "HP EliteBook", "Apple MacBook Pro", "ASUS ZenBook", "Acer Aspire"]
+CPUS = ["i5 8350U", "i7 8650U", "i7 1065G7", "Ryzen 5 5500U", "M1", "i3 10110U"]
+RAM = ["8GB", "16GB", "32GB"]
+SSD = ["128GB SSD", "256GB SSD", "512GB SSD", "1TB SSD"]
+CONDITIONS = ["Brand New", "Pre-Owned", "Refurbished", "Used", "Open box"]
+LOCATIONS = ["from: United States", "from: Australia", "from: Canada", "from: Germany", "из: Австралия"]
+SHIPPING = ["Free shipping", "+$12.50 shipping", "+$4.99 delivery", "+$25.00 shipping", ""]
+# Реже встречающиеся варианты карточек: русская локализация, другие валюты, диапазон цен
+RARE_CONDITIONS = ["Совершенно новый", "Б/у", "Восстановлен продавцом", "For parts or not working"]
+RARE_SHIPPING = ["Бесплатная доставка", "+EUR 9,90 доставка", "+£3.20 postage", "Local pickup"]
+
+# Первый номер объявления синтетических карточек
+BASE_ITEM_ID = 180000000000
+
+
+def make_card(rng, item_id, search_query="laptop", variety=True):
+    """
+    Карточка выдачи. variety=True добавляет редкие варианты (~15% карточек):
+    цены в EUR/GBP и диапазоном, русские состояния и доставку, пометку
+    "Новое объявление" и заглушку "Shop on eBay", которую парсер отбрасывает.
+    """
+    title = f"{rng.choice(BRANDS)} {rng.choice(CPUS)} {rng.choice(RAM)} RAM {rng.choice(SSD)} 14\" FHD"
+    price = f"${rng.randint(80, 2500)}.{rng.randint(0, 99):02d}"
+    if rng.random() < 0.05:
+        price = f"${rng.randint(1, 9)},{rng.randint(100, 999)}.{rng.randint(0, 99):02d}"
+    condition = rng.choice(CONDITIONS)
+    shipping = rng.choice(SHIPPING)
+    if variety and rng.random() < 0.15:
+        kind = rng.randrange(6)
+        if kind == 0:
+            price = f"EUR {rng.randint(80, 2500)},{rng.randint(0, 99):02d}"
+        elif kind == 1:
+            price = f"£{rng.randint(80, 2500)}.{rng.randint(0, 99):02d}"
+        elif kind == 2:
+            low = rng.randint(80, 1500)
+            price = f"${low}.00 to ${low + rng.randint(10, 500)}.00"
+        elif kind == 3:
+            condition = rng.choice(RARE_CONDITIONS)
+            shipping = rng.choice(RARE_SHIPPING)
+        elif kind == 4:
+            title = "Новое объявление" + title
+        else:
+            title = "Shop on eBay"
+    shipping_span = f'<span class="su-styled-text secondary">{shipping}</span>' if shipping else ''
+    return (
+        '<li class="s-card">'
+        '<div class="su-card-container">'
+        f'<a href="https://www.ebay.com/itm/{item_id}?_skw={search_query}&hash=item{item_id:x}&itmprp=enc%3AAQAKAAAA">'
+        f'<div class="s-card__title"><span class="su-styled-text su-styled-text--header">{title}</span>'
+        '<span class="clipped">Opens in a new window or tab</span></div></a>'
+        f'<div class="s-card__subtitle"><span class="su-styled-text">{condition}</span></div>'
+        f'<span class="s-card__price">{price}</span>'
+        f'<span class="su-styled-text secondary">{rng.choice(LOCATIONS)}</span>'
+        f'{shipping_span}'
+        '<span class="su-styled-text">Buy It Now</span>'
+        '</div></li>'
+    )
+
+
+def make_search_page(page_num=1, cards=60, search_query="laptop", seed=None, first_id=None):
+    rng = random.Random(seed if seed is not None else page_num)
+    if first_id is None:
+        first_id = BASE_ITEM_ID + (page_num - 1) * cards
+    body = ''.join(make_card(rng, first_id + i, search_query) for i in range(cards))
+    # Реальные страницы содержат много разметки вне карточек
+    filler = '<div class="srp-river-answer">' + 'x' * 2000 + '</div>'
+    return (
+        '<!DOCTYPE html><html><head><title>laptop | eBay</title>'
+        '<script>window.SRP = {"page": %d};</script></head><body>'
+        '<div id="srp-river-results"><ul class="srp-results">%s</ul></div>%s'
+        '</body></html>' % (page_num, body, filler * 20)
+    )
+
+
+SELLERS = ["tech_outlet_usa", "laptop-depot", "renewed.pcs", "gadget_warehouse_au", "bestbuy-liquidation"]
+SPEC_LABELS = ["Brand", "Processor", "RAM Size", "SSD Capacity", "Screen Size", "Operating System",
+               "Model", "GPU", "Color", "Type", "Features", "Release Year"]
+
+
+def _text_spans(text):
+    return {'textSpans': [{'_type': 'TextSpan', 'text': text}]}
+
+
+def _filler_json(rng, size):
+    """JSON-скрипт без нужных полей: на реальной странице таких десятки"""
+    modules = {f"module_{n}": {
+        'tracking': {'eventAction': 'VIEW', 'eventProperty': 'x' * rng.randint(20, 80)},
+        'items': [_text_spans(rng.choice(BRANDS)) for _ in range(rng.randint(2, 8))],
+    } for n in range(size)}
+    return json.dumps({'w': [[rng.randint(0, 10**6), 'PLACEHOLDER', modules]]})
+
+
+def make_product_page(item_id=BASE_ITEM_ID, seed=None, filler_scripts=30):
+    """
+    Синтетическая страница объявления: все блоки, которые читает cleaner.parse_product_page
+    (в случайном составе), десятки посторонних JSON-скриптов и разметки.
+    """
+    rng = random.Random(seed if seed is not None else item_id)
+    specs = {label: f"{label} {rng.randint(1, 999)}" for label in rng.sample(SPEC_LABELS, rng.randint(4, 10))}
+    sold = rng.choice(["1.2K sold", f"{rng.randint(1, 999)} sold", f"{rng.randint(1, 9)},{rng.randint(100, 999)} items sold"])
+    trust = {'trustSignals': [
+        {'textSpans': [{'text': f"{rng.uniform(90, 100):.1f}% positive feedback"}]},
+        {'textSpans': [{'text': sold}]},
+    ]}
+    about = {'ABOUT_THIS_ITEM': {'sections': {'features': {'dataItems': {
+        f"item_{n}": {'labels': [_text_spans(label)], 'values': [_text_spans(value)]}
+        for n, (label, value) in enumerate(specs.items())
+    }}}}}
+
+    scripts = [_filler_json(rng, rng.randint(5, 40)) for _ in range(filler_scripts)]
+    if rng.random() < 0.9:
+        scripts.insert(rng.randrange(len(scripts) + 1), json.dumps(trust))
+    if rng.random() < 0.8:
+        scripts.insert(rng.randrange(len(scripts) + 1), json.dumps(about))
+    script_tags = ''.join(f'<script type="application/json">{script}</script>' for script in scripts)
+
+    shipping = rng.choice(["Free shipping", "US $12.50 Standard Shipping", "US $1,025.00 Freight", "Бесплатно"])
+    rows = ''.join(
+        '<div class="ux-labels-values ux-labels-values--inline">'
+        f'<div class="ux-labels-values__labels"><span class="ux-textspans ux-textspans--BOLD">{label}:</span></div>'
+        f'<div class="ux-labels-values__values"><span class="ux-textspans">{value}</span></div></div>'
+        for label, value in specs.items()
+    )
+    filler = '<div class="x-evo-river"><div><div><span class="ux-textspans">%s</span></div></div></div>'
+    return (
+        f'<!DOCTYPE html><html><head><title>Item {item_id} | eBay</title>'
+        f'<script>window.ITEM = {{"id": {item_id}}};</script></head><body>'
+        + ''.join(filler % ('y' * 200) for _ in range(100))
+        + '<div class="x-sellercard-atf">'
+        '<div class="x-sellercard-atf__info__about-seller">'
+        f'<a href="https://www.ebay.com/str/{item_id}"><span class="ux-textspans ux-textspans--BOLD">'
+        f'{rng.choice(SELLERS)}</span></a></div>'
+        f'<span class="ux-textspans ux-textspans--SECONDARY">({rng.randint(10, 90000)})</span>'
+        f'<span class="ux-textspans ux-textspans--POSITIVE">{rng.uniform(90, 100):.1f}% positive</span></div>'
+        '<div class="x-item-condition-text"><span class="ux-textspans">'
+        f'{rng.choice(CONDITIONS)}</span></div>'
+        '<div class="ux-labels-values ux-labels-values--shipping">'
+        '<div class="ux-labels-values__labels"><span class="ux-textspans ux-textspans--BOLD">Shipping:</span></div>'
+        '<div class="ux-labels-values__values">'
+        '<span data-testid="ux-labels-values__values-content">'
+        f'<span class="ux-textspans ux-textspans--BOLD">{shipping}</span></span>'
+        f'<span class="ux-textspans ux-textspans--SECONDARY">Located in: {rng.choice(LOCATIONS)}</span>'
+        '</div></div>'
+        f'<span class="ux-textspans ux-textspans--SECONDARY" data-testid="qty-sold">{rng.randint(1, 5000)} sold</span>'
+        f'<span class="ux-textspans ux-textspans--SECONDARY views-counter">{rng.randint(1, 900)} watchers</span>'
+        f'<div class="ux-layout-section-evo">{rows}</div>'
+        '<div class="ux-layout-section__item ux-layout-section__item--description">'
+        f'  {rng.choice(BRANDS)}  in great   condition.\n Ships fast. </div>'
+        + script_tags
+        + ''.join(filler % ('z' * 200) for _ in range(100))
+        + '</body></html>'
+    )
+
+
+def make_specifications(rng):
+    """Характеристики товара, как их добавляет enrichment"""
+    return {
+        'Brand': rng.choice(BRANDS).split()[0],
+        'Processor': rng.choice(CPUS),
+        'RAM Size': rng.choice(["8 GB", "16 GB", "32 GB"]),
+        'SSD Capacity': rng.choice(["256 GB", "512 GB", "1 TB"]),
+        'Screen Size': rng.choice(["13.3 in", "14 in", "15.6 in"]),
+        'Operating System': rng.choice(["Windows 11 Pro", "Windows 10 Home", "macOS", "ChromeOS"]),
+        'GPU': rng.choice(["Intel UHD Graphics", "NVIDIA GeForce RTX 3050", "AMD Radeon Graphics", "Apple GPU"]),
+    }
+
+
+def make_clean_item(rng, item_id, search_query="laptop", specs_share=0.0):
+    """Товар в том виде, в котором его отдает cleaner (вход для loader); specs_share - доля с характеристиками"""
+    shipping = rng.choice([None, 0.0, 4.99, 12.5, 25.0])
+    item = {
+        'title': f"{rng.choice(BRANDS)} {rng.choice(CPUS)} {rng.choice(RAM)} RAM {rng.choice(SSD)}",
+        'price': round(rng.uniform(80, 2500), 2),
+        'currency': 'USD',
+        'condition': rng.choice([None, 'New', 'Used', 'Refurbished']),
+        'seller_name': None,
+        'location': rng.choice([None, 'United States', 'Australia', 'Canada']),
+        'shipping_price': shipping,
+        'rating': None,
+        'reviews_count': None,
+        'item_url': f"https://www.ebay.com/itm/{item_id}",
+        'scraped_at': f"2025-12-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00",
+        'specifications': None,
+        'item_id': item_id,
+    }
+    if specs_share and rng.random() < specs_share:
+        item['specifications'] = make_specifications(rng)
+    return item
+
+
+def make_raw_item(rng, item_id, search_query="laptop"):
+    """Товар в том виде, в котором его отдает parse_items (вход для clean_parsed_items)"""
+    location = rng.choice(LOCATIONS)
+    # Часть карточек приходит без цены (parse_raw_price не смог ее разобрать)
+    price = round(rng.uniform(80, 2500), 2) if rng.random() > 0.03 else 0
+    return {
+        'title': f"{rng.choice(BRANDS)} {rng.choice(CPUS)}  {rng.choice(RAM)} RAM {rng.choice(SSD)} ",
+        'price': price,
+        'currency': rng.choice(['USD', 'USD', 'USD', 'EUR', 'GBP']),
+        'condition': rng.choice(CONDITIONS + ['Unknown']),
+        'seller_name': 'Unknown',
+        'location': location.split(':', 1)[1].strip() if rng.random() < 0.9 else 'Unknown',
+        'shipping_price': rng.choice([0, 0, 4.99, 12.5, 25.0]),
+        'rating': 0,
+        'reviews_count': 0,
+        'item_url': f"https://www.ebay.com/itm/{item_id}?_skw={search_query}&hash=item{item_id:x}&itmprp=enc%3AAQAKAAAA",
+        'scraped_at': f"2025-12-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+    }
+
+
+def make_raw_items(count, seed=0, duplicate_share=0.1, first_id=BASE_ITEM_ID, search_query="laptop"):
+    """Сырые товары; duplicate_share из них - повторы уже выданных объявлений (как на соседних страницах)"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        item_id = first_id + i
+        if items and rng.random() < duplicate_share:
+            item_id = first_id + rng.randrange(len(items))
+        items.append(make_raw_item(rng, item_id, search_query))
+    return items
+
+
+def make_clean_items(count, seed=0, first_id=BASE_ITEM_ID, search_query="laptop", specs_share=0.0):
+    rng = random.Random(seed)
+    return [make_clean_item(rng, first_id + i, search_query, specs_share) for i in range(count)]
+
+
+# Схема products до ключа item_id: суррогатный id и UNIQUE индекс по тексту ссылки
+LEGACY_PRODUCTS_SQL = '''
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        price REAL,
+        currency TEXT,
+        condition TEXT,
+        seller_name TEXT,
+        location TEXT,
+        shipping_price REAL,
+        rating REAL,
+        reviews_count INTEGER,
+        item_url TEXT UNIQUE,
+        scraped_at TEXT,
+        search_query TEXT,
+        specifications TEXT
+    )
+'''
+
+
+def create_legacy_database(db_name):
+    conn = sqlite3.connect(db_name)
+    conn.execute(LEGACY_PRODUCTS_SQL)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_scraped_at ON products(scraped_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_search_query ON products(search_query)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_price ON products(price)')
+    conn.commit()
+    conn.close()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    cards_per_page = 60
+
+    def do_GET(self):
+        stats = self.server.stats
+        with self.server.stats_lock:
+            stats['requests'] += 1
+            stats['in_flight'] += 1
+            stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+        try:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            self.respond()
+        finally:
+            with self.server.stats_lock:
+                stats['in_flight'] -= 1
+
+    def respond(self):
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+
+        if parsed.path.startswith('/challenge'):
+            html = '<html><body>Please verify yourself: captcha</body></html>'
+        elif parsed.path.startswith('/sch/'):
+            page_num = int(params.get('_pgn', ['1'])[0])
+            query = params.get('_nkw', ['laptop'])[0]
+            html = make_search_page(page_num, self.cards_per_page, query)
+        elif parsed.path.startswith('/itm/') and parsed.path[5:].isdigit():
+            html = make_product_page(int(parsed.path[5:]))
+        else:
+            self.send_error(404)
+            return
+
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(port=0, latency=0.0):
+    """
+    Запускает сервер в фоновом потоке, возвращает (server, base_url).
+    latency - задержка каждого ответа в секундах; server.stats - число запросов
+    и наибольшее число одновременных запросов (проверка пула потоков).
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    server.latency = latency
+    server.stats = {'requests': 0, 'in_flight': 0, 'max_in_flight': 0}
+    server.stats_lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def fixture_search_url(base_url):
+    return base_url + "/sch/i.html?_nkw={query}&_sacat=0&_from=R40&_pgn={page}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальный сервер с синтетическими страницами eBay')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(args.port)
+    print(f"Сервер запущен: {fixture_search_url(base_url)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -3,84 +3,305 @@ import os
 sys.path.append("/opt/airflow/dags/src")
 
 from airflow import DAG
+from airflow.decorators import task_group
 from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
 import logging
-import json
+import functools
+import itertools
+import re
 
-from scraper import scrape_ebay
-from cleaner import parse_html_pages
-from loader import load_and_save
+# Модули из src (selenium, bs4/lxml, pandas, numpy, pyarrow) импортируются внутри задач:
+# планировщик постоянно перечитывает этот файл, и разбор DAG не должен их загружать
 
 SEARCH_QUERY = "laptop"
+# Один запрос на строку; если файла нет, используется SEARCH_QUERY
+QUERIES_PATH = "/opt/airflow/dags/queries.txt"
 MAX_ITEMS = 100
+# Сколько запросов скрапится одновременно (каждый держит свой пул браузеров)
+MAX_PARALLEL_SCRAPES = 4
+POOL_SIZE = 3
+DRIVER_RECYCLE_AFTER = 20
+FETCH_BACKEND = "http"
+# Парсить карточки прямо во время загрузки (async_pipeline) вместо отдельного прохода в cleaning
+PARSE_WHILE_SCRAPING = True
+# Дозагрузка страниц товаров (продавец, характеристики и т.д.) перед сохранением
+ENRICH_ITEMS = False
+ENRICH_WORKERS = 8
+# Записывать в базу и обогащать только новые или изменившиеся товары
+INCREMENTAL = True
+# Кластеризовать почти-дубликаты (перевыставленные объявления) по базе: products.cluster_id
+NEAR_DUPLICATES = True
+# Процессы для парсинга HTML в cleaning (когда PARSE_WHILE_SCRAPING выключен)
+PARSE_WORKERS = os.cpu_count() or 1
 
-RAW_JSON_PATH = "/opt/airflow/dags/raw_items.json"
-CLEAN_JSON_PATH = "/opt/airflow/dags/clean_items.json"
+DATA_DIR = "/opt/airflow/dags/data"
 DB_NAME = "/opt/airflow/dags/ebay_products.db"
+# Общий для всех запусков кеш страниц: повтор упавшей задачи не качает страницы заново
+CACHE_PATH = "/opt/airflow/dags/cache/responses.db"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Колоночная история товаров для аналитики: search_query=<запрос>/scrape_date=<дата>/<запуск>.parquet
+PARQUET_DIR = "/opt/airflow/dags/parquet"
+# Метрики и спаны задач: <METRICS_DIR>/<run_id>/<задача>.json|.prom, сводка запуска - run.json|run.prom
+METRICS_DIR = "/opt/airflow/dags/metrics"
+# Файл для node_exporter --collector.textfile.directory (None - не копировать)
+METRICS_TEXTFILE = None
+
+
+def slugify(value):
+    return re.sub(r'[^\w-]+', '_', value.strip().lower()).strip('_') or 'query'
+
+
+def query_paths(search_query, run_id):
+    """Промежуточные файлы одного запроса в рамках одного запуска DAG"""
+    from storage import default_extension
+
+    run_dir = os.path.join(DATA_DIR, slugify(run_id))
+    os.makedirs(run_dir, exist_ok=True)
+    slug = slugify(search_query)
+    return {
+        # Каталог чекпоинта: страницы по одной + state.json; run_id при повторах задачи не меняется
+        "raw": os.path.join(run_dir, f"{slug}_pages"),
+        # Товары между задачами - сжатый JSON Lines: пишутся и читаются по одному
+        "clean": os.path.join(run_dir, f"{slug}_clean{default_extension()}"),
+        "enriched": os.path.join(run_dir, f"{slug}_enriched{default_extension()}"),
+    }
+
+
+def open_cache():
+    from response_cache import ResponseCache
+
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    return ResponseCache(CACHE_PATH, max_bytes=CACHE_MAX_BYTES)
+
+
+def traced(task, follows=None, merge_run=False):
+    """
+    Метрики и корневой спан задачи (metrics.task_metrics). follows(kwargs) -> [(task, query), ...]
+    задает задачи предыдущего шага, на которые ссылается спан; merge_run - после задачи
+    собрать метрики всего запуска в run.json / run.prom.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            from metrics import task_metrics, merge_run_metrics
+
+            run_id = slugify(kwargs["run_id"])
+            query = kwargs.get("search_query")
+            links = follows(kwargs) if follows else ()
+            with task_metrics(METRICS_DIR, run_id, task, query, links):
+                result = func(**kwargs)
+            if merge_run:
+                merged = merge_run_metrics(METRICS_DIR, run_id, METRICS_TEXTFILE)
+                logging.info(f"📈 RUN METRICS: {os.path.join(METRICS_DIR, run_id, 'run.json')} "
+                             f"({len(merged.spans)} spans)")
+            return result
+        return wrapper
+    return decorator
+
+
+def last_query_stage():
+    return "enrichment" if ENRICH_ITEMS else "cleaning"
+
+
+def check_checkpoint(checkpoint):
+    # Падение задачи запускает повтор Airflow, который догрузит только пропущенные страницы
+    # missing_pages считает и упавшие последние страницы: ожидаемое число страниц лежит в чекпоинте
+    missing = checkpoint.missing_pages()
+    if missing or not checkpoint.finished:
+        raise Exception(f"❌ SCRAPING INCOMPLETE: missing pages {missing}, "
+                        f"expected {checkpoint.expected_pages}, retry resumes from checkpoint")
+
+
+# ---------- 0. QUERIES ----------
+def get_queries_task():
+    queries = []
+    if os.path.exists(QUERIES_PATH):
+        with open(QUERIES_PATH, "r", encoding="utf-8") as f:
+            for line in f:
+                query = line.strip()
+                if query and not query.startswith("#") and query not in queries:
+                    queries.append(query)
+
+    if not queries:
+        queries = [SEARCH_QUERY]
+
+    logging.info(f"🔎 QUERIES: {len(queries)}")
+    return queries
+
 
 # ---------- 1. SCRAPING ----------
-def scraping_task():
-    logging.info("🚀 START SCRAPING TASK")
+@traced("scraping")
+def scraping_task(search_query, run_id):
+    from scraper import iter_search_pages
+    from async_pipeline import scrape_and_parse
+    from storage import PageCheckpoint
 
-    html_pages = scrape_ebay(
-        search_query=SEARCH_QUERY,
-        max_items=MAX_ITEMS,
-        save_html=False   
-    )
+    logging.info(f"🚀 START SCRAPING TASK: {search_query}")
+    paths = query_paths(search_query, run_id)
 
-    if not html_pages:
-        raise Exception("❌ SCRAPING FAILED: No pages downloaded")
+    # Каждая страница сохраняется в чекпоинт сразу после загрузки;
+    # повтор задачи продолжает с первой недостающей страницы
+    checkpoint = PageCheckpoint(paths["raw"])
+    if checkpoint.pages:
+        logging.info(f"↩️ RESUMING FROM CHECKPOINT: {len(checkpoint.pages)} pages done, "
+                     f"first missing page {checkpoint.first_missing_page()}")
+
+    if PARSE_WHILE_SCRAPING:
+        with open_cache() as cache:
+            raw_items = scrape_and_parse(
+                search_query=search_query,
+                max_items=MAX_ITEMS,
+                pool_size=POOL_SIZE,
+                recycle_after=DRIVER_RECYCLE_AFTER,
+                backend=FETCH_BACKEND,
+                cache=cache,
+                checkpoint=checkpoint
+            )
+            logging.info(f"🗄️ CACHE: {cache.stats}")
 
-    with open(RAW_JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(html_pages, f)
+        if not raw_items:
+            raise Exception("❌ SCRAPING FAILED: No items parsed")
+        check_checkpoint(checkpoint)
 
-    logging.info(f"✅ SCRAPING DONE. Pages saved: {len(html_pages)}")
-    logging.info(f"💾 RAW DATA SAVED TO: {RAW_JSON_PATH}")
+        logging.info(f"✅ SCRAPING DONE. Items parsed: {len(raw_items)}")
+        logging.info(f"💾 RAW ITEMS SAVED TO: {paths['raw']} ({len(checkpoint.pages)} pages)")
+        return
+
+    with open_cache() as cache:
+        for page_num, html in iter_search_pages(
+            search_query=search_query,
+            max_items=MAX_ITEMS,
+            save_html=False,
+            pool_size=POOL_SIZE,
+            recycle_after=DRIVER_RECYCLE_AFTER,
+            backend=FETCH_BACKEND,
+            cache=cache,
+            checkpoint=checkpoint
+        ):
+            logging.info(f"📄 PAGE {page_num} CHECKPOINTED")
+        logging.info(f"🗄️ CACHE: {cache.stats}")
+
+    if not checkpoint.pages:
+        raise Exception("❌ SCRAPING FAILED: No pages downloaded")
+    check_checkpoint(checkpoint)
+
+    logging.info(f"✅ SCRAPING DONE. Pages saved: {len(checkpoint.pages)}")
+    logging.info(f"💾 RAW DATA SAVED TO: {paths['raw']}")
 
 
 # ---------- 2. CLEANING ----------
-def cleaning_task():
-    logging.info("🧹 START CLEANING TASK")
+@traced("cleaning", follows=lambda kwargs: [("scraping", kwargs["search_query"])])
+def cleaning_task(search_query, run_id):
+    from cleaner import iter_html_items, iter_clean_items
+    from storage import PageCheckpoint, iter_html_pages, iter_parsed_items, write_items
 
-    if not os.path.exists(RAW_JSON_PATH):
+    logging.info(f"🧹 START CLEANING TASK: {search_query}")
+    paths = query_paths(search_query, run_id)
+
+    if not os.path.exists(paths["raw"]):
         raise Exception("❌ RAW FILE NOT FOUND")
 
-    with open(RAW_JSON_PATH, "r", encoding="utf-8") as f:
-        html_pages = json.load(f)
+    # Незавершенный чекпоинт (скрапинг исчерпал повторы) тоже чистится - по готовым страницам
+    checkpoint = PageCheckpoint(paths["raw"])
+    if not checkpoint.finished:
+        logging.warning(f"⚠️ PARTIAL CHECKPOINT: {len(checkpoint.pages)} pages, last page {checkpoint.last_page}")
+
+    if PARSE_WHILE_SCRAPING:
+        raw_items = iter_parsed_items(checkpoint)
+    else:
+        raw_items = iter_html_items(iter_html_pages(checkpoint), workers=PARSE_WORKERS)
 
-    cleaned_items = parse_html_pages(html_pages)
+    # Страницы читаются, чистятся и пишутся потоком: весь список товаров в памяти не собирается
+    cleaned_items = (
+        dict(item, search_query=search_query) for item in iter_clean_items(raw_items)
+    )
+    cleaned_count = write_items(cleaned_items, paths["clean"])
 
-    if not cleaned_items:
+    if not cleaned_count:
         raise Exception("❌ CLEANING FAILED: No valid items")
 
-    with open(CLEAN_JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(cleaned_items, f, ensure_ascii=False, indent=2)
+    logging.info(f"✅ CLEANING DONE. Clean items: {cleaned_count}")
+    logging.info(f"💾 CLEAN DATA SAVED TO: {paths['clean']}")
+    return paths["clean"]
 
-    logging.info(f"✅ CLEANING DONE. Clean items: {len(cleaned_items)}")
-    logging.info(f"💾 CLEAN DATA SAVED TO: {CLEAN_JSON_PATH}")
 
+# ---------- 3. ENRICHMENT (optional) ----------
+@traced("enrichment", follows=lambda kwargs: [("cleaning", kwargs["search_query"])])
+def enrichment_task(search_query, run_id):
+    from enrichment import enrich_items
+    from storage import iter_items, write_items
 
-# ---------- 3. LOADING ----------
-def loading_task():
-    logging.info("💾 START LOADING TASK")
+    logging.info(f"🔄 START ENRICHMENT TASK: {search_query}")
+    paths = query_paths(search_query, run_id)
 
-    if not os.path.exists(CLEAN_JSON_PATH):
+    if not os.path.exists(paths["clean"]):
         raise Exception("❌ CLEAN FILE NOT FOUND")
 
-    with open(CLEAN_JSON_PATH, "r", encoding="utf-8") as f:
-        items_data = json.load(f)
+    items_data = list(iter_items(paths["clean"]))
 
-    stats = load_and_save(
-        items_data=items_data,
-        search_query=SEARCH_QUERY,
-        save_json=False,
-        save_db=True,
-        db_name=DB_NAME
-    )
+    with open_cache() as cache:
+        enriched_items = enrich_items(
+            items_data,
+            workers=ENRICH_WORKERS,
+            db_name=DB_NAME if INCREMENTAL else None,
+            cache=cache
+        )
+        logging.info(f"🗄️ CACHE: {cache.stats}")
+
+    write_items(enriched_items, paths["enriched"])
+
+    logging.info(f"✅ ENRICHMENT DONE. Items: {len(enriched_items)}")
+    logging.info(f"💾 ENRICHED DATA SAVED TO: {paths['enriched']}")
+    return paths["enriched"]
+
+
+# ---------- 4. LOADING ----------
+@traced(
+    "loading",
+    follows=lambda kwargs: [
+        (last_query_stage(), query) for query in kwargs["ti"].xcom_pull(task_ids="get_queries") or []
+    ],
+    merge_run=True,
+)
+def loading_task(ti, run_id):
+    from loader import ProductStore, load_and_save
+    from storage import iter_items
+
+    logging.info("💾 START LOADING TASK")
+
+    last_task_id = f"query_pipeline.{last_query_stage()}"
+    items_paths = [path for path in (ti.xcom_pull(task_ids=last_task_id) or []) if path]
+    if not items_paths:
+        raise Exception("❌ CLEAN FILES NOT FOUND")
+
+    for items_path in items_paths:
+        if not os.path.exists(items_path):
+            raise Exception(f"❌ CLEAN FILE NOT FOUND: {items_path}")
+
+    # Файлы запросов читаются лениво, load_and_save берет товары пачками
+    items_data = itertools.chain.from_iterable(iter_items(items_path) for items_path in items_paths)
+    logging.info(f"📦 MERGING {len(items_paths)} QUERY OUTPUTS")
+
+    # Одно соединение на всю загрузку: схема проверяется один раз, запросы переиспользуются
+    with ProductStore(DB_NAME) as store:
+        stats = load_and_save(
+            items_data=items_data,
+            search_query=SEARCH_QUERY,
+            save_json=False,
+            save_db=True,
+            db_name=store,
+            incremental=INCREMENTAL,
+            near_duplicates=NEAR_DUPLICATES,
+            parquet_dir=PARQUET_DIR,
+            # Повтор задачи перезаписывает файлы своего запуска, а не дописывает их второй раз
+            run_id=slugify(run_id)
+        )
+        db_timings = store.timings
 
     logging.info("✅ LOADING DONE SUCCESSFULLY")
     logging.info(f"📊 LOAD STATS: {stats}")
+    logging.info(f"⏱️ DB TIMINGS: {db_timings}")
 
 
 # ---------- DAG SETTINGS ----------
@@ -94,26 +315,52 @@ default_args = {
 with DAG(
     dag_id="ebay_scraper_pipeline",           
     default_args=default_args,
-    description="Ebay Scraping → Cleaning → Loading Pipeline",
+    description="Ebay Scraping → Cleaning → Loading Pipeline (fan-out по запросам)",
     schedule_interval=timedelta(days=1),       
     start_date=datetime(2024, 1, 1),
     catchup=False,
+    max_active_tasks=16,
     tags=["ebay", "scraping", "etl"],
 ) as dag:
 
-    scrape = PythonOperator(
-        task_id="scraping",
-        python_callable=scraping_task,
+    queries = PythonOperator(
+        task_id="get_queries",
+        python_callable=get_queries_task,
     )
 
-    clean = PythonOperator(
-        task_id="cleaning",
-        python_callable=cleaning_task,
-    )
+    @task_group(group_id="query_pipeline")
+    def query_pipeline(search_query):
+        scrape = PythonOperator(
+            task_id="scraping",
+            python_callable=scraping_task,
+            op_kwargs={"search_query": search_query},
+            max_active_tis_per_dag=MAX_PARALLEL_SCRAPES,
+        )
+
+        clean = PythonOperator(
+            task_id="cleaning",
+            python_callable=cleaning_task,
+            op_kwargs={"search_query": search_query},
+            # Чистим то, что успел сохранить скрапинг, даже если его повторы закончились ошибкой
+            trigger_rule="all_done",
+        )
+
+        scrape >> clean
+
+        if ENRICH_ITEMS:
+            enrich = PythonOperator(
+                task_id="enrichment",
+                python_callable=enrichment_task,
+                op_kwargs={"search_query": search_query},
+            )
+            clean >> enrich
+            return enrich
+
+        return clean
 
     load = PythonOperator(
         task_id="loading",
         python_callable=loading_task,
     )
 
-    scrape >> clean >> load
+    query_pipeline.expand(search_query=queries.output) >> load
@@ -4,23 +4,72 @@ eBay Scraper Package
 Модульная система для парсинга eBay:
 - scraper: Загрузка страниц через Selenium
 - cleaner: Парсинг HTML и извлечение данных
+- columnar_cleaner: Колоночная очистка товаров на pandas
+- async_pipeline: Асинхронная загрузка с парсингом на лету
+- enrichment: Параллельная загрузка и парсинг страниц товаров
 - loader: Сохранение в JSON и SQLite
+- storage: Сжатые JSON Lines между задачами DAG
+- response_cache: Дисковый кеш загруженных страниц
+- parquet_sink: Выгрузка в Parquet с разбиением по запросу и дате
+- near_duplicates: Кластеры почти-дубликатов (MinHash/LSH)
+- metrics: Счетчики, гистограммы и спаны задач (JSON / Prometheus)
 """
 
 __version__ = '1.0.0'
 __author__ = 'eBay Scraper Team'
 
-from .scraper import scrape_ebay, setup_driver
-from .cleaner import parse_items, parse_html_pages
-from .loader import create_database, save_to_database, save_to_json, load_and_save
-
-__all__ = [
-    'scrape_ebay',
-    'setup_driver',
-    'parse_items',
-    'parse_html_pages',
-    'create_database',
-    'save_to_database',
-    'save_to_json',
-    'load_and_save',
-]
+import importlib
+
+# Экспорты загружаются при первом обращении (PEP 562): import src не тянет
+# selenium, bs4, pandas и pyarrow, пока не понадобится модуль, который их использует
+_EXPORTS = {
+    'scrape_ebay': 'scraper',
+    'iter_search_pages': 'scraper',
+    'setup_driver': 'scraper',
+    'parse_items': 'cleaner',
+    'parse_html_pages': 'cleaner',
+    'clean_parsed_items': 'cleaner',
+    'iter_clean_items': 'cleaner',
+    'scrape_ebay_async': 'async_pipeline',
+    'scrape_and_parse': 'async_pipeline',
+    'enrich_items': 'enrichment',
+    'ProductStore': 'loader',
+    'create_database': 'loader',
+    'save_to_database': 'loader',
+    'save_to_json': 'loader',
+    'load_and_save': 'loader',
+    'get_price_series': 'loader',
+    'get_latest_prices': 'loader',
+    'search_products': 'loader',
+    'RecordWriter': 'storage',
+    'iter_records': 'storage',
+    'iter_html_pages': 'storage',
+    'iter_parsed_items': 'storage',
+    'JsonArrayWriter': 'storage',
+    'write_items': 'storage',
+    'iter_items': 'storage',
+    'ResponseCache': 'response_cache',
+    'assign_clusters': 'near_duplicates',
+    'index_products': 'near_duplicates',
+    'save_to_parquet': 'parquet_sink',
+    'read_parquet': 'parquet_sink',
+    'METRICS': 'metrics',
+    'task_metrics': 'metrics',
+    'merge_run_metrics': 'metrics',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    # Следующие обращения идут мимо __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,173 @@
+"""
+Асинхронный конвейер: загрузка страниц и парсинг карточек идут одновременно.
+
+Загруженные страницы попадают в ограниченную очередь и сразу парсятся
+в отдельном executor, пока следующие страницы еще скачиваются.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .scraper import (
+        DriverPool, RateLimiter, AdaptiveBackoff, HttpFetcher, fetch_search_page, pages_needed,
+        FETCH_BACKENDS, SEARCH_URL,
+    )
+    from .cleaner import parse_items
+except ImportError:
+    from scraper import (
+        DriverPool, RateLimiter, AdaptiveBackoff, HttpFetcher, fetch_search_page, pages_needed,
+        FETCH_BACKENDS, SEARCH_URL,
+    )
+    from cleaner import parse_items
+
+
+MAX_PAGES = 50
+
+
+async def scrape_ebay_async(search_query="laptop", max_items=100, pool_size=3, recycle_after=20,
+                            min_interval=0.5, backend="http", search_url=SEARCH_URL,
+                            queue_size=4, max_pages=MAX_PAGES, parse_executor=None,
+                            adaptive_backoff=True, on_page=None, cache=None, checkpoint=None):
+    """
+    Возвращает сырые товары (результат parse_items) в порядке страниц.
+
+    on_page(page_num, items) вызывается сразу после парсинга каждой страницы,
+    например для записи в storage.RecordWriter.
+    checkpoint - storage.PageCheckpoint: распарсенные страницы сохраняются в него,
+    при повторном запуске загружаются только недостающие страницы.
+    """
+    if backend not in FETCH_BACKENDS:
+        raise ValueError(f"Неизвестный backend: {backend}. Доступны: {', '.join(FETCH_BACKENDS)}")
+
+    loop = asyncio.get_running_loop()
+    pool = DriverPool(pool_size, recycle_after)
+    limiter = RateLimiter(min_interval, AdaptiveBackoff(min_delay=min_interval) if adaptive_backoff else None)
+    http_fetcher = HttpFetcher(pool_size=pool.size) if backend == "http" else None
+    fetch_executor = ThreadPoolExecutor(max_workers=pool.size)
+    own_parse_executor = parse_executor is None
+    if own_parse_executor:
+        parse_executor = ThreadPoolExecutor(max_workers=1)
+
+    page_queue = asyncio.Queue(maxsize=queue_size)
+    # Ограничивает число страниц "в работе" (загружается, в очереди или парсится),
+    # чтобы после набора max_items не было лишних загрузок
+    in_flight = asyncio.Semaphore(queue_size)
+    stop = asyncio.Event()
+    parsed_pages = {}
+    stats = {'fetched': 0, 'parsed_items': 0}
+
+    resume_last = 0
+    if checkpoint is not None:
+        # Нижняя граница числа страниц: если товаров на них не хватит, загрузка пойдет дальше
+        checkpoint.expect_pages(min(pages_needed(max_items), max_pages))
+        for record in checkpoint.iter_records():
+            parsed_pages[record['page']] = record['items']
+        stats['parsed_items'] = checkpoint.item_count()
+        resume_last = checkpoint.last_page
+        if parsed_pages:
+            print(f"↩️  Чекпоинт: готово страниц {len(parsed_pages)}, товаров {stats['parsed_items']}, "
+                  f"продолжение со страницы {checkpoint.first_missing_page()}")
+        if stats['parsed_items'] >= max_items or checkpoint.has_empty_page():
+            stop.set()
+
+    next_page = iter([page_num for page_num in range(2, max_pages + 1) if page_num not in parsed_pages])
+
+    async def fetch(page_num):
+        await in_flight.acquire()
+        try:
+            html = await loop.run_in_executor(
+                fetch_executor, fetch_search_page,
+                pool, limiter, search_query, page_num, False, http_fetcher, search_url, cache
+            )
+        except Exception as e:
+            print(f"\n❌ Ошибка при загрузке страницы {page_num}: {e}")
+            in_flight.release()
+            return
+        stats['fetched'] += 1
+        await page_queue.put((page_num, html))
+
+    async def producer():
+        while True:
+            await in_flight.acquire()
+            in_flight.release()
+            page_num = next(next_page, None)
+            # Пропуски внутри диапазона из чекпоинта дозагружаются и после остановки
+            if page_num is None or (stop.is_set() and page_num > resume_last):
+                return
+            await fetch(page_num)
+
+    async def consumer():
+        while True:
+            entry = await page_queue.get()
+            if entry is None:
+                return
+
+            page_num, html = entry
+            try:
+                items = await loop.run_in_executor(parse_executor, parse_items, html)
+            finally:
+                in_flight.release()
+            parsed_pages[page_num] = items
+            if checkpoint is not None:
+                checkpoint.save_page(page_num, {"page": page_num, "items": items})
+            if on_page is not None:
+                on_page(page_num, items)
+            stats['parsed_items'] += len(items)
+            print(f"📊 Страница {page_num}: {len(items)} товаров, всего: {stats['parsed_items']}")
+
+            if stop.is_set():
+                continue
+            if stats['parsed_items'] >= max_items:
+                print(f"\n✅ Собрано {stats['parsed_items']} товаров, загрузка остановлена")
+                stop.set()
+                # Страницы после этой уже не нужны, даже если ожидалось больше
+                if checkpoint is not None and checkpoint.expected_pages > page_num:
+                    checkpoint.expect_pages(page_num)
+            elif not items:
+                print(f"\n⚠️  Страница {page_num} пуста, дальше страниц нет")
+                stop.set()
+
+    async def fetch_pages():
+        # Первая страница грузится отдельно: на ней может потребоваться ручное решение CAPTCHA
+        if 1 not in parsed_pages:
+            await fetch(1)
+        await asyncio.gather(*(producer() for _ in range(pool.size)))
+        await page_queue.put(None)
+
+    try:
+        print("=" * 70)
+        print(f"Асинхронный конвейер: backend {backend}, потоков загрузки: {pool.size}, очередь: {queue_size}")
+
+        consumer_task = asyncio.create_task(consumer())
+        fetch_task = asyncio.create_task(fetch_pages())
+        try:
+            await asyncio.gather(consumer_task, fetch_task)
+        except BaseException:
+            # Ошибка парсинга, on_page или записи чекпоинта завершает весь конвейер:
+            # иначе загрузчики навсегда повиснут на заполненной очереди
+            stop.set()
+            for task in (consumer_task, fetch_task):
+                task.cancel()
+            await asyncio.gather(consumer_task, fetch_task, return_exceptions=True)
+            raise
+        # Упавшие страницы оставляют чекпоинт незавершенным: повтор задачи их дозагрузит
+        if checkpoint is not None and not checkpoint.missing_pages():
+            checkpoint.finish()
+
+        items = [item for page_num in sorted(parsed_pages) for item in parsed_pages[page_num]]
+        print(f"\n✓ Загружено страниц: {stats['fetched']}, распарсено товаров: {len(items)}")
+        return items
+
+    finally:
+        fetch_executor.shutdown(wait=True)
+        if own_parse_executor:
+            parse_executor.shutdown(wait=True)
+        if http_fetcher is not None:
+            http_fetcher.close()
+        print("\nЗакрытие браузеров...")
+        pool.close()
+
+
+def scrape_and_parse(search_query="laptop", max_items=100, **kwargs):
+    """Синхронная обертка над scrape_ebay_async для PythonOperator"""
+    return asyncio.run(scrape_ebay_async(search_query=search_query, max_items=max_items, **kwargs))
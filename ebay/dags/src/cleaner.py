@@ -1,10 +1,31 @@
-from bs4 import BeautifulSoup
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import contextlib
+import importlib.util
+import io
+import itertools
+import json
 import re
 import hashlib
+import time
 
+try:
+    from .item_ids import extract_item_id, canonical_item_url
+    from .metrics import METRICS, FINE_BUCKETS
+except ImportError:
+    from item_ids import extract_item_id, canonical_item_url
+    from metrics import METRICS, FINE_BUCKETS
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    etree = None
+    lxml_html = None
 
-import hashlib
+
+VALID_CURRENCIES = ["USD", "EUR", "GBP", "RUB", "CNY"]
 
 
 def normalize_text(text):
@@ -60,19 +81,23 @@ def normalize_currency(currency):
     
     currency = currency.upper().strip()
     
-    valid_currencies = ["USD", "EUR", "GBP", "RUB", "CNY"]
-    
-    return currency if currency in valid_currencies else "USD"
+    return currency if currency in VALID_CURRENCIES else "USD"
 
 
 def normalize_url(url):
     if not url or url == "N/A":
         return None
     
+    url = url.strip()
+    # Ссылка на объявление сводится к https://www.ebay.com/itm/<номер> без параметров
+    canonical = canonical_item_url(url)
+    if canonical:
+        return canonical
+    
     if '&' in url:
         url = url.split('&')[0]
     
-    return url.strip()
+    return url
 
 
 def normalize_datetime(dt_string):
@@ -101,6 +126,9 @@ def clean_item_data(item):
         'scraped_at': normalize_datetime(item.get('scraped_at')),
         'specifications': item.get('specifications')
     }
+    cleaned['item_id'] = extract_item_id(cleaned['item_url'])
+    # Отпечаток считается до обогащения, чтобы сравнение между запусками не зависело от него
+    cleaned['content_hash'] = get_item_fingerprint(cleaned)
     
     return cleaned
 
@@ -123,16 +151,32 @@ def get_item_hash(item):
     return hashlib.md5(unique_string.encode()).hexdigest()
 
 
+def get_item_key(item):
+    """Ключ дедупликации: номер объявления eBay, для ссылок без номера - get_item_hash"""
+    item_id = item.get('item_id') or extract_item_id(item.get('item_url'))
+    return item_id if item_id is not None else get_item_hash(item)
+
+
+def get_item_fingerprint(item):
+    """Хеш содержимого: тот же ключ, что get_item_hash, плюс цена, состояние и доставка"""
+    return content_fingerprint(get_item_hash(item), item.get('price'), item.get('condition'), item.get('shipping_price'))
+
+
+def content_fingerprint(item_hash, price, condition, shipping_price):
+    """get_item_fingerprint по готовому get_item_hash; columnar_cleaner считает им столбец content_hash"""
+    return hashlib.md5(f"{item_hash}_{price}_{condition}_{shipping_price}".encode()).hexdigest()
+
+
 def remove_duplicates(items):
-    seen_hashes = set()
+    seen_keys = set()
     unique_items = []
     duplicates_count = 0
     
     for item in items:
-        item_hash = get_item_hash(item)
+        item_key = get_item_key(item)
         
-        if item_hash not in seen_hashes:
-            seen_hashes.add(item_hash)
+        if item_key not in seen_keys:
+            seen_keys.add(item_key)
             unique_items.append(item)
         else:
             duplicates_count += 1
@@ -165,131 +209,161 @@ def parse_raw_price(raw_price):
         return 0
 
 
-def parse_product_page(html):
-    soup = BeautifulSoup(html, 'html.parser')
-    data = {}
+# Только такие JSON-скрипты страницы товара содержат нужные поля; остальные не декодируются
+PRODUCT_JSON_MARKERS = ('trustSignals', 'ABOUT_THIS_ITEM')
+
+
+def _parse_product_json(json_data, data):
+    if 'trustSignals' in json_data:
+        for signal in json_data['trustSignals']:
+            if 'textSpans' in signal:
+                for span in signal['textSpans']:
+                    text = span.get('text', '')
+                    if 'positive feedback' in text:
+                        match = re.search(r'([\d.]+)%', text)
+                        if match:
+                            data['rating'] = float(match.group(1))
+                    elif 'items sold' in text or 'sold' in text:
+                        sold_text = text.replace('items sold', '').replace('sold', '').strip()
+                        if 'K' in sold_text:
+                            num = float(sold_text.replace('K', '').strip())
+                            data['reviews_count'] = int(num * 1000)
+                        else:
+                            match = re.search(r'([\d,]+)', sold_text)
+                            if match:
+                                data['reviews_count'] = int(match.group(1).replace(',', ''))
     
-    try:
-        import json
-        script_tags = soup.find_all('script', type='application/json')
-        
-        for script in script_tags:
-            try:
-                json_data = json.loads(script.string)
-                
-                if 'trustSignals' in json_data:
-                    for signal in json_data['trustSignals']:
-                        if 'textSpans' in signal:
-                            for span in signal['textSpans']:
-                                text = span.get('text', '')
-                                if 'positive feedback' in text:
-                                    match = re.search(r'([\d.]+)%', text)
-                                    if match:
-                                        data['rating'] = float(match.group(1))
-                                elif 'items sold' in text or 'sold' in text:
-                                    sold_text = text.replace('items sold', '').replace('sold', '').strip()
-                                    if 'K' in sold_text:
-                                        num = float(sold_text.replace('K', '').strip())
-                                        data['reviews_count'] = int(num * 1000)
-                                    else:
-                                        match = re.search(r'([\d,]+)', sold_text)
-                                        if match:
-                                            data['reviews_count'] = int(match.group(1).replace(',', ''))
-                
-                if 'ABOUT_THIS_ITEM' in json_data:
-                    about_section = json_data['ABOUT_THIS_ITEM']
-                    if 'sections' in about_section and 'features' in about_section['sections']:
-                        features = about_section['sections']['features']
-                        if 'dataItems' in features:
-                            specs = {}
-                            for key, item in features['dataItems'].items():
-                                if isinstance(item, dict) and 'labels' in item and 'values' in item:
-                                    label = ''
-                                    if item['labels'] and 'textSpans' in item['labels'][0]:
-                                        label = item['labels'][0]['textSpans'][0].get('text', '')
-                                    
-                                    value = ''
-                                    if item['values'] and 'textSpans' in item['values'][0]:
-                                        value = item['values'][0]['textSpans'][0].get('text', '')
-                                    
-                                    if label and value:
-                                        specs[label] = value
-                            
-                            if specs:
-                                data['specifications'] = json.dumps(specs, ensure_ascii=False)
+    if 'ABOUT_THIS_ITEM' in json_data:
+        about_section = json_data['ABOUT_THIS_ITEM']
+        if 'sections' in about_section and 'features' in about_section['sections']:
+            features = about_section['sections']['features']
+            if 'dataItems' in features:
+                specs = {}
+                for key, item in features['dataItems'].items():
+                    if isinstance(item, dict) and 'labels' in item and 'values' in item:
+                        label = ''
+                        if item['labels'] and 'textSpans' in item['labels'][0]:
+                            label = item['labels'][0]['textSpans'][0].get('text', '')
+                        
+                        value = ''
+                        if item['values'] and 'textSpans' in item['values'][0]:
+                            value = item['values'][0]['textSpans'][0].get('text', '')
+                        
+                        if label and value:
+                            specs[label] = value
                 
-            except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
-                continue
-        
-        seller_elem = soup.select_one('div.x-sellercard-atf__info__about-seller a')
-        if seller_elem:
-            data['seller_name'] = normalize_text(seller_elem.get_text())
-        
-        feedback_elem = soup.select_one('span.ux-textspans--SECONDARY')
-        if feedback_elem:
-            feedback_text = feedback_elem.get_text()
-            match = re.search(r'\((\d+)\)', feedback_text)
-            if match:
-                data['seller_feedback_count'] = int(match.group(1))
-        
-        positive_elem = soup.select_one('span.ux-textspans--POSITIVE')
-        if positive_elem:
-            positive_text = positive_elem.get_text()
-            match = re.search(r'([\d.]+)%', positive_text)
-            if match:
-                data['seller_positive_feedback'] = float(match.group(1))
-        
-        location_elem = soup.select_one('div.ux-labels-values--shipping span.ux-textspans--SECONDARY')
-        if location_elem:
-            data['item_location'] = normalize_location(location_elem.get_text())
-        
-        shipping_elem = soup.select_one('span[data-testid="ux-labels-values__values-content"] span.ux-textspans')
-        if shipping_elem:
-            shipping_text = shipping_elem.get_text()
-            if 'Free' in shipping_text or 'Бесплатно' in shipping_text:
-                data['shipping_price'] = 0.0
-            else:
-                match = re.search(r'[\$€£]?\s?([\d,]+\.?\d*)', shipping_text)
-                if match:
-                    price_str = match.group(1).replace(',', '')
-                    data['shipping_price'] = float(price_str)
-        
-        condition_elem = soup.select_one('div.x-item-condition-text span.ux-textspans')
-        if condition_elem:
-            data['condition'] = normalize_condition(condition_elem.get_text())
-        
-        quantity_sold_elem = soup.select_one('span.ux-textspans--SECONDARY[data-testid="qty-sold"]')
-        if quantity_sold_elem:
-            sold_text = quantity_sold_elem.get_text()
-            match = re.search(r'([\d,]+)', sold_text)
-            if match:
-                data['quantity_sold'] = int(match.group(1).replace(',', ''))
-        
-        views_elem = soup.select_one('span.ux-textspans--SECONDARY[class*="views"]')
-        if views_elem:
-            views_text = views_elem.get_text()
-            match = re.search(r'([\d,]+)', views_text)
+                if specs:
+                    data['specifications'] = json.dumps(specs, ensure_ascii=False)
+
+
+def build_product_data(data, script_texts, texts, spec_rows):
+    """
+    Заполняет data данными страницы товара; общая часть для обоих движков parse_product_page.
+    При ошибке в data остается то, что успело заполниться.
+
+    script_texts - тексты <script type="application/json">, texts - тексты первых
+    найденных элементов по ключам seller, feedback, positive, location, shipping,
+    condition, quantity_sold, views, description (None - элемента нет),
+    spec_rows - пары (label, value) строк div.ux-labels-values.
+    """
+    for script_text in script_texts:
+        if not script_text or not any(marker in script_text for marker in PRODUCT_JSON_MARKERS):
+            continue
+        try:
+            _parse_product_json(json.loads(script_text), data)
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            continue
+    
+    if texts.get('seller') is not None:
+        data['seller_name'] = normalize_text(texts['seller'])
+    
+    if texts.get('feedback') is not None:
+        match = re.search(r'\((\d+)\)', texts['feedback'])
+        if match:
+            data['seller_feedback_count'] = int(match.group(1))
+    
+    if texts.get('positive') is not None:
+        match = re.search(r'([\d.]+)%', texts['positive'])
+        if match:
+            data['seller_positive_feedback'] = float(match.group(1))
+    
+    if texts.get('location') is not None:
+        data['item_location'] = normalize_location(texts['location'])
+    
+    shipping_text = texts.get('shipping')
+    if shipping_text is not None:
+        if 'Free' in shipping_text or 'Бесплатно' in shipping_text:
+            data['shipping_price'] = 0.0
+        else:
+            match = re.search(r'[\$€£]?\s?([\d,]+\.?\d*)', shipping_text)
             if match:
-                data['views_count'] = int(match.group(1).replace(',', ''))
+                price_str = match.group(1).replace(',', '')
+                data['shipping_price'] = float(price_str)
+    
+    if texts.get('condition') is not None:
+        data['condition'] = normalize_condition(texts['condition'])
+    
+    if texts.get('quantity_sold') is not None:
+        match = re.search(r'([\d,]+)', texts['quantity_sold'])
+        if match:
+            data['quantity_sold'] = int(match.group(1).replace(',', ''))
+    
+    if texts.get('views') is not None:
+        match = re.search(r'([\d,]+)', texts['views'])
+        if match:
+            data['views_count'] = int(match.group(1).replace(',', ''))
+    
+    if texts.get('description') is not None:
+        data['description'] = normalize_text(texts['description'])
+    
+    specs = {}
+    for label_text, value_text in spec_rows:
+        label = normalize_text(label_text)
+        value = normalize_text(value_text)
+        if label and value:
+            specs[label] = value
+    
+    if specs:
+        data['specifications'] = specs
+
+
+# Селекторы bs4-движка; lxml-движок проверяет те же условия за один проход по дереву
+PRODUCT_PAGE_SELECTORS = {
+    'seller': 'div.x-sellercard-atf__info__about-seller a',
+    'feedback': 'span.ux-textspans--SECONDARY',
+    'positive': 'span.ux-textspans--POSITIVE',
+    'location': 'div.ux-labels-values--shipping span.ux-textspans--SECONDARY',
+    'shipping': 'span[data-testid="ux-labels-values__values-content"] span.ux-textspans',
+    'condition': 'div.x-item-condition-text span.ux-textspans',
+    'quantity_sold': 'span.ux-textspans--SECONDARY[data-testid="qty-sold"]',
+    'views': 'span.ux-textspans--SECONDARY[class*="views"]',
+    'description': 'div.ux-layout-section__item--description',
+}
+
+
+def parse_product_page_bs4(html):
+    # bs4 импортируется только движком bs4: по умолчанию разбор идет на lxml
+    from bs4 import BeautifulSoup
+
+    data = {}
+    
+    try:
+        soup = BeautifulSoup(html, 'html.parser')
+        script_texts = (script.string for script in soup.find_all('script', type='application/json'))
         
-        description_elem = soup.select_one('div.ux-layout-section__item--description')
-        if description_elem:
-            data['description'] = normalize_text(description_elem.get_text())
+        texts = {}
+        for key, selector in PRODUCT_PAGE_SELECTORS.items():
+            elem = soup.select_one(selector)
+            texts[key] = elem.get_text() if elem else None
         
-        specs = {}
-        spec_rows = soup.select('div.ux-labels-values')
-        for row in spec_rows:
+        spec_rows = []
+        for row in soup.select('div.ux-labels-values'):
             label_elem = row.select_one('span.ux-textspans--BOLD')
             value_elem = row.select_one('span.ux-textspans:not(.ux-textspans--BOLD)')
-            
             if label_elem and value_elem:
-                label = normalize_text(label_elem.get_text())
-                value = normalize_text(value_elem.get_text())
-                if label and value:
-                    specs[label] = value
+                spec_rows.append((label_elem.get_text(), value_elem.get_text()))
         
-        if specs:
-            data['specifications'] = specs
+        build_product_data(data, script_texts, texts, spec_rows)
         
     except Exception as e:
         print(f"⚠️  Ошибка парсинга страницы товара: {e}")
@@ -297,6 +371,15 @@ def parse_product_page(html):
     return data
 
 
+def merge_product_data(item, product_data):
+    for key, value in product_data.items():
+        if value is not None:
+            if key not in item or item.get(key) is None or item.get(key) == 'Unknown':
+                item[key] = value
+    
+    return item
+
+
 def enrich_items_with_product_data(items_data, product_htmls):
     print("\n" + "="*70)
     print("🔄 ОБОГАЩЕНИЕ ДАННЫХ")
@@ -309,11 +392,7 @@ def enrich_items_with_product_data(items_data, product_htmls):
         
         if html:
             product_data = parse_product_page(html)
-            
-            for key, value in product_data.items():
-                if value is not None:
-                    if key not in enriched_item or enriched_item.get(key) is None or enriched_item.get(key) == 'Unknown':
-                        enriched_item[key] = value
+            merge_product_data(enriched_item, product_data)
             
             print(f"[{idx}/{len(items_data)}] ✓ Обогащено: +{len(product_data)} полей")
         else:
@@ -328,7 +407,89 @@ def enrich_items_with_product_data(items_data, product_htmls):
     return enriched_items
 
 
-def parse_items(html_content):
+def build_card_item(title_text, price_text, subtitle_text, span_texts, href):
+    """Собирает товар из текстов карточки; общая часть для обоих движков парсинга"""
+    title = "N/A"
+    if title_text is not None:
+        title = title_text.replace('Новое объявление', '').replace('Открывается в новом окне или вкладке', '').strip()
+    
+    if title in ["N/A", "Shop on eBay", ""]:
+        return None
+    
+    if price_text is None:
+        price_text = "$0"
+    price = parse_raw_price(price_text)
+    
+    currency = "USD"
+    if "EUR" in price_text or "€" in price_text:
+        currency = "EUR"
+    elif "GBP" in price_text or "£" in price_text:
+        currency = "GBP"
+    
+    condition = "Unknown"
+    if subtitle_text is not None:
+        if 'Совершенно новый' in subtitle_text or 'Brand New' in subtitle_text or 'New' in subtitle_text:
+            condition = "New"
+        elif 'Восстановлен' in subtitle_text or 'Refurbished' in subtitle_text:
+            condition = "Refurbished"
+        elif 'Б/у' in subtitle_text or 'Used' in subtitle_text or 'Pre-Owned' in subtitle_text:
+            condition = "Used"
+
+    seller_name = "Unknown"
+    
+    # Один проход по span'ам: первая строка "from:" - локация, первая строка про доставку - цена доставки
+    location = "Unknown"
+    location_found = False
+    shipping_price = 0
+    shipping_found = False
+    for text in span_texts:
+        if not location_found and (text.startswith('из:') or text.startswith('from:') or text.startswith('From:')):
+            location = text.replace('из:', '').replace('from:', '').replace('From:', '').strip()
+            location_found = True
+
+        if not shipping_found:
+            if 'Бесплатная' in text or 'Free' in text or 'бесплатная' in text:
+                shipping_price = 0
+                shipping_found = True
+            elif 'доставка' in text.lower() or 'shipping' in text.lower():
+                match = re.search(r'[\$€£]\s*[\d,\.]+', text)
+                if match:
+                    shipping_price = parse_raw_price(match.group())
+                shipping_found = True
+
+        if location_found and shipping_found:
+            break
+    
+    rating = 0
+    
+    reviews_count = 0
+    
+    item_url = "N/A"
+    if href:
+        item_url = href
+        if len(item_url) > 200:
+            item_url = item_url.split('&itmprp=')[0]
+    
+    scraped_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    return {
+        'title': title[:150], 
+        'price': price,
+        'currency': currency,
+        'condition': condition,
+        'seller_name': seller_name,
+        'location': location,
+        'shipping_price': shipping_price,
+        'rating': rating,
+        'reviews_count': reviews_count,
+        'item_url': item_url,
+        'scraped_at': scraped_at
+    }
+
+
+def parse_items_bs4(html_content):
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_content, 'html.parser')
     
     cards = soup.find_all('div', class_='su-card-container')
@@ -338,90 +499,118 @@ def parse_items(html_content):
     
     for idx, card in enumerate(cards):
         try:
-            title = "N/A"
             title_elem = card.find('span', class_='su-styled-text--header')
             if not title_elem:
                 title_elem = card.find('div', class_='s-card__title')
-            if title_elem:
-                title = title_elem.get_text(strip=True)
-                title = title.replace('Новое объявление', '').replace('Открывается в новом окне или вкладке', '').strip()
-            
-            if title in ["N/A", "Shop on eBay", ""]:
-                continue
+            title_text = title_elem.get_text(strip=True) if title_elem else None
             
             price_elem = card.find('span', class_='s-card__price')
-            price_text = price_elem.get_text(strip=True) if price_elem else "$0"
-            price = parse_raw_price(price_text)
-            
-            currency = "USD"
-            if "EUR" in price_text or "€" in price_text:
-                currency = "EUR"
-            elif "GBP" in price_text or "£" in price_text:
-                currency = "GBP"
+            price_text = price_elem.get_text(strip=True) if price_elem else None
             
-            condition = "Unknown"
             subtitle_elem = card.find('div', class_='s-card__subtitle')
-            if subtitle_elem:
-                subtitle_text = subtitle_elem.get_text()
-                if 'Совершенно новый' in subtitle_text or 'Brand New' in subtitle_text or 'New' in subtitle_text:
-                    condition = "New"
-                elif 'Восстановлен' in subtitle_text or 'Refurbished' in subtitle_text:
-                    condition = "Refurbished"
-                elif 'Б/у' in subtitle_text or 'Used' in subtitle_text or 'Pre-Owned' in subtitle_text:
-                    condition = "Used"
-
-            seller_name = "Unknown"
-            
-            location = "Unknown"
-            all_spans = card.find_all('span', class_='su-styled-text')
-            for span in all_spans:
-                text = span.get_text(strip=True)
-                if text.startswith('из:') or text.startswith('from:') or text.startswith('From:'):
-                    location = text.replace('из:', '').replace('from:', '').replace('From:', '').strip()
-                    break
-
-            shipping_price = 0
-            for span in all_spans:
-                text = span.get_text(strip=True)
-                if 'Бесплатная' in text or 'Free' in text or 'бесплатная' in text:
-                    shipping_price = 0
-                    break
-                elif 'доставка' in text.lower() or 'shipping' in text.lower():
-                    match = re.search(r'[\$€£]\s*[\d,\.]+', text)
-                    if match:
-                        shipping_price = parse_raw_price(match.group())
-                    break
+            subtitle_text = subtitle_elem.get_text() if subtitle_elem else None
             
-            rating = 0
+            span_texts = (span.get_text(strip=True) for span in card.find_all('span', class_='su-styled-text'))
             
-            reviews_count = 0
-            
-            item_url = "N/A"
             link_elem = card.find_parent('a')
             if not link_elem:
                 link_elem = card.find('a')
-            if link_elem and link_elem.get('href'):
-                item_url = link_elem.get('href')
-                if len(item_url) > 200:
-                    item_url = item_url.split('&itmprp=')[0]
+            href = link_elem.get('href') if link_elem else None
+            
+            item_data = build_card_item(title_text, price_text, subtitle_text, span_texts, href)
+            if item_data is not None:
+                data.append(item_data)
+            
+        except Exception as e:
+            print(f'Ошибка парсинга карточки #{idx}: {e}')
+            continue
+    
+    return data
+
+
+# ---------- lxml: быстрый движок parse_items ----------
+
+# bs4.get_text() не включает содержимое script/style
+_LXML_SKIP_TEXT_TAGS = {'script', 'style', 'template'}
+
+if lxml_html is not None:
+    _CARD_XPATH = etree.XPath(
+        "//div[contains(concat(' ', normalize-space(@class), ' '), ' su-card-container ')]"
+    )
+    _ANCESTOR_LINK_XPATH = etree.XPath("ancestor::a[1]")
+
+
+def _lxml_strings(element):
+    if element.text and element.tag not in _LXML_SKIP_TEXT_TAGS:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str):
+            yield from _lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _lxml_text(element, strip=False):
+    if strip:
+        return ''.join(text.strip() for text in _lxml_strings(element) if text.strip())
+    return ''.join(_lxml_strings(element))
+
+
+def _lxml_document(html_content):
+    if isinstance(html_content, str) and html_content.lstrip().startswith('<?xml'):
+        html_content = html_content.encode('utf-8')
+    parser = lxml_html.HTMLParser(encoding='utf-8') if isinstance(html_content, bytes) else None
+    return etree.fromstring(html_content, parser or lxml_html.HTMLParser())
+
+
+def parse_items_lxml(html_content):
+    """Тот же результат, что parse_items_bs4, но один проход по каждой карточке на lxml"""
+    if lxml_html is None:
+        raise RuntimeError("Для движка 'lxml' нужен пакет lxml (pip install lxml)")
+    
+    document = _lxml_document(html_content) if html_content else None
+    cards = _CARD_XPATH(document) if document is not None else []
+    data = []
+    
+    print(f'Найдено карточек товаров: {len(cards)}')
+    
+    for idx, card in enumerate(cards):
+        try:
+            header_elem = title_div = price_elem = subtitle_elem = inner_link = None
+            spans = []
             
-            scraped_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for elem in card.iterdescendants():
+                tag = elem.tag
+                if tag == 'span':
+                    classes = elem.get('class', '').split()
+                    if header_elem is None and 'su-styled-text--header' in classes:
+                        header_elem = elem
+                    if price_elem is None and 's-card__price' in classes:
+                        price_elem = elem
+                    if 'su-styled-text' in classes:
+                        spans.append(elem)
+                elif tag == 'div':
+                    classes = elem.get('class', '').split()
+                    if title_div is None and 's-card__title' in classes:
+                        title_div = elem
+                    if subtitle_elem is None and 's-card__subtitle' in classes:
+                        subtitle_elem = elem
+                elif tag == 'a' and inner_link is None:
+                    inner_link = elem
             
-            item_data = {
-                'title': title[:150], 
-                'price': price,
-                'currency': currency,
-                'condition': condition,
-                'seller_name': seller_name,
-                'location': location,
-                'shipping_price': shipping_price,
-                'rating': rating,
-                'reviews_count': reviews_count,
-                'item_url': item_url,
-                'scraped_at': scraped_at
-            }
+            title_elem = header_elem if header_elem is not None else title_div
+            title_text = _lxml_text(title_elem, strip=True) if title_elem is not None else None
+            price_text = _lxml_text(price_elem, strip=True) if price_elem is not None else None
+            subtitle_text = _lxml_text(subtitle_elem) if subtitle_elem is not None else None
+            span_texts = (_lxml_text(span, strip=True) for span in spans)
             
-            data.append(item_data)
+            parent_links = _ANCESTOR_LINK_XPATH(card)
+            link_elem = parent_links[0] if parent_links else inner_link
+            href = link_elem.get('href') if link_elem is not None else None
+            
+            item_data = build_card_item(title_text, price_text, subtitle_text, span_texts, href)
+            if item_data is not None:
+                data.append(item_data)
             
         except Exception as e:
             print(f'Ошибка парсинга карточки #{idx}: {e}')
@@ -430,64 +619,428 @@ def parse_items(html_content):
     return data
 
 
-def parse_html_pages(html_pages):
+PARSER_ENGINES = {
+    'bs4': parse_items_bs4,
+    'lxml': parse_items_lxml,
+}
+DEFAULT_PARSER_ENGINE = 'lxml' if lxml_html is not None else 'bs4'
+
+
+def parse_items(html_content, engine=None):
+    engine = engine or DEFAULT_PARSER_ENGINE
+    if engine not in PARSER_ENGINES:
+        raise ValueError(f"Неизвестный движок парсинга: {engine}. Доступны: {', '.join(PARSER_ENGINES)}")
+    start = time.perf_counter()
+    items = PARSER_ENGINES[engine](html_content)
+    elapsed = time.perf_counter() - start
+    
+    METRICS.observe('parse_page_seconds', elapsed, engine=engine)
+    if items:
+        METRICS.observe('parse_card_seconds', elapsed / len(items), FINE_BUCKETS, engine=engine)
+    METRICS.inc('cards_parsed_total', len(items), engine=engine)
+    return items
+
+
+# ---------- lxml: страница товара за один проход ----------
+
+_PRODUCT_PAGE_TAGS = ('div', 'span', 'a', 'script')
+
+
+def _product_page_contexts(elem, classes):
+    """Флаги элемента-контейнера: (about-seller, shipping, values-content, condition, строка характеристик)"""
+    if elem.tag == 'span':
+        return (False, False, elem.get('data-testid') == 'ux-labels-values__values-content', False, False)
+    return (
+        'x-sellercard-atf__info__about-seller' in classes,
+        'ux-labels-values--shipping' in classes,
+        False,
+        'x-item-condition-text' in classes,
+        'ux-labels-values' in classes,
+    )
+
+
+def parse_product_page_lxml(html):
+    """
+    Тот же результат, что parse_product_page_bs4, но за один проход iterwalk по
+    дереву lxml: селекторы PRODUCT_PAGE_SELECTORS проверяются по счетчикам открытых
+    контейнеров, а JSON декодируется только у скриптов с PRODUCT_JSON_MARKERS.
+    """
+    if lxml_html is None:
+        raise RuntimeError("Для движка 'lxml' нужен пакет lxml (pip install lxml)")
+    
+    data = {}
+    if not html or not html.strip():
+        return data
+    
+    try:
+        document = _lxml_document(html)
+        found = {}
+        script_texts = []
+        spec_rows = []
+        open_rows = []
+        # Сколько открыто контейнеров каждого вида (порядок как в _product_page_contexts)
+        depth = [0, 0, 0, 0, 0]
+        
+        for event, elem in etree.iterwalk(document, events=('start', 'end'), tag=_PRODUCT_PAGE_TAGS):
+            tag = elem.tag
+            if tag == 'script':
+                if event == 'start' and elem.get('type') == 'application/json':
+                    script_texts.append(elem.text)
+                continue
+            if tag == 'a':
+                if event == 'start' and depth[0]:
+                    found.setdefault('seller', elem)
+                continue
+            
+            class_attr = elem.get('class', '')
+            classes = class_attr.split()
+            contexts = _product_page_contexts(elem, classes)
+            if event == 'end':
+                for pos, opened in enumerate(contexts):
+                    if opened:
+                        depth[pos] -= 1
+                if contexts[4]:
+                    open_rows.pop()
+                continue
+            
+            # Условия потомков проверяются до открытия контейнеров самого элемента
+            if tag == 'span':
+                if 'ux-textspans--SECONDARY' in classes:
+                    found.setdefault('feedback', elem)
+                    if depth[1]:
+                        found.setdefault('location', elem)
+                    if elem.get('data-testid') == 'qty-sold':
+                        found.setdefault('quantity_sold', elem)
+                    if 'views' in class_attr:
+                        found.setdefault('views', elem)
+                if 'ux-textspans--POSITIVE' in classes:
+                    found.setdefault('positive', elem)
+                if 'ux-textspans' in classes:
+                    if depth[2]:
+                        found.setdefault('shipping', elem)
+                    if depth[3]:
+                        found.setdefault('condition', elem)
+                bold = 'ux-textspans--BOLD' in classes
+                for row in open_rows:
+                    if bold and row[0] is None:
+                        row[0] = elem
+                    if not bold and row[1] is None and 'ux-textspans' in classes:
+                        row[1] = elem
+            elif 'ux-layout-section__item--description' in classes:
+                found.setdefault('description', elem)
+            
+            for pos, opened in enumerate(contexts):
+                if opened:
+                    depth[pos] += 1
+            if contexts[4]:
+                row = [None, None]
+                spec_rows.append(row)
+                open_rows.append(row)
+        
+        texts = {key: _lxml_text(elem) for key, elem in found.items()}
+        spec_texts = [
+            (_lxml_text(label_elem), _lxml_text(value_elem))
+            for label_elem, value_elem in spec_rows
+            if label_elem is not None and value_elem is not None
+        ]
+        build_product_data(data, script_texts, texts, spec_texts)
+        
+    except Exception as e:
+        print(f"⚠️  Ошибка парсинга страницы товара: {e}")
+    
+    return data
+
+
+PRODUCT_PAGE_ENGINES = {
+    'bs4': parse_product_page_bs4,
+    'lxml': parse_product_page_lxml,
+}
+
+
+def parse_product_page(html, engine=None):
+    engine = engine or DEFAULT_PARSER_ENGINE
+    if engine not in PRODUCT_PAGE_ENGINES:
+        raise ValueError(f"Неизвестный движок парсинга: {engine}. Доступны: {', '.join(PRODUCT_PAGE_ENGINES)}")
+    return PRODUCT_PAGE_ENGINES[engine](html)
+
+
+# Меньше страниц парсится последовательно: запуск процессов дороже выигрыша
+PARALLEL_MIN_PAGES = 8
+
+
+def _parse_pages_chunk(html_chunk, engine=None):
+    """Парсинг пачки в процессе пула; метрики процесса возвращаются вместе с товарами"""
+    METRICS.reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pages = [parse_items(html, engine) for html in html_chunk]
+    return pages, METRICS.snapshot()
+
+
+def _merge_chunk_result(future):
+    pages, snapshot = future.result()
+    METRICS.merge(snapshot)
+    return pages
+
+
+def _iter_chunks(iterable, size):
+    chunk = []
+    for value in iterable:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_parsed_pages(html_pages, workers=1, chunksize=2, engine=None):
+    """
+    Отдает списки товаров по страницам в исходном порядке.
+
+    При workers > 1 страницы парсятся в ProcessPoolExecutor пачками по
+    chunksize; в работе одновременно не больше workers * 2 пачек, поэтому
+    ленивый источник страниц не читается в память целиком.
+    """
+    if workers <= 1:
+        for html in html_pages:
+            yield parse_items(html, engine)
+        return
+
+    max_pending = workers * 2
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in _iter_chunks(html_pages, chunksize):
+            if len(pending) >= max_pending:
+                yield from _merge_chunk_result(pending.popleft())
+            pending.append(executor.submit(_parse_pages_chunk, chunk, engine))
+
+        while pending:
+            yield from _merge_chunk_result(pending.popleft())
+
+
+def _plan_parsing(html_pages, workers, chunksize, min_parallel_pages):
+    """
+    Решает, нужен ли пул процессов; возвращает (html_pages, total_pages, workers).
+    html_pages может быть ленивым итератором (storage.iter_html_pages):
+    тогда первые min_parallel_pages страниц читаются заранее.
+    """
+    if hasattr(html_pages, '__len__'):
+        total_pages = len(html_pages)
+        small_input = total_pages < min_parallel_pages
+    else:
+        total_pages = '?'
+        html_pages = iter(html_pages)
+        head = list(itertools.islice(html_pages, min_parallel_pages))
+        small_input = len(head) < min_parallel_pages
+        html_pages = itertools.chain(head, html_pages)
+    
+    if workers > 1 and small_input:
+        print(f"Страниц меньше {min_parallel_pages}, параллельный парсинг не нужен")
+        workers = 1
+    elif workers > 1:
+        print(f"Параллельный парсинг: процессов {workers}, страниц в пачке {chunksize}")
+    
+    return html_pages, total_pages, workers
+
+
+def parse_html_pages(html_pages, workers=1, chunksize=2, min_parallel_pages=PARALLEL_MIN_PAGES, engine=None,
+                     cleaning_engine=None):
     all_items = []
     
     print("\n" + "="*70)
     print("Парсинг HTML страниц...")
     print("="*70)
     
-    for idx, html in enumerate(html_pages, 1):
-        print(f"\nПарсинг страницы {idx}/{len(html_pages)}...")
-        items = parse_items(html)
+    html_pages, total_pages, workers = _plan_parsing(html_pages, workers, chunksize, min_parallel_pages)
+    
+    for idx, items in enumerate(iter_parsed_pages(html_pages, workers, chunksize, engine), 1):
+        print(f"\nПарсинг страницы {idx}/{total_pages}...")
         all_items.extend(items)
         print(f"✓ Найдено товаров: {len(items)}")
         print(f"📊 Всего собрано: {len(all_items)}")
     
+    return clean_parsed_items(all_items, cleaning_engine)
+
+
+def iter_html_items(html_pages, workers=1, chunksize=2, min_parallel_pages=PARALLEL_MIN_PAGES, engine=None):
+    """Товары со всех страниц по одному, без общего списка - вход для iter_clean_items"""
+    html_pages, _, workers = _plan_parsing(html_pages, workers, chunksize, min_parallel_pages)
+    for items in iter_parsed_pages(html_pages, workers, chunksize, engine):
+        yield from items
+
+
+def filter_valid_items(items):
+    return [item for item in items if is_valid_item(item)]
+
+
+def clean_items(items):
+    return [clean_item_data(item) for item in items]
+
+
+def count_filled(items, fields):
+    return {field: sum(1 for item in items if item.get(field) is not None) for field in fields}
+
+
+# Шаги очистки для clean_parsed_items: 'python' работает со списком словарей,
+# 'pandas' (columnar_cleaner) - с DataFrame, результат у обоих одинаковый
+PYTHON_CLEANING_STAGES = {
+    'load': list,
+    'valid': filter_valid_items,
+    'clean': clean_items,
+    'dedup': remove_duplicates,
+    'filled': count_filled,
+    'dump': list,
+}
+
+CLEANING_ENGINES = ('python', 'pandas')
+DEFAULT_CLEANING_ENGINE = 'python'
+# С этого числа товаров clean_parsed_items без явного движка берет pandas (если он установлен):
+# на меньших выборках построение столбцов и импорт pandas дороже выигрыша
+PANDAS_MIN_ITEMS = 5000
+COMPLETENESS_FIELDS = ['price', 'condition', 'location', 'shipping_price']
+
+
+def choose_cleaning_engine(count, engine=None):
+    if engine:
+        return engine
+    if count >= PANDAS_MIN_ITEMS and importlib.util.find_spec('pandas') is not None:
+        return 'pandas'
+    return DEFAULT_CLEANING_ENGINE
+
+
+def get_cleaning_stages(engine=None):
+    engine = engine or DEFAULT_CLEANING_ENGINE
+    if engine not in CLEANING_ENGINES:
+        raise ValueError(f"Неизвестный движок очистки: {engine}, доступны: {', '.join(CLEANING_ENGINES)}")
+    
+    if engine == 'python':
+        return PYTHON_CLEANING_STAGES
+    
+    try:
+        from . import columnar_cleaner
+    except ImportError:
+        import columnar_cleaner
+    return columnar_cleaner.CLEANING_STAGES
+
+
+def clean_parsed_items(all_items, engine=None):
+    engine = choose_cleaning_engine(len(all_items), engine)
+    stages = get_cleaning_stages(engine)
+    
     print(f"\n{'='*70}")
     print("Очистка и нормализация данных...")
     print(f"{'='*70}")
     
 
     print(f"\n📋 Исходное количество товаров: {len(all_items)}")
-    valid_items = [item for item in all_items if is_valid_item(item)]
+    with METRICS.timer('clean_stage_seconds', stage='valid', engine=engine):
+        valid_items = stages['valid'](stages['load'](all_items))
     invalid_count = len(all_items) - len(valid_items)
     if invalid_count > 0:
         print(f"   ❌ Удалено невалидных товаров: {invalid_count}")
 
 
     print(f"\n🧹 Очистка данных...")
-    cleaned_items = [clean_item_data(item) for item in valid_items]
+    start = time.perf_counter()
+    cleaned_items = stages['clean'](valid_items)
+    _record_normalization(time.perf_counter() - start, len(cleaned_items), engine)
     print(f"   ✓ Очищено товаров: {len(cleaned_items)}")
 
 
     print(f"\n🔍 Удаление дубликатов...")
-    unique_items = remove_duplicates(cleaned_items)
+    with METRICS.timer('clean_stage_seconds', stage='dedup', engine=engine):
+        unique_items = stages['dedup'](cleaned_items)
     print(f"   ✓ Уникальных товаров: {len(unique_items)}")
     
-    final_items = [item for item in unique_items if is_valid_item(item)]
+    final_items = stages['valid'](unique_items)
+    filled_counts = stages['filled'](final_items, COMPLETENESS_FIELDS) if len(final_items) else {}
+    
+    print_cleaning_report(len(all_items), invalid_count, len(cleaned_items), len(unique_items),
+                          len(final_items), filled_counts)
+    _record_cleaning(len(all_items), invalid_count, len(cleaned_items), len(unique_items), len(final_items))
+    
+    with METRICS.timer('clean_stage_seconds', stage='dump', engine=engine):
+        return stages['dump'](final_items)
+
+
+def iter_clean_items(all_items):
+    """
+    Потоковая очистка: товары те же и в том же порядке, что у clean_parsed_items,
+    но отдаются по одному, как только очищены. all_items может быть ленивым
+    итератором (storage.iter_parsed_items), в памяти держатся только ключи дедупликации.
+    Отчет печатается, когда итератор исчерпан.
+    """
+    print(f"\n{'='*70}")
+    print("Потоковая очистка и нормализация данных...")
+    print(f"{'='*70}")
+    
+    total_count = invalid_count = unique_count = final_count = 0
+    filled_counts = dict.fromkeys(COMPLETENESS_FIELDS, 0)
+    seen_keys = set()
+    # Время нормализации копится локально: в реестр метрик - один раз в конце
+    clean_seconds = 0.0
     
+    for item in all_items:
+        total_count += 1
+        if not is_valid_item(item):
+            invalid_count += 1
+            continue
+        
+        start = time.perf_counter()
+        cleaned = clean_item_data(item)
+        clean_seconds += time.perf_counter() - start
+        item_key = get_item_key(cleaned)
+        if item_key in seen_keys:
+            continue
+        seen_keys.add(item_key)
+        unique_count += 1
+        
+        if not is_valid_item(cleaned):
+            continue
+        final_count += 1
+        for field in COMPLETENESS_FIELDS:
+            if cleaned.get(field) is not None:
+                filled_counts[field] += 1
+        yield cleaned
+    
+    print_cleaning_report(total_count, invalid_count, total_count - invalid_count, unique_count,
+                          final_count, filled_counts)
+    _record_normalization(clean_seconds, total_count - invalid_count, 'stream')
+    _record_cleaning(total_count, invalid_count, total_count - invalid_count, unique_count, final_count)
+
+
+def _record_normalization(seconds, count, engine):
+    METRICS.observe('clean_stage_seconds', seconds, stage='clean', engine=engine)
+    if count:
+        METRICS.observe('clean_item_seconds', seconds / count, FINE_BUCKETS, engine=engine)
+
+
+def _record_cleaning(total_count, invalid_count, cleaned_count, unique_count, final_count):
+    METRICS.inc('items_total', total_count, stage='input')
+    METRICS.inc('items_total', invalid_count, stage='invalid')
+    METRICS.inc('items_total', cleaned_count - unique_count, stage='duplicate')
+    METRICS.inc('items_total', final_count, stage='clean')
+
+
+def print_cleaning_report(total_count, invalid_count, cleaned_count, unique_count, final_count, filled_counts):
     print(f"\n{'='*70}")
     print("📊 СТАТИСТИКА ОЧИСТКИ:")
     print(f"{'='*70}")
-    print(f"   Исходных товаров:     {len(all_items)}")
+    print(f"   Исходных товаров:     {total_count}")
     print(f"   Невалидных:           -{invalid_count}")
-    print(f"   После очистки:        {len(cleaned_items)}")
-    print(f"   Дубликатов удалено:   -{len(cleaned_items) - len(unique_items)}")
-    print(f"   ИТОГО:                {len(final_items)}")
+    print(f"   После очистки:        {cleaned_count}")
+    print(f"   Дубликатов удалено:   -{cleaned_count - unique_count}")
+    print(f"   ИТОГО:                {final_count}")
     
     print(f"\n📈 ПОЛНОТА ДАННЫХ:")
     print(f"{'='*70}")
     
-    if final_items:
-        fields = ['price', 'condition', 'location', 'shipping_price']
-        for field in fields:
-            filled = sum(1 for item in final_items if item.get(field) is not None)
-            percentage = (filled / len(final_items)) * 100
-            print(f"   {field:20s}: {filled:4d}/{len(final_items)} ({percentage:.1f}%)")
+    if final_count:
+        for field in COMPLETENESS_FIELDS:
+            filled = filled_counts[field]
+            percentage = (filled / final_count) * 100
+            print(f"   {field:20s}: {filled:4d}/{final_count} ({percentage:.1f}%)")
     
     print(f"{'='*70}")
-    print(f"✅ Парсинг завершен! Всего товаров: {len(final_items)}")
+    print(f"✅ Парсинг завершен! Всего товаров: {final_count}")
     print(f"{'='*70}")
-    
-    return final_items
\ No newline at end of file
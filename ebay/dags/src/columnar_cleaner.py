@@ -0,0 +1,292 @@
+"""
+Колоночная очистка товаров на pandas.
+
+Те же шаги, что и в cleaner.clean_parsed_items (проверка, нормализация,
+удаление дубликатов, полнота данных), но над столбцами целиком, а не над
+каждым словарем по очереди. Результат совпадает с построчной очисткой
+(cleaner.clean_item_data): столбцы с непривычными типами значений
+(строки вместо чисел и т.п.) и редкие случаи, которые нельзя повторить
+векторно, обрабатываются теми же функциями из cleaner.
+"""
+import functools
+
+import pandas as pd
+
+try:
+    from .cleaner import (
+        normalize_text, normalize_price, normalize_currency, normalize_condition,
+        normalize_location, normalize_url, normalize_datetime, get_item_hash,
+        content_fingerprint, VALID_CURRENCIES,
+    )
+    from .item_ids import extract_item_id
+except ImportError:
+    from cleaner import (
+        normalize_text, normalize_price, normalize_currency, normalize_condition,
+        normalize_location, normalize_url, normalize_datetime, get_item_hash,
+        content_fingerprint, VALID_CURRENCIES,
+    )
+    from item_ids import extract_item_id
+
+
+RAW_FIELDS = [
+    'title', 'price', 'currency', 'condition', 'seller_name', 'location',
+    'shipping_price', 'rating', 'reviews_count', 'item_url', 'scraped_at', 'specifications',
+]
+# Порядок ключей как в cleaner.clean_item_data
+CLEANED_FIELDS = RAW_FIELDS + ['item_id', 'content_hash']
+
+_EMPTY_TEXT = ['', 'N/A', 'Unknown']
+_CONDITIONS = [
+    ('New', ['new', 'новый', 'brand new']),
+    ('Refurbished', ['refurbished', 'восстановлен', 'renewed']),
+    ('Used', ['used', 'б/у', 'pre-owned']),
+]
+_LOCATION_PREFIXES = ['from:', 'From:', 'из:']
+
+# Обычная ссылка eBay с номером сразу после /itm/: канонический вид собирается
+# из групп без urlsplit. Хост разбирается так же, как item_ids._EBAY_HOST_RE;
+# за номером допускаются только ? и #, иначе _ITM_PATH_RE может выбрать другой номер
+_ITEM_URL_RE = r'^(https?)://(?:[a-z0-9-]+\.)*?(ebay\.[a-z.]+)/itm/([0-9]{9,15})(?:[?#]|$)'
+# Часы, минуты и секунды ограничены явно: pandas принимает секунду 60, а strptime в datetime - нет
+_DATETIME_RE = r'[0-9]{4}-[0-9]{2}-[0-9]{2} (?:[01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]'
+_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _column_type(column):
+    return pd.api.types.infer_dtype(column, skipna=True)
+
+
+def _is_text(column):
+    return _column_type(column) in ('string', 'empty')
+
+
+def _is_number(column):
+    return _column_type(column) in ('floating', 'integer', 'mixed-integer-float', 'empty')
+
+
+def _apply(column, func):
+    """Построчная обработка функцией из cleaner (для непривычных типов и редких случаев)"""
+    return pd.Series([func(value) for value in column], index=column.index, dtype=object)
+
+
+def _by_unique_values(normalize):
+    """
+    Нормализация считается один раз на каждое различное значение столбца
+    (pd.factorize) и раскладывается обратно по кодам: заголовков, состояний,
+    локаций и дат в выдаче намного меньше, чем товаров.
+    """
+    @functools.wraps(normalize)
+    def wrapper(column):
+        codes, uniques = pd.factorize(column)
+        # Пустые значения получают код -1 и попадают на последний элемент - результат для None
+        uniques = pd.Series(list(uniques) + [None], dtype=object)
+        result = normalize(uniques)
+        if isinstance(result, tuple):
+            return tuple(pd.Series(part.to_numpy()[codes], index=column.index) for part in result)
+        return pd.Series(result.to_numpy()[codes], index=column.index)
+    return wrapper
+
+
+def _is_blank(column, empty_values):
+    return column.isna() | column.isin(empty_values)
+
+
+def _str_len(column):
+    return column.str.len().astype('float64')
+
+
+@_by_unique_values
+def _normalize_text(column):
+    if not _is_text(column):
+        return _apply(column, normalize_text)
+
+    text = column.str.replace(r'\s+', ' ', regex=True).str.strip()
+    return text.where(~_is_blank(column, _EMPTY_TEXT) & (text != ''))
+
+
+def _normalize_price(column):
+    if not _is_number(column):
+        return _apply(column, normalize_price)
+
+    values = pd.to_numeric(column, errors='coerce').astype('float64')
+    values = values.where(values > 0)
+    rounded = values.round(2)
+    # numpy округляет через x * 100 и иногда расходится с round() на последнем знаке;
+    # уже округленные цены (почти все) совпадают, остальные пересчитываются через round()
+    inexact = rounded.notna() & (rounded != values)
+    if inexact.any():
+        rounded[inexact] = [round(value, 2) for value in values[inexact]]
+    return rounded
+
+
+@_by_unique_values
+def _normalize_currency(column):
+    if not _is_text(column):
+        return _apply(column, normalize_currency)
+
+    currency = column.str.upper().str.strip()
+    return currency.where(currency.isin(VALID_CURRENCIES), 'USD')
+
+
+@_by_unique_values
+def _normalize_condition(column):
+    if not _is_text(column):
+        return _apply(column, normalize_condition)
+
+    lowered = column.str.lower().str.strip()
+    condition = column.str.title()
+    # Порядок проверок как в normalize_condition: сначала New, потом Refurbished, потом Used
+    for value, words in reversed(_CONDITIONS):
+        matched = pd.Series(False, index=column.index)
+        for word in words:
+            matched |= lowered.str.contains(word, regex=False, na=False)
+        condition = condition.mask(matched, value)
+    return condition.where(~_is_blank(column, ['', 'Unknown']))
+
+
+@_by_unique_values
+def _normalize_location(column):
+    if not _is_text(column):
+        return _apply(column, normalize_location)
+
+    location = column.str.strip()
+    for prefix in _LOCATION_PREFIXES:
+        location = location.str.replace(prefix, '', regex=False)
+    location = location.str.strip()
+    return location.str.title().where(~_is_blank(column, ['', 'Unknown']) & (location != ''))
+
+
+@_by_unique_values
+def _normalize_reviews_count(column):
+    return _apply(column, lambda value: int(value) if value else None)
+
+
+@_by_unique_values
+def _normalize_url(column):
+    """Канонические ссылки и номера объявлений; возвращает (item_url, item_id)"""
+    if not _is_text(column):
+        urls = _apply(column, normalize_url)
+        return urls, _apply(urls, extract_item_id)
+
+    parts = column.str.strip().str.extract(_ITEM_URL_RE)
+    matched = parts[2].notna() & ~_is_blank(column, ['', 'N/A'])
+    urls = (parts[0] + '://www.' + parts[1] + '/itm/' + parts[2]).astype(object)
+    item_ids = pd.Series(None, index=column.index, dtype=object)
+    item_ids[matched] = [int(item_id) for item_id in parts[2][matched]]
+
+    rest = ~matched
+    if rest.any():
+        rest_urls = _apply(column[rest], normalize_url)
+        urls[rest] = rest_urls
+        item_ids[rest] = _apply(rest_urls, extract_item_id)
+    return urls, item_ids
+
+
+@_by_unique_values
+def _normalize_datetime(column):
+    if not _is_text(column):
+        return _apply(column, normalize_datetime)
+
+    strict = column.str.fullmatch(_DATETIME_RE, na=False)
+    parsed = pd.to_datetime(column[strict], format=_DATETIME_FORMAT, errors='coerce')
+    valid = parsed.notna().reindex(column.index, fill_value=False)
+
+    scraped_at = column.where(valid)
+    empty = _is_blank(column, [''])
+    scraped_at[empty] = normalize_datetime(None)
+    # Нестандартные, но допустимые для strptime строки (лишние пробелы, :60 и т.п.)
+    rest = ~valid & ~empty
+    if rest.any():
+        scraped_at[rest] = _apply(column[rest], normalize_datetime)
+    return scraped_at
+
+
+def _to_list(column):
+    """Значения столбца как в словарях cleaner: None вместо NaN, питоновские типы"""
+    return column.astype(object).where(column.notna(), None).tolist()
+
+
+def items_to_frame(items):
+    return pd.DataFrame({
+        field: pd.Series([item.get(field) for item in items], dtype=object)
+        for field in RAW_FIELDS
+    })
+
+
+def filter_valid_items(frame):
+    """Векторный аналог cleaner.is_valid_item"""
+    title = frame['title']
+    valid = title.notna() & frame['item_url'].notna() & (_str_len(title) > 3)
+    return frame[valid]
+
+
+def clean_items(frame):
+    """Векторный аналог cleaner.clean_item_data без content_hash (считается в frame_to_items)"""
+    item_url, item_id = _normalize_url(frame['item_url'])
+    return pd.DataFrame({
+        'title': _normalize_text(frame['title']),
+        'price': _normalize_price(frame['price']),
+        'currency': _normalize_currency(frame['currency']),
+        'condition': _normalize_condition(frame['condition']),
+        'seller_name': _normalize_text(frame['seller_name']),
+        'location': _normalize_location(frame['location']),
+        'shipping_price': _normalize_price(frame['shipping_price']),
+        'rating': _normalize_price(frame['rating']),
+        'reviews_count': _normalize_reviews_count(frame['reviews_count']),
+        'item_url': item_url,
+        'scraped_at': _normalize_datetime(frame['scraped_at']),
+        'specifications': frame['specifications'],
+        'item_id': item_id,
+    }, index=frame.index)
+
+
+def _item_hashes(item_urls, titles, prices):
+    """cleaner.get_item_hash для каждой строки"""
+    return [
+        get_item_hash({'item_url': url, 'title': title, 'price': price})
+        for url, title, price in zip(item_urls, titles, prices)
+    ]
+
+
+def remove_duplicates(frame):
+    """Векторный аналог cleaner.remove_duplicates: ключ - номер объявления, иначе get_item_hash"""
+    keys = frame['item_id'].copy()
+    no_id = keys.isna()
+    if no_id.any():
+        rows = frame[no_id]
+        keys[no_id] = _item_hashes(_to_list(rows['item_url']), _to_list(rows['title']), _to_list(rows['price']))
+
+    duplicated = keys.duplicated(keep='first')
+    print(f"   🗑️  Удалено дубликатов: {int(duplicated.sum())}")
+
+    return frame[~duplicated]
+
+
+def count_filled(frame, fields):
+    return {field: int(frame[field].notna().sum()) for field in fields}
+
+
+def frame_to_items(frame):
+    """
+    Список словарей как у cleaner.clean_item_data. content_hash считается
+    здесь, только для строк, оставшихся после дедупликации и проверки.
+    """
+    columns = {field: _to_list(frame[field]) for field in CLEANED_FIELDS[:-1]}
+    item_hashes = _item_hashes(columns['item_url'], columns['title'], columns['price'])
+    columns['content_hash'] = list(map(
+        content_fingerprint, item_hashes, columns['price'], columns['condition'], columns['shipping_price']
+    ))
+    return [
+        dict(zip(CLEANED_FIELDS, values))
+        for values in zip(*(columns[field] for field in CLEANED_FIELDS))
+    ]
+
+
+CLEANING_STAGES = {
+    'load': items_to_frame,
+    'valid': filter_valid_items,
+    'clean': clean_items,
+    'dedup': remove_duplicates,
+    'filled': count_filled,
+    'dump': frame_to_items,
+}
@@ -0,0 +1,140 @@
+"""
+Обогащение товаров данными со страниц объявлений.
+
+Страницы товаров загружаются пулом потоков с ограниченным числом
+одновременных запросов; каждая страница парсится сразу после загрузки,
+поэтому в памяти не хранится весь HTML, а только результаты парсинга.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
+
+try:
+    from .http_fetcher import HttpFetcher, is_cacheable
+    from .scraper import RateLimiter
+    from .cleaner import parse_product_page, merge_product_data
+    from .loader import get_stored_fingerprints, item_content_hash
+    from .metrics import METRICS
+except ImportError:
+    from http_fetcher import HttpFetcher, is_cacheable
+    from scraper import RateLimiter
+    from cleaner import parse_product_page, merge_product_data
+    from loader import get_stored_fingerprints, item_content_hash
+    from metrics import METRICS
+
+
+def fetch_product_data(fetcher, limiter, url, cache=None):
+    """Загружает и сразу парсит страницу товара; HTML дальше не передается"""
+    html = cache.get(url) if cache is not None else None
+    source = 'cache'
+    if html is None:
+        source = 'http'
+        METRICS.observe('page_step_seconds', limiter.wait(), step='пауза')
+        start = time.perf_counter()
+        html = fetcher.fetch(url)
+        limiter.record(time.perf_counter() - start, ok=html is not None)
+        METRICS.observe('item_page_fetch_seconds', time.perf_counter() - start, ok=html is not None)
+        if html is None:
+            return None, 0
+        if cache is not None and is_cacheable(url, html, getattr(fetcher, 'required_marker', None)):
+            cache.put(url, html)
+    METRICS.inc('item_pages_fetched_total', source=source)
+    METRICS.inc('fetched_chars_total', len(html), source=source)
+
+    with METRICS.timer('item_page_parse_seconds'):
+        product_data = parse_product_page(html)
+    return product_data, len(html)
+
+
+def enrich_items(items_data, workers=8, min_interval=0.2, fetcher=None, report_every=1.0, db_name=None,
+                 cache=None):
+    """
+    Возвращает новый список товаров, дополненный полями со страниц товаров.
+
+    Если указан db_name (инкрементальный режим), страницы загружаются только
+    для новых товаров и товаров, чей отпечаток изменился с прошлой загрузки.
+    cache - response_cache.ResponseCache для страниц товаров.
+    """
+    print("\n" + "="*70)
+    print(f"🔄 ОБОГАЩЕНИЕ ДАННЫХ: {len(items_data)} товаров, потоков: {workers}")
+    print("="*70)
+
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = HttpFetcher(pool_size=workers, required_marker=None)
+    limiter = RateLimiter(min_interval)
+
+    enriched_items = [item.copy() for item in items_data]
+    stats = {'enriched': 0, 'failed': 0, 'skipped': 0, 'unchanged': 0, 'bytes': 0}
+    stored = {}
+    if db_name:
+        stored = get_stored_fingerprints((item.get('item_url') for item in enriched_items), db_name)
+    started = last_report = time.perf_counter()
+    done = 0
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        prefix = "✅ ИТОГО" if final else "📊"
+        print(f"{prefix} {done + stats['skipped'] + stats['unchanged']}/{len(enriched_items)} товаров | "
+              f"{done / elapsed:.1f} стр/сек | {stats['bytes'] / elapsed / 1024:.0f} КБ/сек | "
+              f"обогащено: {stats['enriched']}, ошибок: {stats['failed']}")
+
+    try:
+        # Окно задач ограничено, чтобы не ставить в очередь сразу тысячи страниц
+        max_pending = workers * 2
+        pending = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for idx, item in enumerate(enriched_items):
+                url = item.get('item_url')
+                if not url:
+                    stats['skipped'] += 1
+                    continue
+                if url in stored and stored[url] == item_content_hash(item):
+                    stats['unchanged'] += 1
+                    continue
+
+                if len(pending) >= max_pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done += _merge_result(future, enriched_items[pending.pop(future)], stats)
+
+                pending[executor.submit(fetch_product_data, fetcher, limiter, url, cache)] = idx
+
+                if time.perf_counter() - last_report >= report_every:
+                    report()
+                    last_report = time.perf_counter()
+
+            while pending:
+                finished, _ = wait(pending, timeout=report_every, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done += _merge_result(future, enriched_items[pending.pop(future)], stats)
+                if time.perf_counter() - last_report >= report_every:
+                    report()
+                    last_report = time.perf_counter()
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    report(final=True)
+    print(f"   Без ссылки пропущено: {stats['skipped']}")
+    if db_name:
+        print(f"   ⏭️  Без изменений (страница не загружалась): {stats['unchanged']}")
+    print("="*70)
+
+    return enriched_items
+
+
+def _merge_result(future, item, stats):
+    try:
+        product_data, size = future.result()
+    except Exception as e:
+        print(f"⚠️  Ошибка обогащения {item.get('item_url')}: {e}")
+        stats['failed'] += 1
+        return 1
+
+    if product_data is None:
+        stats['failed'] += 1
+    else:
+        merge_product_data(item, product_data)
+        stats['enriched'] += 1
+        stats['bytes'] += size
+    return 1
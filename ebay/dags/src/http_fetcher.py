@@ -0,0 +1,60 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Connection': 'keep-alive',
+}
+
+CARD_MARKER = 'su-card-container'
+
+
+def looks_like_challenge(url, html):
+    return "challenge" in url or "captcha" in html.lower()
+
+
+def is_cacheable(url, html, required_marker=CARD_MARKER):
+    """В кеш попадают только полноценные страницы: без CAPTCHA и с маркером, если он задан"""
+    if looks_like_challenge(url, html):
+        return False
+    return not required_marker or required_marker in html
+
+
+class HttpFetcher:
+    """Загрузка страниц без браузера через пул keep-alive соединений requests"""
+
+    def __init__(self, pool_size=10, timeout=15, headers=None, required_marker=CARD_MARKER):
+        self.timeout = timeout
+        self.required_marker = required_marker
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url):
+        """Возвращает HTML или None, если нужен полноценный браузер"""
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"⚠️  HTTP ошибка для {url}: {e}")
+            return None
+
+        html = response.text
+        if response.status_code != 200:
+            print(f"⚠️  HTTP {response.status_code} для {url}")
+            return None
+        if looks_like_challenge(response.url, html):
+            print(f"⚠️  Похоже на страницу проверки (CAPTCHA): {response.url}")
+            return None
+        if self.required_marker and self.required_marker not in html:
+            print(f"⚠️  В ответе нет карточек товаров: {url}")
+            return None
+
+        return html
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,66 @@
+"""
+Номер объявления eBay (item id) из ссылок любого вида.
+
+Один и тот же товар приходит по разным ссылкам (с _skw/hash/itmprp, с названием
+в пути, мобильная версия, старый ViewItem), поэтому дедупликация и ключ
+в базе строятся по числовому номеру, а не по тексту ссылки.
+"""
+import hashlib
+import re
+from urllib.parse import unquote, urlsplit
+
+
+# https://www.ebay.com/itm/186853524903?_skw=laptop, https://www.ebay.com/itm/some-title/186853524903,
+# https://m.ebay.com/itm/186853524903, https://www.ebay.com/i/186853524903
+_ITM_PATH_RE = re.compile(r'/(?:itm|i)/(?:[^/?#]+/)?(\d{9,15})(?:[/?#&.]|$)')
+# https://cgi.ebay.com/ws/eBayISAPI.dll?ViewItem&item=186853524903, /p/123?iid=186853524903
+_ITEM_PARAM_RE = re.compile(r'[?&](?:item|itemId|itemid|iid)=(\d{9,15})(?:&|#|$)')
+_EBAY_HOST_RE = re.compile(r'^(?:[\w-]+\.)*?(ebay\.[a-z.]+)$')
+
+
+def extract_item_id(url):
+    """Номер объявления eBay из ссылки на товар или None"""
+    if not url:
+        return None
+
+    # Ссылки-редиректы (rover) несут адрес товара в закодированном параметре
+    if '%2F' in url or '%2f' in url:
+        url = unquote(url)
+
+    match = _ITM_PATH_RE.search(url) or _ITEM_PARAM_RE.search(url)
+    return int(match.group(1)) if match else None
+
+
+def canonical_item_url(url):
+    """https://www.ebay.<домен>/itm/<номер> или None, если номера в ссылке нет"""
+    item_id = extract_item_id(url)
+    if item_id is None:
+        return None
+
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    ebay_host = _EBAY_HOST_RE.match(host)
+    if ebay_host:
+        host = 'www.' + ebay_host.group(1)
+    return f"{parts.scheme or 'https'}://{host or 'www.ebay.com'}/itm/{item_id}"
+
+
+def surrogate_item_id(value):
+    """
+    Стабильный отрицательный ключ для товаров без номера объявления:
+    не пересекается с настоящими номерами и помещается в INTEGER SQLite.
+    """
+    return -int(hashlib.md5(value.encode()).hexdigest()[:15], 16)
+
+
+def item_key(item_url, title=None, price=None):
+    """Первичный ключ products: номер объявления, для ссылок без номера - суррогатный ключ"""
+    item_id = extract_item_id(item_url)
+    if item_id is not None:
+        return item_id
+    return surrogate_item_id(item_url or f"{title}_{price}")
+
+
+def item_record_key(item):
+    """item_key для словаря товара; item_id, уже найденный при очистке (cleaner), не пересчитывается"""
+    return item.get('item_id') or item_key(item.get('item_url'), item.get('title'), item.get('price'))
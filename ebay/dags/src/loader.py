@@ -1,30 +1,62 @@
+import contextlib
 import sqlite3
 import json
 import os
+import re
+import time
 
+try:
+    from .item_ids import canonical_item_url, item_key, item_record_key
+    from .cleaner import get_item_fingerprint
+    from .metrics import METRICS
+    from .near_duplicates import create_tables as create_near_duplicate_tables, assign_clusters, index_products
+    from .parquet_sink import save_to_parquet, new_run_id
+    from .storage import open_writer
+except ImportError:
+    from item_ids import canonical_item_url, item_key, item_record_key
+    from cleaner import get_item_fingerprint
+    from metrics import METRICS
+    from near_duplicates import create_tables as create_near_duplicate_tables, assign_clusters, index_products
+    from parquet_sink import save_to_parquet, new_run_id
+    from storage import open_writer
 
-def create_database(db_name='ebay_products.db'):
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+
+# PRAGMA user_version: 2 - products с ключом item_id (номер объявления eBay),
+# 3 - cluster_id и таблицы почти-дубликатов, 4 - полнотекстовый индекс products_fts
+ITEM_ID_KEY_VERSION = 2
+SCHEMA_VERSION = 4
+
+PRODUCTS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        item_id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        price REAL,
+        currency TEXT,
+        condition TEXT,
+        seller_name TEXT,
+        location TEXT,
+        shipping_price REAL,
+        rating REAL,
+        reviews_count INTEGER,
+        item_url TEXT,
+        scraped_at TEXT,
+        search_query TEXT,
+        specifications TEXT,
+        content_hash TEXT,
+        cluster_id INTEGER
+    )
+'''
+
+
+def _create_schema(cursor):
+    """Таблицы, индексы и миграции; все шаги идемпотентны"""
+    # История цен создается до миграции: миграция переносит в нее все старые строки
+    _create_price_snapshots(cursor)
+    _migrate_to_item_id_key(cursor)
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            price REAL,
-            currency TEXT,
-            condition TEXT,
-            seller_name TEXT,
-            location TEXT,
-            shipping_price REAL,
-            rating REAL,
-            reviews_count INTEGER,
-            item_url TEXT UNIQUE,
-            scraped_at TEXT,
-            search_query TEXT,
-            specifications TEXT
-        )
-    ''')
+    # Ключ - номер объявления (INTEGER PRIMARY KEY = rowid), поэтому отдельный
+    # UNIQUE индекс по тексту ссылки не нужен
+    cursor.execute(PRODUCTS_TABLE_SQL.format(table='products'))
     
     cursor.execute('''
         CREATE INDEX IF NOT EXISTS idx_scraped_at ON products(scraped_at)
@@ -38,147 +70,833 @@ def create_database(db_name='ebay_products.db'):
         CREATE INDEX IF NOT EXISTS idx_price ON products(price)
     ''')
     
-    conn.commit()
-    conn.close()
-    print(f"✓ База данных '{db_name}' создана/обновлена")
+    if 'cluster_id' not in {row[1] for row in cursor.execute('PRAGMA table_info(products)')}:
+        cursor.execute('ALTER TABLE products ADD COLUMN cluster_id INTEGER')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cluster_id ON products(cluster_id)
+    ''')
+    
+    create_near_duplicate_tables(cursor)
+    
+    _create_search_index(cursor)
+    
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
 
 
-def save_to_database(items_data, search_query, db_name='ebay_products.db'):
-    if not items_data:
-        print("⚠️  Нет данных для сохранения в базу")
-        return 0
+def _create_price_snapshots(cursor):
+    # История цен: строки только добавляются, никогда не обновляются.
+    # Ключ (item_id, scraped_at) кластерный (WITHOUT ROWID), поэтому ряд цен
+    # одного товара за период - это один последовательный range scan
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_snapshots (
+            item_id INTEGER NOT NULL,
+            scraped_at TEXT NOT NULL,
+            price REAL,
+            currency TEXT,
+            shipping_price REAL,
+            condition TEXT,
+            search_query TEXT,
+            PRIMARY KEY (item_id, scraped_at)
+        ) WITHOUT ROWID
+    ''')
     
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_snapshots_scraped_at ON price_snapshots(scraped_at)
+    ''')
+
+
+# Полнотекстовый индекс по title и specifications. External content: текст хранится
+# только в products, индекс обновляет save_items пачками (ProductStore._sync_search_index).
+# Триггеры не используются: executemany выполняет UPSERT построчно, и FTS5 в триггере
+# замедлял запись в несколько раз. Кто пишет в products мимо save_items (near_duplicates
+# меняет только cluster_id), перестраивает индекс через rebuild_search_index()
+SEARCH_INDEX_SQL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        title, specifications,
+        content='products', content_rowid='item_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+'''
+
+SEARCH_TEXTS_SQL = 'SELECT item_id, title, specifications FROM products WHERE item_id IN ({placeholders})'
+SEARCH_INDEX_INSERT_SQL = 'INSERT INTO products_fts (rowid, title, specifications) VALUES (?, ?, ?)'
+SEARCH_INDEX_DELETE_SQL = '''
+    INSERT INTO products_fts (products_fts, rowid, title, specifications) VALUES ('delete', ?, ?, ?)
+'''
+
+
+def _create_search_index(cursor):
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+    cursor.execute(SEARCH_INDEX_SQL)
+    if not exists:
+        # Товары, сохраненные до появления индекса, индексируются один раз
+        cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+# Во сколько раз совпадение в title весомее совпадения в specifications (bm25)
+SEARCH_TITLE_WEIGHT = 5.0
+
+
+def match_expression(text):
+    """
+    Строка поиска -> запрос FTS5: каждое слово берется в кавычки (символы вроде - и :
+    не читаются как операторы), все слова обязательны; 'think*' - поиск по префиксу.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if not re.search(r'\w', word):
+            continue
+        terms.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def _migrate_to_item_id_key(cursor):
+    """
+    Перестраивает products старых версий (id AUTOINCREMENT + UNIQUE item_url) в таблицу
+    с ключом item_id. Ссылки приводятся к каноническому виду, строки одного объявления
+    схлопываются в одну - остается самая свежая. Каждая старая строка до схлопывания
+    сохраняется точкой в price_snapshots, так что ранние цены не теряются.
+    """
+    if cursor.execute('PRAGMA user_version').fetchone()[0] >= ITEM_ID_KEY_VERSION:
+        return False
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(products)')]
+    if not columns:
+        return False
+    
+    print("🔧 Миграция products: ключ item_id вместо id + UNIQUE item_url...")
+    cursor.execute('DROP TABLE IF EXISTS products_migration')
+    cursor.execute(PRODUCTS_TABLE_SQL.format(table='products_migration'))
     
-    inserted = 0
-    updated = 0
+    has_content_hash = 'content_hash' in columns
+    old_rows = cursor.execute(f'''
+        SELECT title, price, currency, condition, seller_name, location, shipping_price, rating,
+               reviews_count, item_url, scraped_at, search_query, specifications,
+               {'content_hash' if has_content_hash else 'NULL'}
+        FROM products
+        ORDER BY scraped_at, id
+    ''').fetchall()
     
-    for item in items_data:
+    rows = []
+    for row in old_rows:
+        item_url = canonical_item_url(row[9]) or row[9]
+        rows.append(row[:9] + (item_url,) + row[10:13] + (item_key(item_url, row[0], row[1]), row[13], None))
+    cursor.executemany(SNAPSHOT_SQL, [
+        (row[13], row[10], row[1], row[2], row[6], row[3], row[11]) for row in rows if row[10] is not None
+    ])
+    # Строки идут от старых к новым, поэтому при совпадении item_id побеждает последняя
+    cursor.executemany(UPSERT_SQL.replace('products', 'products_migration'), rows)
+    
+    cursor.execute('DROP TABLE products')
+    cursor.execute('ALTER TABLE products_migration RENAME TO products')
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'products'")
+    print(f"✓ Миграция завершена: строк было {len(old_rows)}, объявлений {len(set(row[13] for row in rows))}")
+    return True
+
+
+# Строка, в которой ничего не изменилось (повтор задачи с теми же данными), не переписывается:
+# SQLite не трогает ни ее, ни индексы products
+UPSERT_SQL = '''
+    INSERT INTO products (
+        title, price, currency, condition, seller_name, 
+        location, shipping_price, rating, reviews_count, 
+        item_url, scraped_at, search_query, specifications, item_id, content_hash, cluster_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(item_id) DO UPDATE SET
+        title = excluded.title,
+        price = excluded.price,
+        currency = excluded.currency,
+        condition = excluded.condition,
+        seller_name = excluded.seller_name,
+        location = excluded.location,
+        shipping_price = excluded.shipping_price,
+        rating = excluded.rating,
+        reviews_count = excluded.reviews_count,
+        scraped_at = excluded.scraped_at,
+        search_query = excluded.search_query,
+        item_url = excluded.item_url,
+        specifications = excluded.specifications,
+        content_hash = excluded.content_hash,
+        cluster_id = COALESCE(excluded.cluster_id, products.cluster_id)
+    WHERE (
+        products.title, products.price, products.currency, products.condition, products.seller_name,
+        products.location, products.shipping_price, products.rating, products.reviews_count,
+        products.scraped_at, products.search_query, products.item_url, products.specifications,
+        products.content_hash
+    ) IS NOT (
+        excluded.title, excluded.price, excluded.currency, excluded.condition, excluded.seller_name,
+        excluded.location, excluded.shipping_price, excluded.rating, excluded.reviews_count,
+        excluded.scraped_at, excluded.search_query, excluded.item_url, excluded.specifications,
+        excluded.content_hash
+    ) OR products.cluster_id IS NOT COALESCE(excluded.cluster_id, products.cluster_id)
+'''
+
+# Лимит параметров в одном запросе SQLite (SQLITE_MAX_VARIABLE_NUMBER в старых сборках)
+SQLITE_MAX_PARAMS = 900
+
+# Товар без изменений: строка не переписывается, сдвигается только время последнего наблюдения
+MARK_SEEN_SQL = 'UPDATE products SET scraped_at = ? WHERE item_id = ? AND (scraped_at IS NULL OR scraped_at < ?)'
+
+SNAPSHOT_SQL = '''
+    INSERT OR IGNORE INTO price_snapshots (
+        item_id, scraped_at, price, currency, shipping_price, condition, search_query
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def apply_pragmas(conn):
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-65536')
+    conn.execute('PRAGMA mmap_size=268435456')
+
+
+def item_content_hash(item):
+    return item.get('content_hash') or get_item_fingerprint(item)
+
+
+def _item_row(item, search_query):
+    specs = item.get('specifications')
+    if specs and isinstance(specs, dict):
+        specs = json.dumps(specs, ensure_ascii=False)
+    elif specs and not isinstance(specs, str):
+        specs = None
+    
+    return (
+        item['title'],
+        item['price'],
+        item['currency'],
+        item['condition'],
+        item['seller_name'],
+        item['location'],
+        item['shipping_price'],
+        item['rating'],
+        item['reviews_count'],
+        item['item_url'],
+        item['scraped_at'],
+        item.get('search_query') or search_query,
+        specs,
+        item_record_key(item),
+        item_content_hash(item),
+        item.get('cluster_id')
+    )
+
+
+def _snapshot_row(row):
+    _, price, currency, condition, _, _, shipping_price, _, _, _, scraped_at, search_query, _, item_id, _, _ = row
+    return (item_id, scraped_at, price, currency, shipping_price, condition, search_query)
+
+
+def _upsert_rows_one_by_one(cursor, rows):
+    """Сохраняет строки по одной, возвращает те, что удалось сохранить"""
+    saved = []
+    for row in rows:
         try:
-            specs = item.get('specifications')
-            if specs and isinstance(specs, dict):
-                specs = json.dumps(specs, ensure_ascii=False)
-            elif specs and not isinstance(specs, str):
-                specs = None
-            
-            cursor.execute('SELECT id FROM products WHERE item_url = ?', (item['item_url'],))
-            existing = cursor.fetchone()
-            
-            if existing:
-                cursor.execute('''
-                    UPDATE products SET
-                        title = ?,
-                        price = ?,
-                        currency = ?,
-                        condition = ?,
-                        seller_name = ?,
-                        location = ?,
-                        shipping_price = ?,
-                        rating = ?,
-                        reviews_count = ?,
-                        scraped_at = ?,
-                        search_query = ?,
-                        specifications = ?
-                    WHERE item_url = ?
-                ''', (
-                    item['title'],
-                    item['price'],
-                    item['currency'],
-                    item['condition'],
-                    item['seller_name'],
-                    item['location'],
-                    item['shipping_price'],
-                    item['rating'],
-                    item['reviews_count'],
-                    item['scraped_at'],
-                    search_query,
-                    specs,
-                    item['item_url']
-                ))
-                updated += 1
-            else:
-                cursor.execute('''
-                    INSERT INTO products (
-                        title, price, currency, condition, seller_name, 
-                        location, shipping_price, rating, reviews_count, 
-                        item_url, scraped_at, search_query, specifications
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    item['title'],
-                    item['price'],
-                    item['currency'],
-                    item['condition'],
-                    item['seller_name'],
-                    item['location'],
-                    item['shipping_price'],
-                    item['rating'],
-                    item['reviews_count'],
-                    item['item_url'],
-                    item['scraped_at'],
-                    search_query,
-                    specs
-                ))
-                inserted += 1
-                
+            cursor.execute(UPSERT_SQL, row)
+            saved.append(row)
         except sqlite3.IntegrityError:
             continue
         except Exception as e:
             print(f"⚠️  Ошибка при сохранении товара: {e}")
             continue
+    return saved
+
+
+def _in_params(values):
+    """
+    Плейсхолдеры для IN (...), дополненные NULL до степени двойки: текстов запроса
+    получается всего несколько, и подготовленные выражения берутся из кеша соединения.
+    """
+    size = 1
+    while size < len(values):
+        size *= 2
+    return ','.join('?' * size), list(values) + [None] * (size - len(values))
+
+
+# Пачка для IN (...): степень двойки, меньше SQLITE_MAX_PARAMS
+IN_CHUNK_SIZE = 512
+
+
+def _chunks(values, size=IN_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class ProductStore:
+    """
+    Одно соединение с базой товаров на весь запуск.
+
+    Схема создается и мигрируется один раз: версия (PRAGMA user_version)
+    читается при открытии и кешируется, при актуальной версии DDL не выполняется.
+    Тексты запросов постоянные, поэтому sqlite3 переиспользует подготовленные
+    выражения из кеша соединения. Записи идут через transaction() (вложенные
+    вызовы - SAVEPOINT), а время и число строк каждой операции копятся в timings.
+    """
+
+    def __init__(self, db_name='ebay_products.db', cached_statements=256):
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name, isolation_level=None, cached_statements=cached_statements)
+        apply_pragmas(self.conn)
+        self.timings = {}
+        self.schema_version = None
+        # Число строк products: COUNT(*) один раз на соединение, дальше его ведет save_items
+        self._row_count = None
+        self.ensure_schema()
+
+    @contextlib.contextmanager
+    def timed(self, operation):
+        """
+        Счетчик операции: вызовы, строки (counter['rows'] увеличивает сама операция), секунды.
+        То же уходит в metrics: db_operation_seconds и db_rows_total с меткой operation.
+        """
+        counter = self.timings.setdefault(operation, {'calls': 0, 'rows': 0, 'seconds': 0.0})
+        rows_before = counter['rows']
+        start = time.perf_counter()
+        try:
+            yield counter
+        finally:
+            elapsed = time.perf_counter() - start
+            counter['calls'] += 1
+            counter['seconds'] += elapsed
+            METRICS.observe('db_operation_seconds', elapsed, operation=operation)
+            METRICS.inc('db_rows_total', counter['rows'] - rows_before, operation=operation)
+
+    @contextlib.contextmanager
+    def transaction(self, name='store'):
+        """Транзакция (SAVEPOINT вне транзакции = BEGIN); при ошибке откатывается только своя часть"""
+        self.conn.execute(f'SAVEPOINT {name}')
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute(f'ROLLBACK TO {name}')
+            self.conn.execute(f'RELEASE {name}')
+            self._row_count = None
+            raise
+        self.conn.execute(f'RELEASE {name}')
+
+    def ensure_schema(self):
+        """Создает/мигрирует схему, если версия базы старее SCHEMA_VERSION; True - схема обновлена"""
+        with self.timed('ensure_schema'):
+            if self.schema_version is None:
+                self.schema_version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            if self.schema_version >= SCHEMA_VERSION:
+                return False
+            # IMMEDIATE: параллельные задачи ждут блокировку, а не падают на миграции;
+            # версия перечитывается - схему могла уже обновить другая задача
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self.conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                    _create_schema(self.conn.cursor())
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.schema_version = SCHEMA_VERSION
+        print(f"✓ База данных '{self.db_name}' создана/обновлена")
+        return True
+
+    def save_items(self, items_data, search_query, batch_size=1000):
+        if not items_data:
+            print("⚠️  Нет данных для сохранения в базу")
+            return 0
+        
+        with self.timed('save_items') as counter:
+            rows = []
+            for item in items_data:
+                try:
+                    row = _item_row(item, search_query)
+                except Exception as e:
+                    print(f"⚠️  Ошибка при сохранении товара: {e}")
+                    continue
+                # title NOT NULL: такие строки раньше отбрасывались через IntegrityError
+                if row[0] is None:
+                    continue
+                rows.append(row)
+            
+            # Все пачки - в одной транзакции; пачка с ошибкой откатывается до SAVEPOINT
+            # и сохраняется построчно, как раньше.
+            # Новые строки - item_id пачки, которых не было в базе до записи, остальные - обновления
+            cursor = self.conn.cursor()
+            with self.transaction('save_items'):
+                total = self.row_count()
+                # В пустой таблице прежний текст строки может быть только из предыдущей пачки
+                # этого же вызова: он известен, и читать тексты из базы не нужно
+                written_texts = {} if self._is_empty() else None
+                saved = 0
+                inserted = 0
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    item_ids = {row[13] for row in batch}
+                    
+                    cursor.execute('SAVEPOINT batch')
+                    if written_texts is None:
+                        indexed_texts = self._search_texts(item_ids)
+                    else:
+                        indexed_texts = {item_id: written_texts[item_id] for item_id in item_ids & written_texts.keys()}
+                    saved_rows = batch
+                    try:
+                        cursor.executemany(UPSERT_SQL, batch)
+                    except sqlite3.Error:
+                        cursor.execute('ROLLBACK TO batch')
+                        saved_rows = _upsert_rows_one_by_one(cursor, batch)
+                    # UPSERT переписывает title и specifications: в базе тексты сохраненных строк
+                    # (последний повтор побеждает), у несохраненных - прежние
+                    new_texts = dict(indexed_texts)
+                    new_texts.update((row[13], (row[0], row[12])) for row in saved_rows)
+                    if written_texts is not None:
+                        written_texts.update(new_texts)
+                    saved += len(saved_rows)
+                    inserted += len(new_texts.keys() - indexed_texts.keys())
+                    # Снимок цены - только для строк, которые попали в products
+                    cursor.executemany(SNAPSHOT_SQL, [_snapshot_row(row) for row in saved_rows if row[10]])
+                    self._sync_search_index(indexed_texts, new_texts)
+                    cursor.execute('RELEASE batch')
+                
+                updated = saved - inserted
+            total += inserted
+            self._row_count = total
+            counter['rows'] += inserted + updated
+        
+        print(f"\n{'='*70}")
+        print(f"💾 Сохранение в базу данных '{self.db_name}':")
+        print(f"   ✓ Добавлено новых записей: {inserted}")
+        print(f"   ✓ Обновлено записей: {updated}")
+        print(f"   ✓ Всего в базе: {total}")
+        print(f"{'='*70}")
+        
+        return inserted + updated
+
+    def _is_empty(self):
+        return self.conn.execute('SELECT 1 FROM products LIMIT 1').fetchone() is None
+
+    def _search_texts(self, item_ids):
+        """{item_id: (title, specifications)} - текст строк, как он сейчас лежит в индексе"""
+        texts = {}
+        for chunk in _chunks(item_ids):
+            placeholders, params = _in_params(chunk)
+            for item_id, title, specifications in self.conn.execute(
+                SEARCH_TEXTS_SQL.format(placeholders=placeholders), params
+            ):
+                texts[item_id] = (title, specifications)
+        return texts
+
+    def _sync_search_index(self, before, after):
+        """
+        Обновляет products_fts для пачки: before и after - тексты строк до и после записи.
+        Старая запись индекса удаляется и добавляется новая только там, где title или
+        specifications изменились.
+        """
+        with self.timed('search_index') as counter:
+            deleted = [(item_id,) + text for item_id, text in before.items() if after.get(item_id) != text]
+            inserted = [(item_id,) + text for item_id, text in after.items() if before.get(item_id) != text]
+            self.conn.executemany(SEARCH_INDEX_DELETE_SQL, deleted)
+            self.conn.executemany(SEARCH_INDEX_INSERT_SQL, inserted)
+            counter['rows'] += len(inserted)
+
+    def rebuild_search_index(self):
+        """Перестраивает products_fts по всей таблице products"""
+        with self.timed('rebuild_search_index') as counter:
+            with self.transaction('rebuild_search_index'):
+                self.conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+            counter['rows'] += self.row_count()
+
+    def stored_fingerprints(self, item_urls):
+        """{item_url: content_hash} для товаров, которые уже есть в базе (поиск по item_id)"""
+        with self.timed('stored_fingerprints') as counter:
+            keys = {}
+            for url in set(item_urls):
+                if url:
+                    keys.setdefault(item_key(url), []).append(url)
+            
+            stored = {}
+            for chunk in _chunks(keys):
+                placeholders, params = _in_params(chunk)
+                for key, content_hash in self.conn.execute(
+                    f'SELECT item_id, content_hash FROM products WHERE item_id IN ({placeholders})', params
+                ):
+                    for url in keys[key]:
+                        stored[url] = content_hash
+            counter['rows'] += len(stored)
+        return stored
+
+    def split_changed(self, items_data):
+        """(новые и изменившиеся товары, товары с тем же отпечатком, что в базе)"""
+        stored = self.stored_fingerprints(item.get('item_url') for item in items_data)
+        changed, unchanged = [], []
+        for item in items_data:
+            if not item.get('item_url') or stored.get(item['item_url']) != item_content_hash(item):
+                changed.append(item)
+            else:
+                unchanged.append(item)
+        return changed, unchanged
+
+    def filter_changed(self, items_data):
+        """Оставляет только новые товары и товары, у которых изменился отпечаток"""
+        changed, unchanged = self.split_changed(items_data)
+        return changed, len(unchanged)
+
+    def mark_seen(self, items_data, search_query):
+        """
+        Товары без изменений (split_changed): строка products не переписывается,
+        но scraped_at становится временем последнего наблюдения, а в price_snapshots
+        добавляется снимок - история цен не теряет точки инкрементальных запусков.
+        """
+        rows = [_item_row(item, search_query) for item in items_data if item.get('scraped_at')]
+        with self.timed('mark_seen') as counter:
+            with self.transaction('mark_seen'):
+                self.conn.executemany(MARK_SEEN_SQL, [(row[10], row[13], row[10]) for row in rows])
+                self.conn.executemany(SNAPSHOT_SQL, [_snapshot_row(row) for row in rows])
+            counter['rows'] += len(rows)
+        return len(rows)
+
+    def count(self):
+        with self.timed('count'):
+            return self.conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+
+    def row_count(self):
+        """count() без полного прохода по таблице: после первого вызова число ведет save_items"""
+        if self._row_count is None:
+            self._row_count = self.count()
+        return self._row_count
+
+    def price_series(self, item_id, start=None, end=None):
+        """Цены товара по времени: [{'scraped_at', 'price', 'currency', 'shipping_price', 'condition'}, ...]"""
+        query = '''
+            SELECT scraped_at, price, currency, shipping_price, condition
+            FROM price_snapshots
+            WHERE item_id = ?
+        '''
+        params = [item_id]
+        if start:
+            query += ' AND scraped_at >= ?'
+            params.append(start)
+        if end:
+            query += ' AND scraped_at <= ?'
+            params.append(end)
+        query += ' ORDER BY scraped_at'
+        
+        with self.timed('price_series') as counter:
+            columns = ('scraped_at', 'price', 'currency', 'shipping_price', 'condition')
+            rows = [dict(zip(columns, row)) for row in self.conn.execute(query, params)]
+            counter['rows'] += len(rows)
+        return rows
+
+    def latest_prices(self, item_ids=None, search_query=None):
+        """
+        Последняя цена каждого товара: {item_id: {'scraped_at', 'price', 'currency', 'shipping_price'}}.
+
+        Для каждого товара берется одна строка с конца диапазона первичного ключа
+        (item_id, scraped_at), поэтому время не зависит от длины истории.
+        """
+        query = '''
+            SELECT s.item_id, s.scraped_at, s.price, s.currency, s.shipping_price
+            FROM products p
+            JOIN price_snapshots s ON s.item_id = p.item_id AND s.scraped_at = (
+                SELECT MAX(scraped_at) FROM price_snapshots WHERE item_id = p.item_id
+            )
+            WHERE p.item_id IS NOT NULL
+        '''
+        params = []
+        if search_query:
+            query += ' AND p.search_query = ?'
+            params.append(search_query)
+        
+        if item_ids is None:
+            batches = [(query, params)]
+        else:
+            batches = []
+            for chunk in _chunks(item_ids):
+                placeholders, chunk_params = _in_params(chunk)
+                batches.append((query + f" AND p.item_id IN ({placeholders})", params + chunk_params))
+        
+        latest = {}
+        with self.timed('latest_prices') as counter:
+            for batch_query, batch_params in batches:
+                for item_id, scraped_at, price, currency, shipping_price in self.conn.execute(batch_query, batch_params):
+                    latest[item_id] = {
+                        'scraped_at': scraped_at, 'price': price, 'currency': currency, 'shipping_price': shipping_price
+                    }
+            counter['rows'] += len(latest)
+        return latest
+
+    def search(self, text, min_price=None, max_price=None, condition=None, search_query=None, limit=20):
+        """
+        Товары, в title или specifications которых есть все слова text, лучшие первыми
+        (bm25, меньше score - выше). Цены - включительно; condition - строка или список.
+        """
+        match = match_expression(text)
+        if not match:
+            return []
+        
+        filters = ''
+        filter_params = []
+        if min_price is not None:
+            filters += ' AND p.price >= ?'
+            filter_params.append(min_price)
+        if max_price is not None:
+            filters += ' AND p.price <= ?'
+            filter_params.append(max_price)
+        if condition:
+            conditions = [condition] if isinstance(condition, str) else list(condition)
+            placeholders, condition_params = _in_params(conditions)
+            filters += f' AND p.condition IN ({placeholders})'
+            filter_params.extend(condition_params)
+        if search_query:
+            filters += ' AND p.search_query = ?'
+            filter_params.append(search_query)
+        
+        columns_sql = 'p.item_id, p.title, p.price, p.currency, p.condition, p.item_url, p.scraped_at, p.search_query'
+        rank_sql = f'bm25(products_fts, {SEARCH_TITLE_WEIGHT}, 1.0)'
+        if filters:
+            query = f'''
+                SELECT {columns_sql}, {rank_sql} AS score
+                FROM products_fts
+                JOIN products p ON p.item_id = products_fts.rowid
+                WHERE products_fts MATCH ?{filters}
+                ORDER BY score LIMIT ?
+            '''
+            params = [match] + filter_params + [limit]
+        else:
+            # Без фильтров ранжируется только индекс, а строки products читаются для limit лучших
+            query = f'''
+                SELECT {columns_sql}, ranked.score
+                FROM (
+                    SELECT rowid, {rank_sql} AS score
+                    FROM products_fts
+                    WHERE products_fts MATCH ?
+                    ORDER BY score LIMIT ?
+                ) ranked
+                JOIN products p ON p.item_id = ranked.rowid
+                ORDER BY ranked.score
+            '''
+            params = [match, limit]
+        
+        with self.timed('search') as counter:
+            columns = ('item_id', 'title', 'price', 'currency', 'condition', 'item_url',
+                       'scraped_at', 'search_query', 'score')
+            rows = [dict(zip(columns, row)) for row in self.conn.execute(query, params)]
+            counter['rows'] += len(rows)
+        return rows
+
+    def assign_clusters(self, items_data):
+        """near_duplicates.assign_clusters на соединении хранилища"""
+        with self.timed('assign_clusters') as counter:
+            stats = assign_clusters(items_data, conn=self.conn)
+            counter['rows'] += len(items_data)
+        return stats
+
+    def index_products(self, batch_size=10000, item_ids=None):
+        with self.timed('index_products') as counter:
+            indexed = index_products(batch_size=batch_size, conn=self.conn, item_ids=item_ids)
+            counter['rows'] += indexed
+        return indexed
+
+    def print_timings(self):
+        print(f"⏱️  Операции с базой '{self.db_name}':")
+        for operation, counter in self.timings.items():
+            print(f"   {operation:20s}: вызовов {counter['calls']:4d}, строк {counter['rows']:8d}, "
+                  f"{counter['seconds']:.3f} сек")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+@contextlib.contextmanager
+def open_store(db_name):
+    """db_name - путь к базе или уже открытый ProductStore (тогда он не закрывается)"""
+    if isinstance(db_name, ProductStore):
+        yield db_name
+        return
+    with ProductStore(db_name) as store:
+        yield store
+
+
+def _database_exists(db_name):
+    return isinstance(db_name, ProductStore) or os.path.exists(db_name)
+
+
+def create_database(db_name='ebay_products.db'):
+    with open_store(db_name) as store:
+        store.ensure_schema()
+
+
+def save_to_database(items_data, search_query, db_name='ebay_products.db', batch_size=1000):
+    if not items_data:
+        print("⚠️  Нет данных для сохранения в базу")
+        return 0
     
-    conn.commit()
-    conn.close()
+    with open_store(db_name) as store:
+        return store.save_items(items_data, search_query, batch_size)
+
+
+def get_stored_fingerprints(item_urls, db_name='ebay_products.db'):
+    """{item_url: content_hash} для товаров, которые уже есть в базе (поиск по item_id)"""
+    if not _database_exists(db_name):
+        return {}
     
-    print(f"\n{'='*70}")
-    print(f"💾 Сохранение в базу данных '{db_name}':")
-    print(f"   ✓ Добавлено новых записей: {inserted}")
-    print(f"   ✓ Обновлено записей: {updated}")
-    print(f"   ✓ Всего в базе: {get_total_records(db_name)}")
-    print(f"{'='*70}")
+    with open_store(db_name) as store:
+        return store.stored_fingerprints(item_urls)
+
+
+def filter_changed_items(items_data, db_name='ebay_products.db'):
+    """Оставляет только новые товары и товары, у которых изменился отпечаток"""
+    if not _database_exists(db_name):
+        return list(items_data), 0
     
-    return inserted + updated
+    with open_store(db_name) as store:
+        return store.filter_changed(items_data)
 
 
 def get_total_records(db_name='ebay_products.db'):
-    if not os.path.exists(db_name):
+    if not _database_exists(db_name):
         return 0
     
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM products')
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
+    with open_store(db_name) as store:
+        return store.count()
+
 
+def get_price_series(item_id, db_name='ebay_products.db', start=None, end=None):
+    """Цены товара по времени: [{'scraped_at', 'price', 'currency', 'shipping_price', 'condition'}, ...]"""
+    with open_store(db_name) as store:
+        return store.price_series(item_id, start, end)
 
-def save_to_json(items_data, filename='ebay_results.json'):
+
+def get_latest_prices(db_name='ebay_products.db', item_ids=None, search_query=None):
+    """Последняя цена каждого товара, см. ProductStore.latest_prices"""
+    with open_store(db_name) as store:
+        return store.latest_prices(item_ids, search_query)
+
+
+def search_products(text, db_name='ebay_products.db', min_price=None, max_price=None,
+                    condition=None, search_query=None, limit=20):
+    """Полнотекстовый поиск по title и specifications, см. ProductStore.search"""
+    if not _database_exists(db_name):
+        return []
+    
+    with open_store(db_name) as store:
+        return store.search(text, min_price, max_price, condition, search_query, limit)
+
+
+def save_to_json(items_data, filename='ebay_results.json', compact=False):
+    """
+    items_data - список или любой итератор товаров: файл пишется по одному товару.
+    compact=True - без отступов (товар на строку); .jsonl - JSON Lines, .gz/.zst - со сжатием.
+    """
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(items_data, f, ensure_ascii=False, indent=2)
-        print(f"✓ Данные сохранены в JSON: {filename}")
+        with open_writer(filename, compact) as writer:
+            for item in items_data:
+                writer.write(item)
+        print(f"✓ Данные сохранены в JSON: {filename} ({writer.count} товаров)")
         return True
     except Exception as e:
         print(f"❌ Ошибка при сохранении JSON: {e}")
         return False
 
 
+# Столько товаров за раз проходит все шаги load_and_save, если на вход пришел итератор
+LOAD_CHUNK_SIZE = 50000
+
+
+def _iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 def load_and_save(items_data, search_query, save_json=True, save_db=True, 
-                  json_filename='ebay_results.json', db_name='ebay_products.db'):
+                  json_filename='ebay_results.json', db_name='ebay_products.db', batch_size=1000,
+                  incremental=False, near_duplicates=False, parquet_dir=None, run_id=None,
+                  compact_json=False, chunk_size=LOAD_CHUNK_SIZE):
+    """
+    items_data - список или ленивый итератор товаров (storage.iter_items):
+    товары обрабатываются пачками по chunk_size, память не растет с их числом.
+    db_name - путь к базе или открытый ProductStore; все пачки идут через одно соединение.
+    """
     stats = {
-        'total_items': len(items_data),
+        'total_items': 0,
         'json_saved': False,
-        'db_records_saved': 0
+        'db_records_saved': 0,
+        'db_records_skipped': 0,
+        'near_duplicates': 0,
+        'parquet_rows': 0
     }
     
     print("\n" + "="*70)
     print("Сохранение данных...")
     print("="*70)
     
+    json_writer = None
     if save_json:
-        stats['json_saved'] = save_to_json(items_data, json_filename)
-    if save_db:
-        create_database(db_name)
-        stats['db_records_saved'] = save_to_database(items_data, search_query, db_name)
+        try:
+            json_writer = open_writer(json_filename, compact_json)
+        except Exception as e:
+            print(f"❌ Ошибка при сохранении JSON: {e}")
+    if parquet_dir:
+        # Один run_id на все пачки, чтобы файлы запуска были видны как один запуск
+        run_id = run_id or new_run_id()
+    
+    with open_store(db_name) if save_db else contextlib.nullcontext() as store:
+        if store is not None and near_duplicates:
+            # Строки базы, еще не попавшие в индекс (старые базы, записи без near_duplicates),
+            # индексируются один раз до первого сравнения
+            store.index_products()
+        for part, chunk in enumerate(_iter_chunks(items_data, chunk_size)):
+            with METRICS.span('load_chunk', part=part, items=len(chunk)):
+                stats['total_items'] += len(chunk)
+                
+                if json_writer is not None:
+                    try:
+                        for item in chunk:
+                            json_writer.write(item)
+                    except Exception as e:
+                        print(f"❌ Ошибка при сохранении JSON: {e}")
+                        json_writer.abort()
+                        json_writer = None
+                
+                if store is not None:
+                    db_items = chunk
+                    if incremental:
+                        db_items, unchanged = store.split_changed(chunk)
+                        stats['db_records_skipped'] += len(unchanged)
+                        if unchanged:
+                            store.mark_seen(unchanged, search_query)
+                        print(f"⏭️  Инкрементальный режим: без изменений {len(unchanged)} "
+                              f"(записаны только время наблюдения и снимок цены), к записи {len(db_items)}")
+                    if db_items and near_duplicates:
+                        stats['near_duplicates'] += store.assign_clusters(db_items)['near_duplicates']
+                    if db_items:
+                        stats['db_records_saved'] += store.save_items(db_items, search_query, batch_size)
+                    if db_items and near_duplicates:
+                        store.index_products(item_ids=[item_record_key(item) for item in db_items])
+                
+                # В Parquet пишутся все товары запуска (история наблюдений), а не только измененные;
+                # после базы - чтобы в файлы попал cluster_id
+                if parquet_dir:
+                    stats['parquet_rows'] += save_to_parquet(chunk, search_query, parquet_dir, run_id, part)
+        
+        if store is not None:
+            store.print_timings()
+    
+    if json_writer is not None:
+        json_writer.close()
+        stats['json_saved'] = True
+        print(f"✓ Данные сохранены в JSON: {json_filename} ({json_writer.count} товаров)")
     
-    return stats
\ No newline at end of file
+    return stats
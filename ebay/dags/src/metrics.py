@@ -0,0 +1,269 @@
+"""
+Метрики и трассировка конвейера: счетчики, гистограммы, таймеры и спаны.
+
+Модули пишут в общий реестр METRICS (inc, observe, timer, span). Запись -
+обновление словаря под блокировкой, без сети и фоновых потоков, поэтому
+метрики не нужно выключать. Горячие циклы (товар за товаром) копят время
+локально и пишут в реестр один раз на страницу или пачку.
+
+Задача DAG открывает task_metrics: реестр сбрасывается, вся задача становится
+корневым спаном, а в конце реестр выгружается в JSON и текстовый файл
+Prometheus (для node_exporter --collector.textfile). Номера спанов задач
+вычисляются из run_id, задачи и запроса, поэтому clean ссылается на scrape,
+а load - на clean, без передачи номеров через XCom. merge_run_metrics
+собирает файлы всех задач запуска в один run.json / run.prom.
+"""
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+
+PREFIX = 'ebay_'
+# Границы гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Время на одну карточку или товар
+FINE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _atomic_write(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def span_id_for(run_id, task, query=None):
+    """Детерминированный номер спана задачи: одинаковый во всех процессах запуска"""
+    return hashlib.md5(f"{run_id}/{task}/{query or ''}".encode()).hexdigest()[:16]
+
+
+class Metrics:
+    """Реестр метрик одного процесса; const_labels добавляются ко всем рядам при выгрузке"""
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self, trace_id=None, **const_labels):
+        with self._lock:
+            self.const_labels = const_labels
+            self.trace_id = trace_id or uuid.uuid4().hex
+            self.counters = {}
+            self.histograms = {}
+            self.spans = []
+
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {'buckets': tuple(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for pos, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][pos] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name, buckets=DEFAULT_BUCKETS, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, buckets, **labels)
+
+    @contextlib.contextmanager
+    def span(self, name, span_id=None, links=(), **attributes):
+        """
+        Спан операции; родитель - текущий спан этого потока. links - номера
+        спанов, от которых операция зависит (например, задачи предыдущего шага).
+        Отдает словарь спана: в attributes можно дописывать результаты.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        record = {
+            'trace_id': self.trace_id,
+            'span_id': span_id or uuid.uuid4().hex[:16],
+            'parent_id': stack[-1]['span_id'] if stack else None,
+            'links': list(links),
+            'name': name,
+            'start': time.time(),
+            'seconds': None,
+            'status': 'ok',
+            'attributes': dict(attributes),
+        }
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record['status'] = 'error'
+            record['attributes']['error'] = repr(e)
+            raise
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                self.spans.append(record)
+
+    def snapshot(self):
+        """Все ряды с const_labels, пригодно для json.dump и merge"""
+        const = dict(self.const_labels)
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(const, **dict(key)), 'value': value}
+                for name, series in self.counters.items() for key, value in series.items()
+            ]
+            histograms = [
+                {'name': name, 'labels': dict(const, **dict(key)), 'buckets': list(histogram['buckets']),
+                 'counts': list(histogram['counts']), 'sum': histogram['sum'], 'count': histogram['count']}
+                for name, series in self.histograms.items() for key, histogram in series.items()
+            ]
+            spans = [dict(record, attributes=dict(record['attributes'])) for record in self.spans]
+        return {'trace_id': self.trace_id, 'labels': const, 'counters': counters,
+                'histograms': histograms, 'spans': spans}
+
+    def merge(self, snapshot):
+        """Добавляет снимок другого реестра (процесса-парсера, другой задачи)"""
+        with self._lock:
+            for counter in snapshot['counters']:
+                series = self.counters.setdefault(counter['name'], {})
+                key = _label_key(counter['labels'])
+                series[key] = series.get(key, 0) + counter['value']
+            for other in snapshot['histograms']:
+                series = self.histograms.setdefault(other['name'], {})
+                key = _label_key(other['labels'])
+                histogram = series.get(key)
+                if histogram is None:
+                    histogram = series[key] = {'buckets': tuple(other['buckets']), 'counts': [0] * len(other['buckets']),
+                                               'sum': 0.0, 'count': 0}
+                histogram['counts'] = [a + b for a, b in zip(histogram['counts'], other['counts'])]
+                histogram['sum'] += other['sum']
+                histogram['count'] += other['count']
+            self.spans.extend(snapshot['spans'])
+
+    def to_prometheus(self):
+        """Текстовый формат Prometheus: счетчики *_total, гистограммы *_bucket/_sum/_count"""
+        snapshot = self.snapshot()
+        lines = []
+        by_name = {}
+        for counter in snapshot['counters']:
+            by_name.setdefault(('counter', counter['name']), []).append(counter)
+        for histogram in snapshot['histograms']:
+            by_name.setdefault(('histogram', histogram['name']), []).append(histogram)
+
+        for (kind, name), series in sorted(by_name.items(), key=lambda entry: entry[0][1]):
+            metric = self.prefix + name
+            lines.append(f'# TYPE {metric} {kind}')
+            for entry in series:
+                labels = sorted(entry['labels'].items())
+                if kind == 'counter':
+                    lines.append(f"{metric}{_format_labels(labels)} {entry['value']}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(entry['buckets'], entry['counts']):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(labels + [('le', repr(float(bound)))])} {cumulative}")
+                lines.append(f"{metric}_bucket{_format_labels(labels + [('le', '+Inf')])} {entry['count']}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {entry['sum']}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {entry['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        _atomic_write(path, json.dumps(self.snapshot(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path):
+        _atomic_write(path, self.to_prometheus())
+
+
+METRICS = Metrics()
+
+inc = METRICS.inc
+observe = METRICS.observe
+timer = METRICS.timer
+span = METRICS.span
+
+
+def _task_file(run_dir, task, query=None):
+    name = task if not query else f"{task}_{hashlib.md5(query.encode()).hexdigest()[:8]}"
+    return os.path.join(run_dir, name)
+
+
+@contextlib.contextmanager
+def task_metrics(metrics_dir, run_id, task, query=None, follows=()):
+    """
+    Метрики одной задачи DAG: сброс реестра, корневой спан задачи и выгрузка
+    <metrics_dir>/<run_id>/<task>[_<запрос>].json и .prom даже при ошибке.
+    follows - [(task, query), ...] задач предыдущего шага для ссылок спана.
+    """
+    labels = {'run_id': run_id, 'task': task}
+    if query:
+        labels['query'] = query
+    METRICS.reset(trace_id=span_id_for(run_id, 'dag_run'), **labels)
+    links = [span_id_for(run_id, prev_task, prev_query) for prev_task, prev_query in follows]
+
+    run_dir = os.path.join(metrics_dir, run_id)
+    try:
+        with METRICS.span(task, span_id=span_id_for(run_id, task, query), links=links, query=query) as record:
+            yield record
+    finally:
+        path = _task_file(run_dir, task, query)
+        try:
+            METRICS.write_json(path + '.json')
+            METRICS.write_prometheus(path + '.prom')
+        except OSError as e:
+            print(f"⚠️  Не удалось сохранить метрики {path}: {e}")
+
+
+def merge_run_metrics(metrics_dir, run_id, textfile=None):
+    """
+    Собирает метрики всех задач запуска в <run_id>/run.json и run.prom;
+    textfile - дополнительно скопировать run.prom туда (каталог node_exporter).
+    Возвращает объединенный реестр.
+    """
+    run_dir = os.path.join(metrics_dir, run_id)
+    merged = Metrics()
+    merged.reset(trace_id=span_id_for(run_id, 'dag_run'))
+    for path in sorted(glob.glob(os.path.join(run_dir, '*.json'))):
+        if os.path.basename(path) == 'run.json':
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            merged.merge(json.load(f))
+    merged.spans.sort(key=lambda record: record['start'])
+
+    merged.write_json(os.path.join(run_dir, 'run.json'))
+    merged.write_prometheus(os.path.join(run_dir, 'run.prom'))
+    if textfile:
+        merged.write_prometheus(textfile)
+    return merged
@@ -0,0 +1,448 @@
+"""
+Поиск почти-дубликатов объявлений (перевыставленный товар с немного другим названием).
+
+Признаки: нормализованное название (MinHash по словам), ценовой диапазон и продавец.
+Кандидаты ищутся через LSH: подпись делится на BANDS полос, полоса вместе с ценовым
+диапазоном и продавцом хешируется в ключ корзины. Совпавшие корзины проверяются
+по оценке сходства Жаккара и разнице цен, попарного сравнения всех товаров нет.
+
+Корзины товаров из базы хранятся в listing_lsh, подписи - в listing_minhash,
+номер кластера - в products.cluster_id (наименьший item_id кластера). Товар, в названии
+которого нет ни одного слова, хранится в listing_minhash с пустой подписью и без корзин.
+"""
+import hashlib
+import math
+import re
+import sqlite3
+import zlib
+
+import numpy as np
+
+try:
+    from .item_ids import item_record_key
+except ImportError:
+    from item_ids import item_record_key
+
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+# Минимальная оценка сходства Жаккара слов названия
+SIMILARITY_THRESHOLD = 0.7
+# Допустимая относительная разница цен внутри кластера
+PRICE_TOLERANCE = 0.1
+SQLITE_MAX_PARAMS = 900
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_MIN_EQUAL_SLOTS = math.ceil(SIMILARITY_THRESHOLD * NUM_PERM)
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+# Фиксированный seed: подписи в базе должны совпадать между запусками
+_PERM_RNG = np.random.RandomState(20251204)
+_PERM_A = _PERM_RNG.randint(1, _MERSENNE_PRIME, NUM_PERM).astype(np.uint64)[:, None]
+_PERM_B = _PERM_RNG.randint(0, _MERSENNE_PRIME, NUM_PERM).astype(np.uint64)[:, None]
+
+_UNIT_RE = re.compile(r'(\d+(?:\.\d+)?)\s+(gb|tb|mb|ghz|mhz|in|inch|hz)\b')
+_TOKEN_RE = re.compile(r'[a-zа-яё0-9.]+')
+
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS listing_minhash (
+            item_id INTEGER PRIMARY KEY,
+            content_hash TEXT,
+            price REAL,
+            price_band INTEGER,
+            seller TEXT,
+            signature BLOB NOT NULL
+        )
+    ''')
+    # Ключ корзины уже включает номер полосы, ценовой диапазон и продавца
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS listing_lsh (
+            bucket INTEGER NOT NULL,
+            item_id INTEGER NOT NULL,
+            PRIMARY KEY (bucket, item_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def title_tokens(title):
+    """Множество слов названия: нижний регистр, '16 GB' -> '16gb', без пунктуации"""
+    if not title:
+        return set()
+    title = _UNIT_RE.sub(r'\1\2', title.lower())
+    return {token.strip('.') for token in _TOKEN_RE.findall(title) if token.strip('.')}
+
+
+def price_band(price):
+    if not price or price <= 0:
+        return -1
+    return int(math.floor(math.log(price) / math.log(1 + PRICE_TOLERANCE)))
+
+
+def seller_key(seller_name):
+    return ' '.join(seller_name.lower().split()) if seller_name else ''
+
+
+def minhash_signatures(token_sets):
+    """MinHash подписи (uint32[NUM_PERM]) для списка множеств слов; пустое множество -> None"""
+    signatures = [None] * len(token_sets)
+    hashes = []
+    offsets = []
+    positions = []
+    for idx, tokens in enumerate(token_sets):
+        if not tokens:
+            continue
+        offsets.append(len(hashes))
+        positions.append(idx)
+        hashes.extend(zlib.crc32(token.encode()) % _MERSENNE_PRIME for token in tokens)
+    if not positions:
+        return signatures
+
+    # Все перестановки для всех слов пачки считаются одной матричной операцией,
+    # минимум по словам каждого товара - reduceat по смещениям
+    permuted = (_PERM_A * np.array(hashes, dtype=np.uint64) + _PERM_B) % _MERSENNE_PRIME
+    minimums = np.minimum.reduceat(permuted, offsets, axis=1).T.astype(np.uint32)
+    for idx, signature in zip(positions, minimums):
+        signatures[idx] = signature
+    return signatures
+
+
+def _mix64(values):
+    """Финализатор splitmix64 для массива uint64 (переполнение - по модулю 2**64)"""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _seller_hashes(sellers):
+    cache = {}
+    for seller in sellers:
+        if seller not in cache:
+            cache[seller] = int.from_bytes(hashlib.blake2b(seller.encode(), digest_size=8).digest(), 'big')
+    return np.array([cache[seller] for seller in sellers], dtype=np.uint64)
+
+
+def bucket_matrix(signatures, bands, sellers):
+    """
+    Ключи корзин LSH (int64, n x BANDS) для n подписей: хеш полосы подписи
+    вместе с номером полосы, ценовым диапазоном и продавцом.
+    """
+    signatures = signatures.astype(np.uint64)
+    base = _mix64(_seller_hashes(sellers) ^ _mix64(np.asarray(bands, dtype=np.int64).view(np.uint64)))
+    keys = np.empty((len(signatures), BANDS), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for band_idx in range(BANDS):
+            acc = _mix64(base + np.uint64(band_idx + 1) * _GOLDEN_GAMMA)
+            for slot in range(band_idx * ROWS_PER_BAND, (band_idx + 1) * ROWS_PER_BAND):
+                acc = _mix64(acc ^ signatures[:, slot])
+            keys[:, band_idx] = acc
+    return keys.view(np.int64)
+
+
+def _similar(signature, price, signatures, prices):
+    """Маска совпадений одного товара с массивом кандидатов: сходство подписей и разница цен"""
+    similar = np.count_nonzero(signatures == signature, axis=1) >= _MIN_EQUAL_SLOTS
+    if np.isnan(price):
+        return similar & np.isnan(prices)
+    return similar & (np.abs(prices - price) <= PRICE_TOLERANCE * np.maximum(prices, price))
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, node):
+        root = self.parent.setdefault(node, node)
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Сжатие пути: все узлы цепочки указывают прямо на корень
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+class _Listings:
+    """Признаки пачки товаров в массивах: подписи, цены, ключи корзин"""
+
+    def __init__(self, item_ids, titles, prices, sellers):
+        signatures = minhash_signatures([title_tokens(title) for title in titles])
+        # Товары без названия не участвуют в поиске
+        self.positions = [idx for idx, signature in enumerate(signatures) if signature is not None]
+        self.item_ids = [item_ids[idx] for idx in self.positions]
+        self.signatures = np.array([signatures[idx] for idx in self.positions], dtype=np.uint32).reshape(-1, NUM_PERM)
+        self.prices = np.array(
+            [prices[idx] if prices[idx] else np.nan for idx in self.positions], dtype=np.float64
+        )
+        self.bands = np.array([price_band(prices[idx]) for idx in self.positions], dtype=np.int64)
+        self.sellers = [seller_key(sellers[idx]) for idx in self.positions]
+        self.keys = bucket_matrix(self.signatures, self.bands, self.sellers)
+
+    def query_keys(self):
+        """Ключи для поиска: свой и соседние ценовые диапазоны (цены у границы диапазона)"""
+        neighbours = [self.keys]
+        for shift in (-1, 1):
+            shifted = np.where(self.bands >= 0, self.bands + shift, self.bands)
+            neighbours.append(bucket_matrix(self.signatures, shifted, self.sellers))
+        return np.hstack(neighbours)
+
+
+def _chunks(values, size=SQLITE_MAX_PARAMS):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _index_candidates(conn, item_ids, batch_size):
+    """
+    Пачки строк products, которых нет в индексе или у которых изменился content_hash:
+    по всей таблице (курсор читается через fetchmany) или только среди item_ids.
+    """
+    query = '''
+        SELECT p.item_id, p.title, p.price, p.seller_name, p.content_hash,
+               m.price_band, m.seller, m.signature
+        FROM products p
+        LEFT JOIN listing_minhash m ON m.item_id = p.item_id
+        WHERE (m.item_id IS NULL OR m.content_hash IS NOT p.content_hash)
+    '''
+    if item_ids is None:
+        cursor = conn.execute(query)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield batch
+
+    batch = []
+    for chunk in _chunks(set(item_ids)):
+        placeholders = ','.join('?' * len(chunk))
+        batch.extend(conn.execute(query + f' AND p.item_id IN ({placeholders})', chunk))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _stored_candidates(conn, query_keys):
+    """{bucket: [item_id, ...]} для корзин из базы"""
+    buckets = {}
+    for chunk in _chunks(set(query_keys)):
+        placeholders = ','.join('?' * len(chunk))
+        for bucket, item_id in conn.execute(
+            f'SELECT bucket, item_id FROM listing_lsh WHERE bucket IN ({placeholders})', chunk
+        ):
+            buckets.setdefault(bucket, []).append(item_id)
+    return buckets
+
+
+def _stored_signatures(conn, item_ids):
+    """(item_ids, матрица подписей, цены) проиндексированных товаров базы"""
+    ids, signatures, prices = [], [], []
+    for chunk in _chunks(item_ids):
+        placeholders = ','.join('?' * len(chunk))
+        for item_id, price, signature in conn.execute(
+            f'SELECT item_id, price, signature FROM listing_minhash WHERE item_id IN ({placeholders})', chunk
+        ):
+            ids.append(item_id)
+            signatures.append(np.frombuffer(signature, dtype=np.uint32))
+            prices.append(price if price else np.nan)
+    signatures = np.array(signatures, dtype=np.uint32).reshape(-1, NUM_PERM)
+    return ids, signatures, np.array(prices, dtype=np.float64)
+
+
+def assign_clusters(items_data, db_name=None, conn=None):
+    """
+    Проставляет item['cluster_id'] всем товарам пачки (одиночный товар - свой item_id).
+
+    Товары сравниваются между собой и, если указан db_name (или открытое соединение
+    conn, например ProductStore.conn), с уже проиндексированными товарами базы
+    (index_products). Номер кластера, уже записанный в базе, сохраняется; если пачка
+    связала несколько кластеров базы, они объединяются под наименьшим номером.
+    Возвращает статистику.
+    """
+    listings = _Listings(
+        [item_record_key(item) for item in items_data],
+        [item.get('title') for item in items_data],
+        [item.get('price') for item in items_data],
+        [item.get('seller_name') for item in items_data],
+    )
+    union_find = _UnionFind()
+    for item_id in listings.item_ids:
+        union_find.find(item_id)
+
+    batch_buckets = {}
+    for pos, keys in enumerate(listings.keys.tolist()):
+        for key in keys:
+            batch_buckets.setdefault(key, []).append(pos)
+    query_keys = listings.query_keys().tolist()
+
+    # Кандидаты - только товары из общих корзин; каждая пара проверяется один раз (other > pos)
+    for pos, keys in enumerate(query_keys):
+        candidates = {other for key in keys for other in batch_buckets.get(key, ()) if other > pos}
+        if not candidates:
+            continue
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        matches = candidates[_similar(
+            listings.signatures[pos], listings.prices[pos],
+            listings.signatures[candidates], listings.prices[candidates]
+        )]
+        for other in matches.tolist():
+            union_find.union(listings.item_ids[pos], listings.item_ids[other])
+
+    stored_clusters = {}
+    matched_ids = set()
+    own_conn = conn is None and bool(db_name)
+    if own_conn:
+        conn = sqlite3.connect(db_name, isolation_level=None)
+    if conn is not None:
+        stored_buckets = _stored_candidates(conn, (key for keys in query_keys for key in keys))
+        stored_ids, stored_signatures, stored_prices = _stored_signatures(
+            conn, {item_id for ids in stored_buckets.values() for item_id in ids}
+        )
+        stored_index = {item_id: idx for idx, item_id in enumerate(stored_ids)}
+
+        for pos, keys in enumerate(query_keys):
+            item_id = listings.item_ids[pos]
+            candidates = {
+                stored_index[other] for key in keys for other in stored_buckets.get(key, ())
+                if other != item_id and other in stored_index
+            }
+            if not candidates:
+                continue
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            matches = candidates[_similar(
+                listings.signatures[pos], listings.prices[pos],
+                stored_signatures[candidates], stored_prices[candidates]
+            )]
+            for idx in matches.tolist():
+                union_find.union(item_id, stored_ids[idx])
+                matched_ids.add(stored_ids[idx])
+
+        # Существующие номера кластеров: у товаров пачки, уже лежащих в базе, и у совпавших
+        for chunk in _chunks(set(listings.item_ids) | matched_ids):
+            placeholders = ','.join('?' * len(chunk))
+            stored_clusters.update(conn.execute(
+                f'SELECT item_id, cluster_id FROM products '
+                f'WHERE item_id IN ({placeholders}) AND cluster_id IS NOT NULL', chunk
+            ))
+
+    # Номер кластера: уже существующий номер (наименьший), иначе наименьший item_id
+    members = {}
+    for node in list(union_find.parent):
+        members.setdefault(union_find.find(node), []).append(node)
+    cluster_of = {}
+    merged = {}
+    for nodes in members.values():
+        existing = {stored_clusters[node] for node in nodes if node in stored_clusters}
+        cluster_id = min(existing) if existing else min(nodes)
+        for node in nodes:
+            cluster_of[node] = cluster_id
+        for old_cluster in existing - {cluster_id}:
+            merged[old_cluster] = cluster_id
+
+    stats = {'items': len(items_data), 'clusters': 0, 'near_duplicates': 0, 'merged_clusters': len(merged)}
+    for item in items_data:
+        item['cluster_id'] = None
+    batch_clusters = set()
+    for pos, item_id in zip(listings.positions, listings.item_ids):
+        cluster_id = cluster_of[item_id]
+        items_data[pos]['cluster_id'] = cluster_id
+        batch_clusters.add(cluster_id)
+        if len(members[union_find.find(item_id)]) > 1:
+            stats['near_duplicates'] += 1
+    stats['clusters'] = len(batch_clusters)
+
+    if conn is not None:
+        # Строки пачки получат cluster_id при сохранении; здесь - только совпавшие строки базы
+        updates = [
+            (cluster_of[node], node) for node in matched_ids
+            if stored_clusters.get(node) != cluster_of[node]
+        ]
+        # SAVEPOINT вместо BEGIN: работает и внутри транзакции вызывающего кода
+        conn.execute('SAVEPOINT near_duplicates')
+        conn.executemany('UPDATE products SET cluster_id = ? WHERE cluster_id = ?',
+                         [(new_cluster, old_cluster) for old_cluster, new_cluster in merged.items()])
+        conn.executemany('UPDATE products SET cluster_id = ? WHERE item_id = ?', updates)
+        conn.execute('RELEASE near_duplicates')
+        if own_conn:
+            conn.close()
+
+    print(f"🧬 Почти-дубликаты: товаров {stats['items']}, кластеров {stats['clusters']}, "
+          f"в кластерах с другими товарами {stats['near_duplicates']}, "
+          f"объединено кластеров базы {stats['merged_clusters']}")
+    return stats
+
+
+def index_products(db_name=None, batch_size=10000, conn=None, item_ids=None):
+    """
+    Добавляет в LSH индекс строки products, которых там нет или у которых изменился
+    content_hash (старые корзины таких строк удаляются). Возвращает число строк.
+    Вместо db_name можно передать открытое соединение conn; item_ids ограничивает
+    проверку этими товарами (только что сохраненная пачка) вместо всей таблицы.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(db_name, isolation_level=None)
+    cursor = conn.cursor()
+
+    indexed = 0
+    cursor.execute('SAVEPOINT near_duplicates')
+    try:
+        for batch in _index_candidates(conn, item_ids, batch_size):
+            stale = [row for row in batch if row[7] is not None]
+            # У товаров без слов в названии (пустая подпись) корзин нет
+            stale_buckets = [row for row in stale if row[7]]
+            if stale_buckets:
+                old_keys = bucket_matrix(
+                    np.array([np.frombuffer(row[7], dtype=np.uint32) for row in stale_buckets]),
+                    [row[5] for row in stale_buckets], [row[6] for row in stale_buckets],
+                ).tolist()
+                cursor.executemany('DELETE FROM listing_lsh WHERE bucket = ? AND item_id = ?', [
+                    (key, row[0]) for row, keys in zip(stale_buckets, old_keys) for key in keys
+                ])
+            if stale:
+                cursor.executemany('DELETE FROM listing_minhash WHERE item_id = ?', [(row[0],) for row in stale])
+
+            listings = _Listings(*zip(*(row[:4] for row in batch)))
+            content_hashes = [batch[pos][4] for pos in listings.positions]
+            rows = [
+                (item_id, content_hash, None if np.isnan(price) else price, band, seller, signature.tobytes())
+                for item_id, content_hash, price, band, seller, signature in zip(
+                    listings.item_ids, content_hashes, listings.prices.tolist(), listings.bands.tolist(),
+                    listings.sellers, listings.signatures
+                )
+            ]
+            # Пустая подпись отмечает товар как обработанный, иначе он попадал бы
+            # в кандидаты при каждом запуске
+            positions = set(listings.positions)
+            rows.extend(
+                (row[0], row[4], row[2], price_band(row[2]), seller_key(row[3]), b'')
+                for pos, row in enumerate(batch) if pos not in positions
+            )
+            cursor.executemany('''
+                INSERT INTO listing_minhash (item_id, content_hash, price, price_band, seller, signature)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            cursor.executemany('INSERT OR IGNORE INTO listing_lsh (bucket, item_id) VALUES (?, ?)', [
+                (key, item_id) for item_id, keys in zip(listings.item_ids, listings.keys.tolist()) for key in keys
+            ])
+            indexed += len(listings.item_ids)
+        cursor.execute('RELEASE near_duplicates')
+    except Exception:
+        cursor.execute('ROLLBACK TO near_duplicates')
+        cursor.execute('RELEASE near_duplicates')
+        if own_conn:
+            conn.close()
+        raise
+
+    if own_conn:
+        conn.close()
+    if indexed:
+        print(f"🧬 В индекс почти-дубликатов добавлено товаров: {indexed}")
+    return indexed
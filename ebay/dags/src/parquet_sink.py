@@ -0,0 +1,177 @@
+"""
+Колоночная выгрузка товаров в Parquet рядом с SQLite.
+
+Каталог - датасет в разметке hive: search_query=<запрос>/scrape_date=<дата>/<run_id>-<part>-<n>.parquet.
+Каждый запуск дописывает свои файлы и не трогает чужие, повтор того же
+запуска (тот же run_id) перезаписывает только свои. При чтении фильтр по
+запросу и дате отбрасывает лишние каталоги целиком, а фильтры по столбцам
+(цена, состояние) проверяются по статистике групп строк в файлах.
+
+Нужен pyarrow; без него выгрузка пропускается.
+"""
+import json
+import os
+import time
+import uuid
+from datetime import date, datetime
+
+try:
+    from .item_ids import item_record_key
+    from .metrics import METRICS
+except ImportError:
+    from item_ids import item_record_key
+    from metrics import METRICS
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+    ds = None
+
+
+# Группа строк - единица, которую чтение пропускает по статистике min/max
+ROW_GROUP_SIZE = 64 * 1024
+COMPRESSION = 'zstd'
+
+PARTITION_FIELDS = ['search_query', 'scrape_date']
+
+if pa is not None:
+    PRODUCTS_SCHEMA = pa.schema([
+        ('item_id', pa.int64()),
+        ('title', pa.string()),
+        ('price', pa.float64()),
+        ('currency', pa.string()),
+        ('condition', pa.string()),
+        ('seller_name', pa.string()),
+        ('location', pa.string()),
+        ('shipping_price', pa.float64()),
+        ('rating', pa.float64()),
+        ('reviews_count', pa.int32()),
+        ('item_url', pa.string()),
+        ('scraped_at', pa.timestamp('s')),
+        ('specifications', pa.string()),
+        ('content_hash', pa.string()),
+        ('cluster_id', pa.int64()),
+        ('search_query', pa.string()),
+        ('scrape_date', pa.date32()),
+    ])
+    PARTITIONING = ds.partitioning(
+        pa.schema([PRODUCTS_SCHEMA.field(name) for name in PARTITION_FIELDS]), flavor='hive'
+    )
+
+
+def parquet_available():
+    return pa is not None
+
+
+def new_run_id():
+    return f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _parse_scraped_at(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def _specifications_json(specs):
+    if isinstance(specs, dict):
+        return json.dumps(specs, ensure_ascii=False) if specs else None
+    return specs if isinstance(specs, str) else None
+
+
+def items_to_table(items_data, search_query):
+    """Товары после cleaner (и loader) -> pyarrow.Table со схемой PRODUCTS_SCHEMA"""
+    today = date.today()
+    columns = {field.name: [] for field in PRODUCTS_SCHEMA}
+    for item in items_data:
+        scraped_at = _parse_scraped_at(item.get('scraped_at'))
+        columns['item_id'].append(item_record_key(item))
+        for name in ('title', 'price', 'currency', 'condition', 'seller_name', 'location',
+                     'shipping_price', 'rating', 'reviews_count', 'item_url', 'content_hash', 'cluster_id'):
+            columns[name].append(item.get(name))
+        columns['scraped_at'].append(scraped_at)
+        columns['specifications'].append(_specifications_json(item.get('specifications')))
+        columns['search_query'].append(item.get('search_query') or search_query)
+        columns['scrape_date'].append(scraped_at.date() if scraped_at else today)
+    return pa.Table.from_pydict(columns, schema=PRODUCTS_SCHEMA)
+
+
+def save_to_parquet(items_data, search_query, root_dir, run_id=None, part=0):
+    """
+    Дописывает товары одного запуска в датасет root_dir, по файлу на каждую
+    пару (запрос, дата). part - номер пачки, если запуск пишется частями.
+    Возвращает число записанных строк.
+    """
+    if pa is None:
+        print("⚠️ pyarrow не установлен, выгрузка в Parquet пропущена")
+        return 0
+    if not items_data:
+        return 0
+
+    run_id = run_id or new_run_id()
+    start = time.perf_counter()
+    table = items_to_table(items_data, search_query)
+    # Сортировка по цене сужает min/max групп строк: фильтры по цене пропускают больше групп
+    table = table.sort_by([('search_query', 'ascending'), ('scrape_date', 'ascending'), ('price', 'ascending')])
+
+    os.makedirs(root_dir, exist_ok=True)
+    ds.write_dataset(
+        table,
+        root_dir,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=f"{run_id}-{part}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+        max_rows_per_group=ROW_GROUP_SIZE,
+        min_rows_per_group=min(ROW_GROUP_SIZE, table.num_rows),
+    )
+    METRICS.observe('parquet_write_seconds', time.perf_counter() - start)
+    METRICS.inc('parquet_rows_total', table.num_rows)
+
+    print(f"✓ Данные сохранены в Parquet: {root_dir} ({table.num_rows} строк, запуск {run_id})")
+    return table.num_rows
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def build_filter(search_query=None, start_date=None, end_date=None, where=None):
+    """Выражение pyarrow.dataset: запрос, даты [start_date, end_date] и произвольное условие where"""
+    conditions = []
+    if search_query is not None:
+        conditions.append(ds.field('search_query') == search_query)
+    if start_date is not None:
+        conditions.append(ds.field('scrape_date') >= _as_date(start_date))
+    if end_date is not None:
+        conditions.append(ds.field('scrape_date') <= _as_date(end_date))
+    if where is not None:
+        conditions.append(where)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def open_dataset(root_dir):
+    return ds.dataset(root_dir, format='parquet', partitioning=PARTITIONING, schema=PRODUCTS_SCHEMA)
+
+
+def read_parquet(root_dir, search_query=None, start_date=None, end_date=None, columns=None, where=None):
+    """
+    Чтение датасета с отбором на уровне файлов и групп строк. where -
+    дополнительное выражение, например ds.field('price') < 500.
+    Возвращает pyarrow.Table (table.to_pandas() / table.to_pylist()).
+    """
+    if pa is None:
+        raise ImportError("Для чтения Parquet нужен pyarrow")
+    if not os.path.isdir(root_dir):
+        return PRODUCTS_SCHEMA.empty_table().select(columns or PRODUCTS_SCHEMA.names)
+
+    dataset = open_dataset(root_dir)
+    return dataset.to_table(columns=columns, filter=build_filter(search_query, start_date, end_date, where))
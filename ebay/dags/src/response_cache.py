@@ -0,0 +1,162 @@
+"""
+Дисковый кеш HTTP/HTML ответов.
+
+Ключ - нормализованный URL (без трекинговых параметров), срок жизни задается
+по классу URL (страницы поиска живут недолго, страницы товаров - дольше).
+Тела хранятся сжатыми в одном файле SQLite; при превышении max_bytes
+вытесняются давно не использованные записи (LRU).
+"""
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+try:
+    from .item_ids import extract_item_id
+except ImportError:
+    from item_ids import extract_item_id
+
+
+# Секунды; None - без ограничения
+DEFAULT_TTLS = {
+    'search': 30 * 60,
+    'item': 24 * 60 * 60,
+    'other': 6 * 60 * 60,
+}
+
+# Параметры, которые не меняют содержимое страницы
+IGNORED_PARAMS = {
+    '_skw', '_trksid', '_trkparms', 'hash', 'itmprp', 'itmmeta', 'amdata',
+    'epid', 'var', 'mkcid', 'mkrid', 'campid', 'toolid', 'customid', 'siteid',
+}
+
+
+def url_class(url):
+    path = urlsplit(url).path
+    if '/itm/' in path:
+        return 'item'
+    if '/sch/' in path:
+        return 'search'
+    return 'other'
+
+
+def normalize_cache_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'https'
+    netloc = parts.netloc.lower()
+
+    if url_class(url) == 'item':
+        item_id = extract_item_id(url)
+        if item_id is not None:
+            return f"{scheme}://{netloc}/itm/{item_id}"
+
+    params = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in IGNORED_PARAMS
+    )
+    return urlunsplit((scheme, netloc, parts.path.rstrip('/') or '/', urlencode(params), ''))
+
+
+class ResponseCache:
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, ttls=None, compress_level=6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.compress_level = compress_level
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'stored': 0, 'evicted': 0}
+        self._lock = threading.Lock()
+        # Один файл используют параллельные задачи DAG: WAL и ожидание блокировки
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url_class TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses(accessed_at)')
+        # Размер кеша держим в памяти, чтобы не считать SUM(size) на каждой записи;
+        # перед вытеснением он пересчитывается точно (файл могут пополнять другие процессы)
+        self._total = self._sum_sizes()
+
+    def _sum_sizes(self):
+        return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, url):
+        key = normalize_cache_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url_class, body, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+
+            cls, body, created_at = row
+            ttl = self.ttls.get(cls)
+            if ttl is not None and now - created_at > ttl:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._total -= len(body)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            self._conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            self.stats['hits'] += 1
+
+        return zlib.decompress(body).decode('utf-8')
+
+    def put(self, url, html):
+        key = normalize_cache_url(url)
+        body = zlib.compress(html.encode('utf-8'), self.compress_level)
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, url_class, body, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, url_class(url), body, len(body), now, now)
+            )
+            self.stats['stored'] += 1
+            self._total += len(body) - (previous[0] if previous else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        total = self._sum_sizes()
+        if total <= self.max_bytes:
+            self._total = total
+            return
+
+        # Удаляем самые давно использованные записи, пока не уложимся в лимит
+        to_free = total - self.max_bytes
+        victims = []
+        for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY accessed_at'):
+            victims.append((key,))
+            to_free -= size
+            if to_free <= 0:
+                break
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', victims)
+        self.stats['evicted'] += len(victims)
+        self._total = self._sum_sizes()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._sum_sizes()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
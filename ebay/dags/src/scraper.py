@@ -1,16 +1,40 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import math
+import queue
+import threading
 import time
 import random
 
+try:
+    from .http_fetcher import HttpFetcher, is_cacheable
+    from .metrics import METRICS
+    from .waits import (
+        AdaptiveBackoff, PageTimer, CARD_SELECTOR,
+        wait_for_dom_quiescence, scroll_until_stable,
+    )
+except ImportError:
+    from http_fetcher import HttpFetcher, is_cacheable
+    from metrics import METRICS
+    from waits import (
+        AdaptiveBackoff, PageTimer, CARD_SELECTOR,
+        wait_for_dom_quiescence, scroll_until_stable,
+    )
+
+
+SEARCH_URL = "https://www.ebay.com/sch/i.html?_nkw={query}&_sacat=0&_from=R40&_pgn={page}"
+ITEMS_PER_PAGE = 60
+FETCH_BACKENDS = ("http", "selenium")
+
 
 def setup_driver():
     """Настройка Chrome WebDriver с заголовками"""
+    # selenium импортируется только для бэкенда selenium: HTTP-загрузке и разбору DAG он не нужен
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     
     chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36')
@@ -30,15 +54,20 @@ def setup_driver():
     return driver
 
 
-def scrape_page(driver, url, page_num):
+def scrape_page(driver, url, page_num, timer=None):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    timer = timer or PageTimer(page_num)
     print(f"\n{'='*70}")
     print(f"📄 Страница {page_num}: {url}")
     print(f"{'='*70}")
-    driver.get(url)
+    with timer.step('загрузка'):
+        driver.get(url)
     
     if page_num == 1:
         print("Проверка на CAPTCHA...")
-        time.sleep(3)
         
         if "challenge" in driver.current_url or "captcha" in driver.page_source.lower():
             print("\n" + "="*70)
@@ -46,84 +75,283 @@ def scrape_page(driver, url, page_num):
             print("Пожалуйста, решите CAPTCHA вручную в открытом браузере")
             print("После решения CAPTCHA нажмите Enter в консоли...")
             print("="*70)
-            input("Нажмите Enter после решения CAPTCHA: ")
-            time.sleep(2)
-    else:
-        time.sleep(2)
+            with timer.step('CAPTCHA'):
+                input("Нажмите Enter после решения CAPTCHA: ")
     
     print("Ожидание загрузки товаров...")
-    try:
-        wait = WebDriverWait(driver, 20)
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.su-card-container")))
-        print("✓ Товары загружены!")
-    except Exception as e:
-        print(f"⚠️  Не удалось дождаться загрузки товаров: {e}")
-        print("Продолжаем с текущим содержимым страницы...")
+    with timer.step('ожидание карточек'):
+        try:
+            wait = WebDriverWait(driver, 20)
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, CARD_SELECTOR)))
+            print("✓ Товары загружены!")
+        except Exception as e:
+            print(f"⚠️  Не удалось дождаться загрузки товаров: {e}")
+            print("Продолжаем с текущим содержимым страницы...")
+    
+    with timer.step('стабилизация DOM'):
+        wait_for_dom_quiescence(driver)
     
     print("Прокрутка страницы...")
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight/3);")
-    time.sleep(1)
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-    time.sleep(1)
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-    time.sleep(2)
+    with timer.step('прокрутка'):
+        cards = scroll_until_stable(driver)
     
     html = driver.page_source
-    print(f"✓ HTML страницы получен ({len(html)} символов)")
+    print(f"✓ HTML страницы получен ({len(html)} символов, карточек: {cards})")
+    print(timer.report())
     
     return html
 
-def scrape_ebay(search_query="laptop", max_items=100, save_html=True):
-    driver = None
-    html_pages = []
-    
+
+def build_search_url(search_query, page_num, search_url=SEARCH_URL):
+    return search_url.format(query=search_query, page=page_num)
+
+
+class RateLimiter:
+    """
+    Глобальный лимит частоты запросов для всех потоков.
+
+    Интервал не меньше min_interval; если задан backoff, он растет после
+    ошибок и когда сервер начинает отвечать медленнее обычного.
+    """
+
+    def __init__(self, min_interval=2.0, backoff=None):
+        self.min_interval = min_interval
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def interval(self):
+        if self.backoff is None:
+            return self.min_interval
+        return max(self.min_interval, self.backoff.delay())
+
+    def wait(self):
+        interval = self.interval()
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + interval
+
+        if delay > 0:
+            time.sleep(delay)
+        return max(delay, 0.0)
+
+    def record(self, response_time, ok=True):
+        if self.backoff is not None:
+            self.backoff.record(response_time, ok)
+
+
+class DriverPool:
+    """Пул headless-драйверов; драйвер пересоздается после recycle_after страниц"""
+
+    def __init__(self, size=1, recycle_after=20, driver_factory=setup_driver):
+        self.size = max(1, size)
+        self.recycle_after = recycle_after
+        self.driver_factory = driver_factory
+        self._slots = [{'driver': None, 'pages': 0} for _ in range(self.size)]
+        self._idle = queue.Queue()
+        for slot in self._slots:
+            self._idle.put(slot)
+
+    def _quit(self, slot):
+        if slot['driver'] is not None:
+            try:
+                slot['driver'].quit()
+            except Exception:
+                pass
+        slot['driver'] = None
+        slot['pages'] = 0
+
+    @contextmanager
+    def driver(self):
+        slot = self._idle.get()
+        try:
+            if slot['driver'] is not None and self.recycle_after and slot['pages'] >= self.recycle_after:
+                print(f"♻️  Перезапуск браузера после {slot['pages']} страниц")
+                self._quit(slot)
+
+            if slot['driver'] is None:
+                print("Запуск браузера...")
+                slot['driver'] = self.driver_factory()
+
+            slot['pages'] += 1
+            yield slot['driver']
+        except Exception:
+            self._quit(slot)
+            raise
+        finally:
+            self._idle.put(slot)
+
+    def close(self):
+        for slot in self._slots:
+            self._quit(slot)
+
+
+def fetch_search_page(pool, limiter, search_query, page_num, save_html, http_fetcher=None, search_url=SEARCH_URL,
+                      cache=None):
+    url = build_search_url(search_query, page_num, search_url)
+
+    if cache is not None:
+        html = cache.get(url)
+        if html is not None:
+            print(f"✓ Страница {page_num} взята из кеша ({len(html)} символов)")
+            METRICS.inc('pages_fetched_total', source='cache')
+            METRICS.inc('fetched_chars_total', len(html), source='cache')
+            return html
+
+    timer = PageTimer(page_num)
+    with timer.step('пауза'):
+        limiter.wait()
+
+    html = None
+    source = 'http'
+    if http_fetcher is not None:
+        start = time.perf_counter()
+        with timer.step('HTTP'):
+            html = http_fetcher.fetch(url)
+        limiter.record(time.perf_counter() - start, ok=html is not None)
+        METRICS.observe('page_fetch_seconds', time.perf_counter() - start, backend='http', ok=html is not None)
+        if html is not None:
+            print(f"✓ Страница {page_num} получена по HTTP ({len(html)} символов)")
+            print(timer.report())
+        else:
+            print(f"↪️  Страница {page_num}: переход на Selenium")
+
+    if html is None:
+        source = 'selenium'
+        start = time.perf_counter()
+        with pool.driver() as driver:
+            html = scrape_page(driver, url, page_num, timer)
+        limiter.record(time.perf_counter() - start)
+        METRICS.observe('page_fetch_seconds', time.perf_counter() - start, backend='selenium', ok=True)
+
+    # Шаги PageTimer: пауза лимитера, ожидания и прокрутка Selenium, HTTP
+    for step, seconds in timer.steps.items():
+        METRICS.observe('page_step_seconds', seconds, step=step)
+    METRICS.inc('pages_fetched_total', source=source)
+    METRICS.inc('fetched_chars_total', len(html), source=source)
+
+    # Selenium отдает и CAPTCHA, и пустую выдачу - в кеше они закрепили бы ошибку до истечения TTL
+    if cache is not None and is_cacheable(url, html):
+        cache.put(url, html)
+
+    if save_html:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f'ebay_{search_query}_page{page_num}_{timestamp}.html'
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(html)
+        print(f"✓ HTML сохранен в {filename}")
+
+    return html
+
+
+def pages_needed(max_items):
+    return max(1, math.ceil(max_items / ITEMS_PER_PAGE))
+
+
+def iter_search_pages(search_query="laptop", max_items=100, save_html=True,
+                      pool_size=1, recycle_after=20, min_interval=0.5, backend="http",
+                      search_url=SEARCH_URL, adaptive_backoff=True, cache=None, checkpoint=None):
+    """
+    Отдает (page_num, html) в порядке страниц по мере загрузки; страницы с ошибкой пропускаются.
+
+    cache - response_cache.ResponseCache: при повторе задачи уже загруженные страницы берутся из него.
+    checkpoint - storage.PageCheckpoint: каждая загруженная страница сохраняется в него,
+    а страницы, которые уже есть в чекпоинте, не загружаются и не отдаются повторно.
+    """
+    if backend not in FETCH_BACKENDS:
+        raise ValueError(f"Неизвестный backend: {backend}. Доступны: {', '.join(FETCH_BACKENDS)}")
+
+    total_pages = pages_needed(max_items)
+    page_nums = [
+        page_num for page_num in range(1, total_pages + 1)
+        if checkpoint is None or not checkpoint.has_page(page_num)
+    ]
+    if checkpoint is not None:
+        checkpoint.expect_pages(total_pages)
+        if checkpoint.pages:
+            print(f"↩️  Чекпоинт: готово страниц {len(checkpoint.pages)}, "
+                  f"продолжение со страницы {checkpoint.first_missing_page()}")
+    if not page_nums:
+        if checkpoint is not None:
+            checkpoint.finish()
+        return
+
+    pool = DriverPool(pool_size, recycle_after)
+    limiter = RateLimiter(min_interval, AdaptiveBackoff(min_delay=min_interval) if adaptive_backoff else None)
+    http_fetcher = HttpFetcher(pool_size=pool.size) if backend == "http" else None
+
+    def fetched(page_num, html):
+        if checkpoint is not None:
+            checkpoint.save_page(page_num, {"page": page_num, "html": html})
+        return page_num, html
+
     try:
         print("=" * 70)
-        print("Запуск браузера...")
-        driver = setup_driver()
-        
-        page_num = 1
-        total_items_found = 0
-        
-        while total_items_found < max_items:
-            url = f"https://www.ebay.com/sch/i.html?_nkw={search_query}&_sacat=0&_from=R40&_pgn={page_num}"
-            
-            html = scrape_page(driver, url, page_num)
-            
-            if save_html:
-                from datetime import datetime
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f'ebay_{search_query}_page{page_num}_{timestamp}.html'
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(html)
-                print(f"✓ HTML сохранен в {filename}")
-            
-            html_pages.append(html)
-            
-            estimated_items = page_num * 60  
-            total_items_found = estimated_items
-            
-            print(f"📊 Примерно собрано: ~{total_items_found} товаров")
-            
-            if total_items_found >= max_items:
-                print(f"\n✅ Достигнуто примерное количество товаров")
-                break
-            
-            page_num += 1
-            print(f"\n⏩ Переход на страницу {page_num}...")
-            time.sleep(2)
-        
+        print(f"Backend: {backend}, потоков: {pool.size}, страниц к загрузке: {len(page_nums)}")
+
+        # Первая страница грузится отдельно: на ней может потребоваться ручное решение CAPTCHA
+        first_page = page_nums.pop(0)
+        yield fetched(first_page, fetch_search_page(
+            pool, limiter, search_query, first_page, save_html, http_fetcher, search_url, cache
+        ))
+
+        if page_nums:
+            with ThreadPoolExecutor(max_workers=pool.size) as executor:
+                futures = [
+                    (page_num, executor.submit(
+                        fetch_search_page, pool, limiter, search_query, page_num, save_html, http_fetcher,
+                        search_url, cache
+                    ))
+                    for page_num in page_nums
+                ]
+                for page_num, future in futures:
+                    try:
+                        html = future.result()
+                    except Exception as e:
+                        print(f"\n❌ Ошибка при загрузке страницы {page_num}: {e}")
+                        continue
+                    yield fetched(page_num, html)
+
+        # Чекпоинт завершен, только если загружены все страницы: иначе повтор задачи их дозагрузит
+        if checkpoint is not None and not checkpoint.missing_pages():
+            checkpoint.finish()
+
+    finally:
+        if http_fetcher is not None:
+            http_fetcher.close()
+        print("\nЗакрытие браузеров...")
+        pool.close()
+
+
+def scrape_ebay(search_query="laptop", max_items=100, save_html=True, **kwargs):
+    """
+    Возвращает список HTML страниц. С checkpoint=storage.PageCheckpoint повторный вызов
+    загружает только недостающие страницы, а готовые берет из чекпоинта.
+    """
+    html_pages = {}
+    total_pages = pages_needed(max_items)
+
+    checkpoint = kwargs.get('checkpoint')
+    if checkpoint is not None:
+        for record in checkpoint.iter_records():
+            if 'html' in record and record['page'] <= total_pages:
+                html_pages[record['page']] = record['html']
+
+    try:
+        for page_num, html in iter_search_pages(search_query, max_items, save_html, **kwargs):
+            html_pages[page_num] = html
+            print(f"📊 Загружено страниц: {len(html_pages)}/{total_pages}")
+
         print(f"\n✓ Загружено страниц: {len(html_pages)}")
-        return html_pages
-        
+        return [html_pages[page_num] for page_num in sorted(html_pages)]
+
+    except ValueError as e:
+        # Неверные параметры (например, неизвестный backend) - не сбой сети, частичный результат не нужен
+        print(f"\n❌ Неверные параметры загрузки: {e}")
+        raise
     except Exception as e:
         print(f"\n❌ Ошибка при загрузке: {e}")
         import traceback
         traceback.print_exc()
-        return html_pages
-        
-    finally:
-        if driver:
-            print("\nЗакрытие браузера...")
-            driver.quit()
-
+        return [html_pages[page_num] for page_num in sorted(html_pages)]
@@ -0,0 +1,354 @@
+"""
+Промежуточное хранилище между задачами DAG: JSON Lines со сжатием.
+
+Каждая страница - отдельная запись, которая пишется сразу после загрузки,
+а читатель отдает записи по одной, не загружая весь файл в память.
+Формат сжатия определяется по расширению: .jsonl.gz (gzip, по умолчанию),
+.jsonl.zst (нужен пакет zstandard) или .jsonl без сжатия.
+
+PageCheckpoint хранит страницы отдельными файлами вместе с файлом состояния,
+чтобы повтор задачи продолжал загрузку с первой недостающей страницы.
+
+Для результатов (.json) есть JsonArrayWriter - обычный JSON-массив, который
+пишется по одному товару, и ленивый iter_json_array; open_writer / iter_items
+выбирают формат по расширению, так что ни запись, ни чтение не держат весь
+список в памяти.
+"""
+import gzip
+import io
+import json
+import os
+import re
+
+try:
+    from .metrics import METRICS
+except ImportError:
+    from metrics import METRICS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _compression_for(path):
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Для .zst файлов нужен пакет zstandard (pip install zstandard)")
+        return 'zstd'
+    if path.endswith('.gz'):
+        return 'gzip'
+    return None
+
+
+def default_extension():
+    return '.jsonl.zst' if zstandard is not None else '.jsonl.gz'
+
+
+def _open_binary(path, mode, compression=None):
+    if compression == 'gzip':
+        return gzip.open(path, mode + 'b', compresslevel=6)
+    if compression == 'zstd':
+        raw = open(path, mode + 'b')
+        if mode == 'w':
+            return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, mode + 'b')
+
+
+def _record_io(path, direction, records=None):
+    """Байты (на диске, после сжатия) и записи, переданные между задачами через файлы"""
+    METRICS.inc('file_bytes_total', os.path.getsize(path), direction=direction)
+    if records is not None:
+        METRICS.inc('file_records_total', records, direction=direction)
+
+
+class RecordWriter:
+    """Пишет записи (dict) по одной строке JSON; файл появляется атомарно при close()"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._tmp_path = path + '.tmp'
+        self._binary = _open_binary(self._tmp_path, 'w', _compression_for(path))
+        self._text = io.TextIOWrapper(self._binary, encoding='utf-8')
+
+    def write(self, record):
+        self._text.write(json.dumps(record, ensure_ascii=False))
+        self._text.write('\n')
+        self.count += 1
+
+    def close(self):
+        if self._text is None:
+            return
+        self._text.close()
+        self._text = None
+        os.replace(self._tmp_path, self.path)
+        _record_io(self.path, 'write', self.count)
+
+    def abort(self):
+        if self._text is None:
+            return
+        self._text.close()
+        self._text = None
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonArrayWriter(RecordWriter):
+    """
+    JSON-массив, который пишется по одному элементу. indent=2 дает тот же текст,
+    что json.dump(items, f, indent=2); indent=None - компактный режим без отступов
+    (элемент на строку).
+    """
+
+    def __init__(self, path, indent=2):
+        super().__init__(path)
+        self.indent = indent
+        self._text.write('[')
+
+    def write(self, record):
+        self._text.write('\n' if self.count == 0 else ',\n')
+        if self.indent is None:
+            self._text.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        else:
+            padding = ' ' * self.indent
+            text = json.dumps(record, ensure_ascii=False, indent=self.indent)
+            self._text.write(padding + text.replace('\n', '\n' + padding))
+        self.count += 1
+
+    def close(self):
+        if self._text is None:
+            return
+        self._text.write('\n]' if self.count else ']')
+        super().close()
+
+
+def _base_extension(path):
+    """Расширение без суффикса сжатия: data.jsonl.gz -> .jsonl"""
+    for suffix in ('.gz', '.zst'):
+        if path.endswith(suffix):
+            path = path[:-len(suffix)]
+    return os.path.splitext(path)[1]
+
+
+def open_writer(path, compact=False):
+    """.jsonl[.gz|.zst] - JSON Lines (RecordWriter), иначе JSON-массив (JsonArrayWriter)"""
+    if _base_extension(path) == '.jsonl':
+        return RecordWriter(path)
+    return JsonArrayWriter(path, indent=None if compact else 2)
+
+
+def write_items(items, path, compact=False):
+    """Пишет товары из любого итератора (например, генератора очистки), возвращает их число"""
+    with open_writer(path, compact) as writer:
+        for item in items:
+            writer.write(item)
+    return writer.count
+
+
+def iter_records(path):
+    """Лениво читает записи из файла JSON Lines (сжатого или нет)"""
+    _record_io(path, 'read')
+    with _open_binary(path, 'r', _compression_for(path)) as binary:
+        for line in io.TextIOWrapper(binary, encoding='utf-8'):
+            if line.strip():
+                yield json.loads(line)
+
+
+_JSON_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json_array(path, chunk_size=1024 * 1024):
+    """Лениво читает элементы JSON-массива (в том числе json.dump(..., indent=2)) кусками по chunk_size"""
+    decoder = json.JSONDecoder()
+    _record_io(path, 'read')
+    with _open_binary(path, 'r', _compression_for(path)) as binary:
+        text = io.TextIOWrapper(binary, encoding='utf-8')
+        buffer = ''
+        pos = 0
+        eof = False
+        # '[' - начало, 'first' - элемент или ']', 'item' - элемент после запятой, ',' - запятая или ']'
+        expect = '['
+
+        while True:
+            pos = _JSON_WHITESPACE_RE.match(buffer, pos).end()
+            need_more = pos >= len(buffer)
+            if not need_more and expect in ('first', 'item') and buffer[pos] != ']':
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    # Число на границе буфера может быть недочитано, а его начало ('1e', '-0.') - тоже число:
+                    # элемент принимается, только когда за ним в буфере уже видна запятая или ']'
+                    after = _JSON_WHITESPACE_RE.match(buffer, end).end()
+                    need_more = not eof and (after >= len(buffer) or buffer[after] not in ',]')
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    need_more = True
+
+            if need_more:
+                if eof:
+                    raise ValueError(f"Незавершенный JSON-массив: {path}")
+                chunk = text.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            char = buffer[pos]
+            if expect == '[':
+                if char != '[':
+                    raise ValueError(f"Ожидался JSON-массив: {path}")
+                pos += 1
+                expect = 'first'
+            elif char == ']' and expect in ('first', ','):
+                return
+            elif expect == ',':
+                if char != ',':
+                    raise ValueError(f"Ожидалась запятая или ']': {path}")
+                pos += 1
+                expect = 'item'
+            elif char == ']':
+                raise ValueError(f"Лишняя запятая перед ']': {path}")
+            else:
+                pos = end
+                expect = ','
+                yield item
+
+
+def iter_items(path):
+    """Ленивое чтение файла, записанного open_writer: JSON Lines или JSON-массив"""
+    if _base_extension(path) == '.jsonl':
+        return iter_records(path)
+    return iter_json_array(path)
+
+
+def _source_records(source):
+    if isinstance(source, PageCheckpoint):
+        return source.iter_records()
+    return iter_records(source)
+
+
+def iter_html_pages(source):
+    """source - путь к файлу JSON Lines или PageCheckpoint"""
+    for record in _source_records(source):
+        yield record['html']
+
+
+def iter_parsed_items(source):
+    """source - путь к файлу JSON Lines или PageCheckpoint"""
+    for record in _source_records(source):
+        yield from record['items']
+
+
+class PageCheckpoint:
+    """
+    Постраничный чекпоинт скрапинга: каждая страница - файл page_NNNN в directory,
+    state.json - номера готовых страниц (с числом товаров), ожидаемое число страниц
+    запуска (expect_pages) и признак завершения.
+
+    Страница сначала атомарно пишется на диск и только потом попадает в state.json,
+    поэтому после падения в состоянии нет ссылок на недописанные файлы.
+    """
+
+    STATE_FILE = 'state.json'
+
+    def __init__(self, directory, extension=None):
+        self.directory = directory
+        self.extension = extension or default_extension()
+        os.makedirs(directory, exist_ok=True)
+        self._state_path = os.path.join(directory, self.STATE_FILE)
+        self.state = {'pages': {}, 'last_page': 0, 'expected_pages': None, 'finished': False}
+
+        if os.path.exists(self._state_path):
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            # Ключи JSON - строки, в памяти держим номера страниц
+            self.state['pages'] = {int(page): count for page, count in self.state['pages'].items()}
+            # Состояние старых чекпоинтов без ожидаемого числа страниц
+            self.state.setdefault('expected_pages', None)
+
+    @property
+    def pages(self):
+        return sorted(self.state['pages'])
+
+    @property
+    def finished(self):
+        return self.state['finished']
+
+    @property
+    def last_page(self):
+        return self.state['last_page']
+
+    def has_page(self, page_num):
+        return page_num in self.state['pages']
+
+    def item_count(self):
+        return sum(count or 0 for count in self.state['pages'].values())
+
+    def has_empty_page(self):
+        return any(count == 0 for count in self.state['pages'].values())
+
+    def first_missing_page(self):
+        page_num = 1
+        while page_num in self.state['pages']:
+            page_num += 1
+        return page_num
+
+    @property
+    def expected_pages(self):
+        return self.state['expected_pages']
+
+    def expect_pages(self, total_pages):
+        """Сколько страниц должен загрузить запуск (scraper.pages_needed); сохраняется в state.json"""
+        if self.state['expected_pages'] != total_pages:
+            self.state['expected_pages'] = total_pages
+            self._save_state()
+
+    def missing_pages(self):
+        """
+        Страницы, загрузка которых упала: пропуски до ожидаемого числа страниц
+        (или до последней готовой, если она дальше). После пустой страницы выдачи
+        страниц нет, поэтому они не считаются пропущенными.
+        """
+        last_page = max(self.state['last_page'], self.state['expected_pages'] or 0)
+        empty_pages = [page_num for page_num, count in self.state['pages'].items() if count == 0]
+        if empty_pages:
+            last_page = min(last_page, min(empty_pages))
+        return [page_num for page_num in range(1, last_page + 1) if page_num not in self.state['pages']]
+
+    def _page_path(self, page_num):
+        return os.path.join(self.directory, f"page_{page_num:04d}{self.extension}")
+
+    def _save_state(self):
+        tmp_path = self._state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self._state_path)
+
+    def save_page(self, page_num, record):
+        """record - {'page': n, 'html': ...} или {'page': n, 'items': [...]}"""
+        with RecordWriter(self._page_path(page_num)) as writer:
+            writer.write(record)
+
+        items = record.get('items')
+        self.state['pages'][page_num] = len(items) if items is not None else None
+        self.state['last_page'] = max(self.state['last_page'], page_num)
+        self._save_state()
+
+    def finish(self):
+        self.state['finished'] = True
+        self._save_state()
+
+    def iter_records(self):
+        """Записи готовых страниц по порядку; незавершенный чекпоинт тоже читается"""
+        for page_num in self.pages:
+            yield from iter_records(self._page_path(page_num))
@@ -0,0 +1,135 @@
+"""
+Адаптивные ожидания для Selenium вместо фиксированных time.sleep.
+
+- wait_for_dom_quiescence: ждет, пока число карточек перестанет меняться
+- scroll_until_stable: прокручивает страницу, пока появляются новые карточки
+- AdaptiveBackoff: пауза между запросами по измеренному времени ответа
+- PageTimer: замер времени каждого шага загрузки страницы
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+
+CARD_SELECTOR = "div.su-card-container"
+
+
+class PageTimer:
+    """Собирает длительность шагов загрузки одной страницы"""
+
+    def __init__(self, page_num):
+        self.page_num = page_num
+        self.steps = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = self.steps.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total(self):
+        return time.perf_counter() - self._started
+
+    def report(self):
+        parts = ', '.join(f"{name} {seconds:.2f}с" for name, seconds in self.steps.items())
+        return f"⏱️  Страница {self.page_num}: {self.total:.2f}с ({parts})"
+
+
+def count_cards(driver, selector=CARD_SELECTOR):
+    from selenium.webdriver.common.by import By
+    return len(driver.find_elements(By.CSS_SELECTOR, selector))
+
+
+def wait_for_dom_quiescence(driver, selector=CARD_SELECTOR, poll_interval=0.25,
+                            stable_polls=3, timeout=10):
+    """Ждет, пока число элементов не меняется stable_polls опросов подряд. Возвращает число элементов"""
+    deadline = time.monotonic() + timeout
+    last_count = count_cards(driver, selector)
+    stable = 0
+
+    while stable < stable_polls and time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        count = count_cards(driver, selector)
+        if count == last_count:
+            stable += 1
+        else:
+            stable = 0
+            last_count = count
+
+    return last_count
+
+
+def scroll_until_stable(driver, selector=CARD_SELECTOR, poll_interval=0.25,
+                        settle_polls=2, max_steps=15):
+    """Прокручивает страницу по экрану, пока после прокрутки появляются новые элементы"""
+    count = count_cards(driver, selector)
+
+    for _ in range(max_steps):
+        at_bottom = driver.execute_script(
+            "window.scrollBy(0, window.innerHeight);"
+            "return window.innerHeight + window.scrollY >= document.body.scrollHeight;"
+        )
+
+        new_count = count
+        for _ in range(settle_polls):
+            time.sleep(poll_interval)
+            new_count = count_cards(driver, selector)
+            if new_count != count:
+                break
+
+        if new_count == count and at_bottom:
+            break
+        count = new_count
+
+    return count
+
+
+class AdaptiveBackoff:
+    """
+    Пауза между запросами, зависящая от измеренного времени ответа.
+
+    Пока сервер отвечает как обычно, пауза равна min_delay: само время ответа
+    ее не увеличивает, иначе общий для всех потоков интервал становился бы
+    равен времени ответа и пул работал бы как один поток. Пауза растет, только
+    если среднее время ответа превысило базовое (самое быстрое сглаженное)
+    в slowdown_threshold раз - пропорционально замедлению, - и после ошибок
+    и CAPTCHA: каждая удваивает множитель penalty до max_penalty. Успешные
+    ответы уменьшают множитель вдвое. Итоговая пауза не больше max_delay.
+    """
+
+    def __init__(self, min_delay=0.5, max_delay=30.0, max_penalty=16.0, slowdown_threshold=1.5, smoothing=0.3):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_penalty = max_penalty
+        self.slowdown_threshold = slowdown_threshold
+        self.smoothing = smoothing
+        self.avg_response = None
+        self.baseline = None
+        self.penalty = 1.0
+        self._lock = threading.Lock()
+
+    def record(self, response_time, ok=True):
+        with self._lock:
+            if ok:
+                if self.avg_response is None:
+                    self.avg_response = response_time
+                else:
+                    self.avg_response += self.smoothing * (response_time - self.avg_response)
+                self.baseline = self.avg_response if self.baseline is None else min(self.baseline, self.avg_response)
+                self.penalty = max(1.0, self.penalty / 2)
+            else:
+                self.penalty = min(self.penalty * 2, self.max_penalty)
+
+    def slowdown(self):
+        """Во сколько раз сервер отвечает медленнее обычного (1.0 - в пределах порога)"""
+        if not self.baseline or self.avg_response <= self.baseline * self.slowdown_threshold:
+            return 1.0
+        return self.avg_response / self.baseline
+
+    def delay(self):
+        with self._lock:
+            return min(self.max_delay, self.min_delay * self.slowdown() * self.penalty)
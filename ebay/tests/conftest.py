@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'dags', 'src'))
+sys.path.append(os.path.join(ROOT, 'benchmarks'))
+
+from fixtures import start_fixture_server
+
+
+@pytest.fixture
+def fixture_server():
+    """Фабрика локальных серверов fixtures.start_fixture_server: (server, base_url)"""
+    servers = []
+
+    def start(latency=0.0):
+        server, base_url = start_fixture_server(latency=latency)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import async_pipeline
+from async_pipeline import scrape_ebay_async
+from fixtures import fixture_search_url
+from storage import PageCheckpoint
+
+
+def run(base_url, timeout=10, **kwargs):
+    options = dict(
+        search_query='laptop', max_items=60 * 8, pool_size=2, min_interval=0.0,
+        search_url=fixture_search_url(base_url), queue_size=1,
+    )
+    options.update(kwargs)
+    return asyncio.run(asyncio.wait_for(scrape_ebay_async(**options), timeout))
+
+
+def test_pipeline_stops_after_max_items(fixture_server):
+    server, base_url = fixture_server()
+
+    items = run(base_url, max_items=150, pool_size=2, queue_size=1)
+
+    assert len(items) >= 150
+    # В работе не больше queue_size страниц, поэтому после 3-й страницы (180 товаров)
+    # догружаются только номера, уже взятые загрузчиками: не больше pool_size
+    assert server.stats['requests'] <= 3 + 2
+
+
+def test_on_page_error_fails_instead_of_hanging(fixture_server):
+    server, base_url = fixture_server(latency=0.05)
+
+    def on_page(page_num, items):
+        raise RuntimeError('disk full')
+
+    with pytest.raises(RuntimeError, match='disk full'):
+        run(base_url, on_page=on_page)
+
+
+def test_parse_error_fails_instead_of_hanging(fixture_server, monkeypatch):
+    server, base_url = fixture_server(latency=0.05)
+
+    def parse_items(html):
+        raise ValueError('bad page')
+
+    monkeypatch.setattr(async_pipeline, 'parse_items', parse_items)
+    with pytest.raises(ValueError, match='bad page'):
+        run(base_url)
+
+
+def test_checkpoint_write_error_fails_instead_of_hanging(fixture_server, tmp_path, monkeypatch):
+    server, base_url = fixture_server(latency=0.05)
+    checkpoint = PageCheckpoint(str(tmp_path / 'pages'))
+
+    def save_page(page_num, record):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(checkpoint, 'save_page', save_page)
+    with pytest.raises(OSError, match='No space left'):
+        run(base_url, checkpoint=checkpoint)
+
+
+def test_failed_last_page_leaves_checkpoint_unfinished(fixture_server, tmp_path, monkeypatch):
+    server, base_url = fixture_server()
+    checkpoint = PageCheckpoint(str(tmp_path / 'pages'))
+    fetch_search_page = async_pipeline.fetch_search_page
+
+    def failing_fetch(pool, limiter, search_query, page_num, *args):
+        if page_num == 3:
+            raise RuntimeError('connection reset')
+        return fetch_search_page(pool, limiter, search_query, page_num, *args)
+
+    monkeypatch.setattr(async_pipeline, 'fetch_search_page', failing_fetch)
+    run(base_url, max_items=60 * 3, max_pages=3, checkpoint=checkpoint)
+
+    assert checkpoint.pages == [1, 2]
+    assert checkpoint.missing_pages() == [3]
+    assert not checkpoint.finished
@@ -0,0 +1,27 @@
+import pytest
+
+from cleaner import (
+    PANDAS_MIN_ITEMS, choose_cleaning_engine, clean_parsed_items, get_item_fingerprint,
+)
+from fixtures import make_raw_items
+
+
+def test_engine_depends_on_item_count():
+    pytest.importorskip('pandas')
+    assert choose_cleaning_engine(PANDAS_MIN_ITEMS - 1) == 'python'
+    assert choose_cleaning_engine(PANDAS_MIN_ITEMS) == 'pandas'
+    assert choose_cleaning_engine(10, 'pandas') == 'pandas'
+    assert choose_cleaning_engine(10 ** 6, 'python') == 'python'
+
+
+def test_pandas_engine_matches_python_engine(capsys):
+    pytest.importorskip('pandas')
+    raw_items = make_raw_items(2000)
+
+    python_items = clean_parsed_items(raw_items, 'python')
+    pandas_items = clean_parsed_items(raw_items, 'pandas')
+
+    assert pandas_items == python_items
+    assert [list(item) for item in pandas_items] == [list(item) for item in python_items]
+    for item in pandas_items:
+        assert item['content_hash'] == get_item_fingerprint(item)
@@ -0,0 +1,106 @@
+import pytest
+
+import scraper
+from fixtures import fixture_search_url
+from http_fetcher import HttpFetcher, CARD_MARKER
+from response_cache import ResponseCache
+from scraper import DriverPool, RateLimiter, fetch_search_page, iter_search_pages, scrape_ebay
+
+
+def stub_selenium(monkeypatch, html='<div class="su-card-container">selenium</div>'):
+    """scrape_page без браузера: запоминает URL, которые ушли в Selenium"""
+    calls = []
+
+    def scrape_page(driver, url, page_num, timer=None):
+        calls.append(url)
+        return html
+
+    monkeypatch.setattr(scraper, 'scrape_page', scrape_page)
+    return calls
+
+
+def fetch(search_url, pool=None, page_num=1, cache=None):
+    fetcher = HttpFetcher(pool_size=1)
+    try:
+        return fetch_search_page(
+            pool or DriverPool(1, driver_factory=object), RateLimiter(0.0), 'laptop', page_num, False,
+            fetcher, search_url, cache
+        )
+    finally:
+        fetcher.close()
+
+
+def test_http_backend_returns_cards_without_browser(fixture_server, monkeypatch):
+    calls = stub_selenium(monkeypatch)
+    server, base_url = fixture_server()
+
+    html = fetch(fixture_search_url(base_url), page_num=3)
+
+    assert CARD_MARKER in html
+    assert html.count('class="su-card-container"') == 60
+    assert calls == []
+    assert server.stats['requests'] == 1
+
+
+def test_challenge_page_falls_back_to_selenium(fixture_server, monkeypatch):
+    calls = stub_selenium(monkeypatch)
+    server, base_url = fixture_server()
+    search_url = base_url + "/challenge?_nkw={query}&_pgn={page}"
+
+    html = fetch(search_url)
+
+    assert 'selenium' in html
+    assert calls == [search_url.format(query='laptop', page=1)]
+
+
+def test_page_without_cards_falls_back_to_selenium(fixture_server, monkeypatch):
+    calls = stub_selenium(monkeypatch)
+    server, base_url = fixture_server()
+
+    # Страница товара отвечает 200, но карточек выдачи в ней нет
+    html = fetch(base_url + "/itm/{page}?_nkw={query}")
+
+    assert 'selenium' in html
+    assert len(calls) == 1
+
+
+def test_only_pages_with_cards_are_cached(fixture_server, monkeypatch, tmp_path):
+    server, base_url = fixture_server()
+    cache = ResponseCache(str(tmp_path / 'cache.db'))
+    challenge_url = base_url + "/challenge?_nkw={query}&_pgn={page}"
+
+    stub_selenium(monkeypatch, html='<html>Please verify: captcha</html>')
+    fetch(challenge_url, cache=cache)
+    stub_selenium(monkeypatch, html='<html>no results</html>')
+    fetch(base_url + "/itm/{page}?_nkw={query}", cache=cache)
+    assert cache.stats['stored'] == 0
+
+    html = fetch(fixture_search_url(base_url), page_num=3, cache=cache)
+    assert cache.stats['stored'] == 1
+    assert cache.get(fixture_search_url(base_url).format(query='laptop', page=3)) == html
+    cache.close()
+
+
+def test_pool_fetches_pages_concurrently(fixture_server, monkeypatch):
+    calls = stub_selenium(monkeypatch)
+    server, base_url = fixture_server(latency=0.2)
+
+    pages = list(iter_search_pages(
+        'laptop', max_items=60 * 9, save_html=False, pool_size=4, min_interval=0.0,
+        search_url=fixture_search_url(base_url), adaptive_backoff=False
+    ))
+
+    assert [page_num for page_num, _ in pages] == list(range(1, 10))
+    assert calls == []
+    assert server.stats['requests'] == 9
+    # Параллельность проверяется по серверу, а не по времени: ответ длится 0.2 с,
+    # и пул из 4 потоков держит несколько запросов одновременно
+    assert server.stats['max_in_flight'] >= 2
+
+
+def test_unknown_backend_is_not_swallowed(capsys):
+    # Ошибка параметров не превращается в пустой частичный результат
+    with pytest.raises(ValueError, match='backend'):
+        scrape_ebay('laptop', max_items=60, save_html=False, backend='curl')
+
+    assert 'Неверные параметры загрузки' in capsys.readouterr().out
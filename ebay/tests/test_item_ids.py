@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+from cleaner import remove_duplicates
+from fixtures import create_legacy_database
+from item_ids import canonical_item_url, extract_item_id, item_key
+from loader import ProductStore
+
+ITEM_ID = 186853524903
+URL_VARIANTS = [
+    f'https://www.ebay.com/itm/{ITEM_ID}?_skw=laptop&hash=item2b81a9c1a7:g:abc&itmprp=enc%3AAQAKAAAA',
+    f'https://www.ebay.com/itm/dell-latitude-7490-i7/{ITEM_ID}',
+    f'https://m.ebay.com/itm/{ITEM_ID}',
+    f'https://www.ebay.com/i/{ITEM_ID}#ad',
+    f'https://cgi.ebay.com/ws/eBayISAPI.dll?ViewItem&item={ITEM_ID}',
+    f'https://www.ebay.com/p/9031234?iid={ITEM_ID}',
+    f'https://rover.ebay.com/rover/1/711-53200-19255-0/1?mpre=https%3A%2F%2Fwww.ebay.com%2Fitm%2F{ITEM_ID}',
+]
+
+
+@pytest.mark.parametrize('url', URL_VARIANTS)
+def test_extract_item_id_from_url_variants(url):
+    assert extract_item_id(url) == ITEM_ID
+
+
+@pytest.mark.parametrize('url', [None, '', 'N/A', 'https://www.ebay.com/str/laptopdepot',
+                                 'https://www.ebay.com/itm/12345', 'https://www.ebay.com/sch/i.html?_nkw=laptop'])
+def test_urls_without_item_id(url):
+    assert extract_item_id(url) is None
+    assert canonical_item_url(url) is None
+
+
+def test_canonical_url_keeps_ebay_site():
+    assert canonical_item_url(URL_VARIANTS[2]) == f'https://www.ebay.com/itm/{ITEM_ID}'
+    assert canonical_item_url(f'https://www.ebay.co.uk/itm/x/{ITEM_ID}?hash=1') == f'https://www.ebay.co.uk/itm/{ITEM_ID}'
+
+
+def test_surrogate_key_is_stable_and_negative():
+    key = item_key('N/A', 'Dell Latitude', 100.0)
+    assert key < 0
+    assert key == item_key('N/A', 'Dell Latitude', 100.0)
+    assert item_key(None, 'Dell Latitude', 100.0) != item_key(None, 'Dell Latitude', 101.0)
+
+
+def test_duplicates_removed_across_url_variants(capsys):
+    items = [{'title': 'Dell Latitude 7490', 'item_url': url} for url in URL_VARIANTS]
+    items.append({'title': 'Dell Latitude 7490', 'item_url': 'https://www.ebay.com/itm/186853524904'})
+
+    assert [item['item_url'] for item in remove_duplicates(items)] == [URL_VARIANTS[0], items[-1]['item_url']]
+
+
+def test_store_keys_rows_by_item_id(capsys):
+    item = {
+        'title': 'Dell Latitude 7490', 'price': 300.0, 'currency': 'USD', 'condition': 'Used',
+        'seller_name': None, 'location': None, 'shipping_price': 0.0, 'rating': None,
+        'reviews_count': None, 'scraped_at': '2025-12-01 10:00:00', 'specifications': None,
+    }
+    with ProductStore(':memory:') as store:
+        store.save_items([dict(item, item_url=URL_VARIANTS[0])], 'laptop')
+        store.save_items([dict(item, item_url=URL_VARIANTS[2], price=280.0)], 'laptop')
+
+        assert store.conn.execute('SELECT item_id, price FROM products').fetchall() == [(ITEM_ID, 280.0)]
+        stored = store.stored_fingerprints([URL_VARIANTS[1], 'https://www.ebay.com/itm/186853524904'])
+        assert list(stored) == [URL_VARIANTS[1]]
+
+
+def test_legacy_database_migrates_to_item_id_key(tmp_path, capsys):
+    db_name = str(tmp_path / 'legacy.db')
+    create_legacy_database(db_name)
+    conn = sqlite3.connect(db_name)
+    conn.executemany(
+        'INSERT INTO products (title, price, item_url, scraped_at) VALUES (?, ?, ?, ?)',
+        [('Dell Latitude 7490', 300.0, URL_VARIANTS[0], '2025-12-01 10:00:00'),
+         ('Dell Latitude 7490', 280.0, URL_VARIANTS[1], '2025-12-02 10:00:00'),
+         ('No link', 50.0, None, '2025-12-02 10:00:00')]
+    )
+    conn.commit()
+    conn.close()
+
+    with ProductStore(db_name) as store:
+        rows = dict(store.conn.execute('SELECT item_id, price FROM products'))
+        assert len(rows) == 2
+        # Строки одного объявления схлопываются, остается самая свежая
+        assert rows[ITEM_ID] == 280.0
+        assert store.conn.execute('SELECT item_url FROM products WHERE item_id = ?', (ITEM_ID,)).fetchone() == (
+            f'https://www.ebay.com/itm/{ITEM_ID}',
+        )
+        # История цен сохраняет все строки старой базы по порядку, а не только последнюю
+        series = [(row['scraped_at'], row['price']) for row in store.price_series(ITEM_ID)]
+        assert series == [('2025-12-01 10:00:00', 300.0), ('2025-12-02 10:00:00', 280.0)]
+        assert store.conn.execute('SELECT COUNT(*) FROM price_snapshots').fetchone()[0] == 3
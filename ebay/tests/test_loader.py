@@ -0,0 +1,123 @@
+import pytest
+
+from fixtures import make_clean_items
+from loader import ProductStore, load_and_save
+
+
+@pytest.fixture
+def store():
+    with ProductStore(':memory:') as store:
+        yield store
+
+
+def titles(store):
+    return dict(store.conn.execute('SELECT item_id, title FROM products'))
+
+
+def test_upsert_counts_new_and_updated_rows(store, capsys):
+    items = make_clean_items(30)
+    assert store.save_items(items[:20], 'laptop', batch_size=7) == 20
+
+    changed = [dict(item, title=item['title'] + ' v2') for item in items[10:20]]
+    # Повтор товара внутри пачки: последняя версия побеждает
+    changed.append(dict(items[12], title='last wins'))
+    saved = store.save_items(changed + items[20:], 'laptop', batch_size=7)
+
+    output = capsys.readouterr().out
+    assert saved == 21
+    assert 'Добавлено новых записей: 10' in output
+    assert 'Обновлено записей: 11' in output
+    assert 'Всего в базе: 30' in output
+    assert store.row_count() == store.count() == 30
+    assert titles(store)[items[12]['item_id']] == 'last wins'
+    assert titles(store)[items[15]['item_id']].endswith(' v2')
+    assert store.search('v2', limit=-1)
+
+
+def test_resaving_same_rows_writes_nothing(store, capsys):
+    items = make_clean_items(10)
+    # Повтор товара в следующей пачке пустой таблицы: прежний текст известен из первой пачки
+    store.save_items(items + [dict(items[0], title='Dell Latitude renamed')], 'laptop', batch_size=4)
+    store.conn.execute("INSERT INTO products_fts (products_fts, rank) VALUES ('integrity-check', 1)")
+    assert [row['item_id'] for row in store.search('renamed')] == [items[0]['item_id']]
+
+    changes = store.conn.total_changes
+    assert store.save_items(items[1:], 'laptop') == 9
+    assert store.conn.total_changes == changes
+    assert 'Обновлено записей: 9' in capsys.readouterr().out
+
+
+def test_outer_rollback_discards_saved_rows(store, capsys):
+    items = make_clean_items(10)
+    store.save_items(items[:4], 'laptop')
+
+    with pytest.raises(RuntimeError):
+        with store.transaction('outer'):
+            store.save_items(items[4:], 'laptop', batch_size=2)
+            assert store.count() == 10
+            raise RuntimeError('task failed')
+
+    assert store.count() == 4
+    assert store.row_count() == 4
+    assert store.conn.execute('SELECT COUNT(*) FROM price_snapshots').fetchone()[0] == 4
+    assert len(store.search('laptop OR Lenovo OR Dell OR HP OR Apple OR ASUS OR Acer', limit=-1)) <= 4
+
+
+def test_failed_batch_is_saved_row_by_row(store, capsys):
+    items = make_clean_items(5)
+    items[2]['price'] = object()
+
+    assert store.save_items(items, 'laptop', batch_size=5) == 4
+
+    output = capsys.readouterr().out
+    assert 'Добавлено новых записей: 4' in output
+    assert set(titles(store)) == {item['item_id'] for item in items} - {items[2]['item_id']}
+    assert store.row_count() == store.count() == 4
+    # Снимки цен - только у сохраненных строк
+    assert store.conn.execute('SELECT COUNT(*) FROM price_snapshots').fetchone()[0] == 4
+
+
+def test_price_history_keeps_every_observation(store, capsys):
+    item = make_clean_items(1)[0]
+    observations = [('2025-12-01 10:00:00', 500.0), ('2025-12-02 10:00:00', 450.0), ('2025-12-03 10:00:00', 480.0)]
+    for scraped_at, price in observations:
+        store.save_items([dict(item, scraped_at=scraped_at, price=price)], 'laptop')
+    # Повтор той же загрузки (ретрай задачи) не дублирует снимок
+    store.save_items([dict(item, scraped_at='2025-12-02 10:00:00', price=450.0)], 'laptop')
+
+    series = store.price_series(item['item_id'])
+    assert [(row['scraped_at'], row['price']) for row in series] == observations
+    assert [row['price'] for row in store.price_series(item['item_id'], start='2025-12-02', end='2025-12-02 23:59:59')] == [450.0]
+    latest = store.latest_prices([item['item_id']])
+    assert latest[item['item_id']]['price'] == 480.0
+    assert latest[item['item_id']]['scraped_at'] == '2025-12-03 10:00:00'
+
+
+def test_incremental_load_skips_unchanged_rows_but_records_snapshots(store, capsys):
+    items = make_clean_items(10)
+    for item in items:
+        item['scraped_at'] = '2025-12-01 10:00:00'
+    load_and_save(items, 'laptop', save_json=False, db_name=store, incremental=True)
+    store.conn.execute('UPDATE products SET title = title || ? WHERE item_id = ?', (' (stored)', items[0]['item_id']))
+
+    rerun = [dict(item, scraped_at='2025-12-02 10:00:00') for item in items]
+    rerun[1]['price'] = 99.0
+    rerun[1].pop('content_hash', None)
+    stats = load_and_save(rerun, 'laptop', save_json=False, db_name=store, incremental=True)
+
+    assert stats['db_records_skipped'] == 9
+    assert stats['db_records_saved'] == 1
+    rows = {row[0]: row[1:] for row in store.conn.execute('SELECT item_id, title, price, scraped_at FROM products')}
+    # Строка без изменений не переписана, сдвинуто только время наблюдения
+    assert rows[items[0]['item_id']] == (items[0]['title'] + ' (stored)', items[0]['price'], '2025-12-02 10:00:00')
+    assert rows[items[1]['item_id']][1:] == (99.0, '2025-12-02 10:00:00')
+    assert [row['price'] for row in store.price_series(items[0]['item_id'])] == [items[0]['price']] * 2
+    assert store.conn.execute('SELECT COUNT(*) FROM price_snapshots').fetchone()[0] == 20
+
+    # Повтор того же запуска ничего не добавляет и не откатывает время назад
+    load_and_save(rerun[:1], 'laptop', save_json=False, db_name=store, incremental=True)
+    load_and_save(items[:1], 'laptop', save_json=False, db_name=store, incremental=True)
+    assert store.conn.execute('SELECT COUNT(*) FROM price_snapshots').fetchone()[0] == 20
+    assert rows[items[0]['item_id']][2] == store.conn.execute(
+        'SELECT scraped_at FROM products WHERE item_id = ?', (items[0]['item_id'],)
+    ).fetchone()[0]
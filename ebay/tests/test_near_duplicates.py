@@ -0,0 +1,59 @@
+from fixtures import make_clean_items
+from loader import ProductStore, load_and_save
+
+
+def indexed_ids(store):
+    return {row[0] for row in store.conn.execute('SELECT item_id FROM listing_minhash')}
+
+
+def relisted(item, item_id):
+    """Тот же товар, перевыставленный под другим номером"""
+    return dict(item, item_url=f'https://www.ebay.com/itm/{item_id}', item_id=item_id,
+                title=item['title'] + ' Fast Shipping', price=round(item['price'] * 1.02, 2))
+
+
+def test_index_products_only_touches_given_item_ids(capsys):
+    items = make_clean_items(20)
+    with ProductStore(':memory:') as store:
+        store.save_items(items, 'laptop')
+        first = [item['item_id'] for item in items[:5]]
+
+        assert store.index_products(item_ids=first) == 5
+        assert indexed_ids(store) == set(first)
+        assert store.index_products(item_ids=first) == 0
+        assert store.index_products() == 15
+
+
+def test_title_without_words_is_indexed_once(capsys):
+    items = make_clean_items(3)
+    items[1]['title'] = '!!! --- ???'
+    with ProductStore(':memory:') as store:
+        store.save_items(items, 'laptop')
+
+        assert store.index_products() == 2
+        # Строка без слов записана с пустой подписью и больше не считается кандидатом
+        assert indexed_ids(store) == {item['item_id'] for item in items}
+        assert store.conn.execute(
+            'SELECT signature FROM listing_minhash WHERE item_id = ?', (items[1]['item_id'],)
+        ).fetchone() == (b'',)
+        assert store.index_products() == 0
+
+        store.save_items([dict(items[1], title='Dell Latitude 7490', price=500.0)], 'laptop')
+        assert store.index_products() == 1
+        assert store.conn.execute(
+            'SELECT COUNT(*) FROM listing_lsh WHERE item_id = ?', (items[1]['item_id'],)
+        ).fetchone()[0] > 0
+
+
+def test_load_and_save_clusters_relisted_items_across_chunks(capsys):
+    items = make_clean_items(50)
+    items.append(relisted(items[7], 190000000000))
+    with ProductStore(':memory:') as store:
+        stats = load_and_save(items, 'laptop', save_json=False, db_name=store,
+                              near_duplicates=True, chunk_size=20)
+
+        clusters = dict(store.conn.execute('SELECT item_id, cluster_id FROM products'))
+        assert indexed_ids(store) == set(clusters)
+        assert stats['near_duplicates'] >= 2
+        assert clusters[190000000000] == clusters[items[7]['item_id']] <= items[7]['item_id']
+        assert store.timings['index_products']['calls'] == 1 + 3
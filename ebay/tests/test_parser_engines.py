@@ -0,0 +1,62 @@
+"""
+Движки bs4 и lxml на сохраненных страницах tests/pages должны давать одинаковый результат.
+
+search_laptop_page2.html и product_*.html сохранены из fixtures.make_search_page /
+make_product_page, *_edge_cases.html написаны вручную: вложенная разметка, сущности,
+комментарии, script внутри карточки, ссылка снаружи карточки, пустые блоки.
+"""
+import os
+
+import pytest
+
+from cleaner import parse_items, parse_product_page
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+def read_page(name):
+    with open(os.path.join(PAGES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def pages(prefix):
+    return sorted(name for name in os.listdir(PAGES_DIR) if name.startswith(prefix))
+
+
+def without_scraped_at(items):
+    return [{key: value for key, value in item.items() if key != 'scraped_at'} for item in items]
+
+
+@pytest.mark.parametrize('name', pages('search_'))
+def test_parse_items_engines_match(name):
+    html = read_page(name)
+
+    bs4_items = without_scraped_at(parse_items(html, engine='bs4'))
+    lxml_items = without_scraped_at(parse_items(html, engine='lxml'))
+
+    assert bs4_items
+    assert lxml_items == bs4_items
+
+
+@pytest.mark.parametrize('name', pages('product_'))
+def test_parse_product_page_engines_match(name):
+    html = read_page(name)
+
+    bs4_data = parse_product_page(html, engine='bs4')
+    lxml_data = parse_product_page(html, engine='lxml')
+
+    assert bs4_data.get('seller_name')
+    assert lxml_data == bs4_data
+
+
+def test_edge_case_search_page():
+    items = parse_items(read_page('search_edge_cases.html'), engine='lxml')
+
+    # Заглушка "Shop on eBay" и карточка без названия отброшены
+    assert len(items) == 5
+    assert items[0]['title'].startswith('Dell   Latitude 7490 & Dock')
+    assert items[0]['price'] == 1299.99
+    assert '&amp;' not in items[0]['item_url']
+    # Ссылка вокруг карточки, а не внутри нее
+    assert items[2]['item_url'] == 'https://www.ebay.com/itm/226543210003'
+    assert items[2]['currency'] == 'EUR'
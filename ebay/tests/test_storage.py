@@ -0,0 +1,148 @@
+import gzip
+import json
+
+import pytest
+
+import scraper
+from fixtures import fixture_search_url
+from scraper import iter_search_pages
+from storage import PageCheckpoint, JsonArrayWriter, iter_json_array
+
+ITEMS = [
+    {'title': 'Dell, "Latitude" [7490]', 'price': 1299.99, 'specs': {'RAM': '16 GB', 'ports': [1, 2]}},
+    {'title': 'Новое объявление \\ ThinkPad', 'price': 100, 'specs': None},
+    12345678,
+    [],
+    {'title': '}]', 'price': -0.5, 'specs': {}},
+    'строка с запятой, и скобкой ]',
+    1e-7,
+]
+
+
+def test_checkpoint_missing_pages_survive_reopen(tmp_path):
+    checkpoint = PageCheckpoint(str(tmp_path))
+    for page_num, items in ((1, [{}] * 60), (2, [{}] * 60), (4, [{}] * 60), (6, [])):
+        checkpoint.save_page(page_num, {'page': page_num, 'items': items})
+
+    reopened = PageCheckpoint(str(tmp_path))
+
+    assert reopened.pages == [1, 2, 4, 6]
+    assert reopened.missing_pages() == [3, 5]
+    assert reopened.first_missing_page() == 3
+    assert reopened.last_page == 6
+    assert reopened.item_count() == 180
+    assert reopened.has_empty_page()
+    assert not reopened.finished
+    assert [record['page'] for record in reopened.iter_records()] == [1, 2, 4, 6]
+
+
+def test_unsaved_page_file_is_not_in_state(tmp_path):
+    checkpoint = PageCheckpoint(str(tmp_path))
+    checkpoint.save_page(1, {'page': 1, 'html': '<html></html>'})
+    # Упали после записи файла страницы, но до обновления state.json
+    with open(checkpoint._page_path(2) + '.tmp', 'w') as f:
+        f.write('{"page": 2, "ht')
+
+    reopened = PageCheckpoint(str(tmp_path))
+
+    assert reopened.pages == [1]
+    assert reopened.first_missing_page() == 2
+    assert list(reopened.iter_records()) == [{'page': 1, 'html': '<html></html>'}]
+
+
+def test_resume_fetches_only_missing_pages(fixture_server, tmp_path):
+    server, base_url = fixture_server()
+    checkpoint = PageCheckpoint(str(tmp_path))
+    for page_num in (1, 2, 4):
+        checkpoint.save_page(page_num, {'page': page_num, 'html': f'<html>saved {page_num}</html>'})
+
+    fetched = list(iter_search_pages(
+        'laptop', max_items=60 * 5, save_html=False, pool_size=2, min_interval=0.0,
+        search_url=fixture_search_url(base_url), checkpoint=checkpoint
+    ))
+
+    assert [page_num for page_num, _ in fetched] == [3, 5]
+    assert server.stats['requests'] == 2
+    assert checkpoint.finished
+    assert checkpoint.missing_pages() == []
+    records = list(PageCheckpoint(str(tmp_path)).iter_records())
+    assert [record['page'] for record in records] == [1, 2, 3, 4, 5]
+    assert records[0]['html'] == '<html>saved 1</html>'
+
+
+def test_missing_pages_counts_expected_pages(tmp_path):
+    checkpoint = PageCheckpoint(str(tmp_path))
+    checkpoint.expect_pages(5)
+    for page_num in (1, 2, 4):
+        checkpoint.save_page(page_num, {'page': page_num, 'items': [{}]})
+
+    assert PageCheckpoint(str(tmp_path)).missing_pages() == [3, 5]
+    # После пустой страницы выдачи страниц нет
+    checkpoint.save_page(3, {'page': 3, 'items': []})
+    assert checkpoint.missing_pages() == []
+
+
+def test_failed_last_page_leaves_checkpoint_unfinished(fixture_server, tmp_path, monkeypatch):
+    server, base_url = fixture_server()
+    checkpoint = PageCheckpoint(str(tmp_path))
+    fetch_search_page = scraper.fetch_search_page
+
+    def failing_fetch(pool, limiter, search_query, page_num, *args):
+        if page_num == 5:
+            raise RuntimeError('connection reset')
+        return fetch_search_page(pool, limiter, search_query, page_num, *args)
+
+    options = dict(max_items=60 * 5, save_html=False, pool_size=2, min_interval=0.0,
+                   search_url=fixture_search_url(base_url), checkpoint=checkpoint)
+    monkeypatch.setattr(scraper, 'fetch_search_page', failing_fetch)
+    fetched = [page_num for page_num, _ in iter_search_pages('laptop', **options)]
+
+    assert fetched == [1, 2, 3, 4]
+    reopened = PageCheckpoint(str(tmp_path))
+    assert reopened.missing_pages() == [5]
+    assert not reopened.finished
+
+    # Повтор задачи дозагружает только упавшую страницу
+    monkeypatch.setattr(scraper, 'fetch_search_page', fetch_search_page)
+    assert [page_num for page_num, _ in iter_search_pages('laptop', **dict(options, checkpoint=reopened))] == [5]
+    assert reopened.finished
+    assert server.stats['requests'] == 5
+
+
+@pytest.mark.parametrize('indent', [2, None])
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 64])
+def test_iter_json_array_across_chunk_boundaries(tmp_path, indent, chunk_size):
+    path = str(tmp_path / 'items.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(ITEMS, f, ensure_ascii=False, indent=indent)
+
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 1024])
+def test_iter_json_array_reads_writer_output(tmp_path, chunk_size):
+    path = str(tmp_path / 'items.json.gz')
+    with JsonArrayWriter(path, indent=None) as writer:
+        for item in ITEMS:
+            writer.write(item)
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        assert json.load(f) == ITEMS
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize('text', ['[]', '  [\n  ]\n', '[ ]'])
+def test_iter_json_array_empty(tmp_path, text):
+    path = tmp_path / 'empty.json'
+    path.write_text(text)
+
+    assert list(iter_json_array(str(path), chunk_size=1)) == []
+
+
+@pytest.mark.parametrize('text', ['[1, 2,]', '[1, 2', '{"a": 1}', '[1 2]', '[{"a": 1}'])
+def test_iter_json_array_rejects_broken_arrays(tmp_path, text):
+    path = tmp_path / 'broken.json'
+    path.write_text(text)
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path), chunk_size=2))
@@ -0,0 +1,70 @@
+from fixtures import fixture_search_url
+from scraper import RateLimiter, iter_search_pages
+from waits import AdaptiveBackoff
+
+
+def test_steady_response_time_keeps_min_delay():
+    backoff = AdaptiveBackoff(min_delay=0.1)
+    for _ in range(20):
+        backoff.record(2.0)
+    assert backoff.delay() == 0.1
+
+
+def test_slowdown_above_baseline_raises_delay():
+    backoff = AdaptiveBackoff(min_delay=0.1, slowdown_threshold=1.5)
+    for _ in range(10):
+        backoff.record(0.2)
+    for _ in range(20):
+        backoff.record(0.8)
+    assert 0.3 < backoff.delay() <= 0.4
+    for _ in range(20):
+        backoff.record(0.2)
+    assert backoff.delay() == 0.1
+
+
+def test_errors_double_penalty_up_to_its_own_limit():
+    backoff = AdaptiveBackoff(min_delay=0.5, max_delay=30.0, max_penalty=4.0)
+    backoff.record(0.2)
+    for _ in range(10):
+        backoff.record(0.2, ok=False)
+    assert backoff.penalty == 4.0
+    assert backoff.delay() == 2.0
+    backoff.record(0.2)
+    assert backoff.penalty == 2.0
+
+
+def test_delay_is_capped_by_max_delay():
+    backoff = AdaptiveBackoff(min_delay=10.0, max_delay=15.0)
+    backoff.record(0.2, ok=False)
+    assert backoff.delay() == 15.0
+
+
+def test_limiter_interval_uses_backoff():
+    limiter = RateLimiter(0.05, AdaptiveBackoff(min_delay=0.05))
+    limiter.record(1.0)
+    assert limiter.interval() == 0.05
+    limiter.record(1.0, ok=False)
+    assert limiter.interval() == 0.1
+
+
+def test_adaptive_backoff_keeps_pool_concurrent(fixture_server, monkeypatch):
+    server, base_url = fixture_server(latency=0.3)
+    intervals = []
+    interval = RateLimiter.interval
+
+    def recording_interval(limiter):
+        intervals.append(interval(limiter))
+        return intervals[-1]
+
+    monkeypatch.setattr(RateLimiter, 'interval', recording_interval)
+    pages = list(iter_search_pages(
+        'laptop', max_items=60 * 9, save_html=False, pool_size=4, min_interval=0.01,
+        search_url=fixture_search_url(base_url), adaptive_backoff=True
+    ))
+
+    assert len(pages) == 9
+    assert server.stats['requests'] == 9
+    assert server.stats['max_in_flight'] >= 2
+    # Пауза не подстраивается под время ответа (0.3 с), иначе пул работал бы как один поток
+    assert len(intervals) == 9
+    assert max(intervals) < 0.3